@@ -1,27 +1,116 @@
 import os
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
-from letta_client import Letta, CreateBlock, MessageCreate
+from letta_client import (
+    CreateBlock,
+    JsonSchemaResponseFormat,
+    Letta,
+    MessageCreate,
+)
+from letta_client.core.api_error import ApiError
 from pydantic.json_schema import GenerateJsonSchema
 
+from agent_pool import AgentPair, AgentPool
+from code_slices import CODE_REFS, attach_code_refs
+from context_budget import (
+    SESSION_BLOCK_LIMIT,
+    collect_run_usage,
+    compact_schema,
+    estimate_tokens,
+    runs_usage,
+    session_ledger,
+    token_usage,
+    tool_return_char_limit,
+    utc_now,
+)
+from github import parse_issue_url
+from letta_gc import (
+    AGENT_POOL_MAX_AGE,
+    LETTA_RESOURCE_TAG,
+    LettaReaper,
+    resource_metadata,
+    run_tag,
+)
+from prefetch import prefetch
+from rate_limits import (
+    ADMISSION_MAX_WAIT,
+    BATCH,
+    RateLimitedError,
+    current_priority,
+    github_upstream,
+    is_rate_limit_message,
+    model_upstream,
+    upstreams,
+)
+from repo_context import repo_contexts
+from repo_index import REPO_INDEX_TOOLS, repo_indexes
+from retrieval import RETRIEVAL_INDEX_WAIT, RETRIEVAL_TOP_K, issue_query, retriever
+from routing import (
+    DEFAULT_ROUTE,
+    AnalysisProfile,
+    Route,
+    classify,
+    load_routes,
+    route_stats,
+)
+from run_waiter import RunWaiter
+from singleflight import FlightCancelled
 from schema import GitHubIssueAnalysis
+from sections import (
+    REPO_SECTIONS,
+    SECTION_TASKS,
+    known_sections_note,
+    merge_sections,
+    repair_prompt,
+    section_prompt,
+)
+from structured_output import SECTION_ADAPTERS, parse_sections
+from tool_registry import ToolRegistry
+from tracing import bind, tracer
 
 
 load_dotenv()
 
 LETTA_API_KEY = os.getenv("LETTA_API_KEY")
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+AGENT_POOL_MIN_IDLE = int(os.getenv("AGENT_POOL_MIN_IDLE", "1"))
+AGENT_POOL_MAX_LEASES = int(os.getenv("AGENT_POOL_MAX_LEASES", "50"))
+AGENT_POOL_LEASE_TIMEOUT = float(os.getenv("AGENT_POOL_LEASE_TIMEOUT", "300"))
+# How long a cancelled analysis's runs may take to end before its pair is
+# evicted instead of reset
+AGENT_POOL_CANCEL_GRACE = float(os.getenv("AGENT_POOL_CANCEL_GRACE", "60"))
+RUN_DEADLINE = float(os.getenv("RUN_DEADLINE", "900"))
+RUN_POLL_MAX_INTERVAL = float(os.getenv("RUN_POLL_MAX_INTERVAL", "8"))
+# Public base URL of this API; when set, Letta calls back on run completion and
+# agents can search the local repository index through it
+LETTA_CALLBACK_URL = os.getenv("LETTA_CALLBACK_URL")
+MCP_TOOLS_TTL = float(os.getenv("MCP_TOOLS_TTL", "3600"))
+MCP_TOOLS_POLL_INTERVAL = float(os.getenv("MCP_TOOLS_POLL_INTERVAL", "300"))
+# Constrain the supervisor's final reply to the GitHubIssueAnalysis JSON schema
+STRUCTURED_OUTPUT_SCHEMA = os.getenv("STRUCTURED_OUTPUT_SCHEMA", "1") == "1"
+# Rounds of asking an agent again for just the sections that failed validation
+STRUCTURED_OUTPUT_RETRIES = int(os.getenv("STRUCTURED_OUTPUT_RETRIES", "1"))
+# How often to check the shared block against its budget while a run is going
+LEDGER_COMPACT_INTERVAL = 10.0
 
 
+routes = load_routes()
+
 output_schema = GitHubIssueAnalysis.model_json_schema()
 output_schema["$schema"] = GenerateJsonSchema.schema_dialect
+# A fraction of the JSON schema's size, so it costs far less of every prompt
+compact_output_schema = compact_schema(GitHubIssueAnalysis)
 
 
-SUPERVISOR_PERSONA = f"""You are a GitHub Issue Analysis Coordinator for developers new to repositories.
+def supervisor_persona(worker_tag: str):
+    return f"""You are a GitHub Issue Analysis Coordinator for developers new to repositories.
 
 Responsibilities:
-- Delegate tasks to workers (use `worker` tag) for technical investigation
+- Delegate tasks to your worker (use `match_all` tags `["worker", "{worker_tag}"]`) for technical investigation
 - Synthesize findings into structured JSON for new contributors
 - Ensure comprehensive context about project architecture and setup
 
@@ -39,9 +128,10 @@ Required output includes:
 Make analysis accessible to developers unfamiliar with the codebase.
 
 Only return valid JSON matching this schema:
-{output_schema}
+{compact_output_schema}
 """
 
+
 WORKER_PERSONA = """You are a GitHub Technical Analysis Specialist for new repository contributors.
 
 Core tasks:
@@ -54,7 +144,10 @@ Analysis workflow:
 1. Get issue details (title, description, labels, status)
 2. Explore repository structure and technology stack
 3. Examine build files (package.json, requirements.txt, etc.) and docs
-4. Find relevant code sections with precise line numbers
+4. Find relevant code sections with precise line numbers (prefer
+   `search_repository`, `find_symbol` and `read_repository_lines` when
+   available: they read a local checkout of the analysed commit, passed as
+   `sha` when your memory names it)
 5. For each file, provide:
    - Role in project architecture
    - Dependencies and relationships
@@ -68,6 +161,12 @@ Always include for new contributors:
 - Code organization and component relationships
 - Technology stack and development workflow
 
+Keep context small:
+- Read files in line windows around what matters instead of whole files
+- Record each confirmed finding as one line under `## Findings` in the
+  `analysis_session` block (`- path:start-end: what it shows`) so the
+  supervisor can use it without another message round-trip
+
 Be precise with file paths, line numbers, and technical explanations.
 Focus on actionable insights and educational context."""
 
@@ -85,31 +184,265 @@ GH_TOOL_PREFIXES = [
 ]
 
 
-def add_mcp_tools(letta_client: Letta, mcp_server_name):
-    tool_ids = []
+class AnalysisCancelled(Exception):
+    """Raised when the caller asked to stop an analysis that is still running."""
+
+
+class InvalidAnalysisError(RuntimeError):
+    """Raised when sections of an analysis still fail validation after the
+    agent was asked to correct them."""
+
+
+_letta_client = None
+
+
+def get_letta_client():
+    global _letta_client
+    if not LETTA_API_KEY:
+        raise ValueError("LETTA_API_KEY environment variable is required")
+    if _letta_client is None:
+        _letta_client = Letta(token=LETTA_API_KEY)
+    return _letta_client
+
+
+_repo_index_tool_ids = None
+
+
+def repo_index_tool_ids():
+    """Register the local repository index tools with Letta once. They call back
+    into this API, so they are only available when LETTA_CALLBACK_URL is set."""
+    global _repo_index_tool_ids
+    if not LETTA_CALLBACK_URL:
+        return []
+    if _repo_index_tool_ids is None:
+        letta_client = get_letta_client()
+        _repo_index_tool_ids = [
+            letta_client.tools.upsert_from_function(
+                func=tool, return_char_limit=tool_return_char_limit(tool.__name__)
+            ).id
+            for tool in REPO_INDEX_TOOLS
+        ]
+    return _repo_index_tool_ids
+
+
+def create_agent_pair(worker_tag: str):
+    """Create a supervisor/worker pair sharing one `analysis_session` block,
+    configured for the default route."""
+    with tracer.span("agent.create", worker_tag=worker_tag):
+        return _create_agent_pair(worker_tag)
+
+
+def _create_agent_pair(worker_tag: str):
+    letta_client = get_letta_client()
+    route = routes[DEFAULT_ROUTE]
+
+    # MCP tools are registered once at startup and served from cache
+    mcp_tool_ids = github_tools.get_tool_ids()
+
+    # Everything is tagged with the pair's run ID so the reaper can collect it
+    # if this process dies before deleting it
+    run_id = worker_tag
+    tags = [LETTA_RESOURCE_TAG, run_tag(run_id)]
+    created = []
     try:
-        mcp_tools = letta_client.tools.list_mcp_tools_by_server(mcp_server_name)
-        if mcp_server_name == "github":
-            mcp_tools = [
-                tool
-                for tool in mcp_tools
-                if any(tool.name.startswith(prefix) for prefix in GH_TOOL_PREFIXES)
-            ]
-        for mcp_tool in mcp_tools:
-            tool = letta_client.tools.add_mcp_tool(mcp_server_name, mcp_tool.name)
-            tool_ids.append(tool.id)
-        print(f"Added {len(tool_ids)} tools from {mcp_server_name}")
-    except Exception as e:
-        print(f"Error adding MCP tools from {mcp_server_name}: {e}")
-    return tool_ids
+        # Create shared r/w memory block with analysis context
+        shared_block = letta_client.blocks.create(
+            label="analysis_session",
+            value=session_ledger.render(),
+            limit=SESSION_BLOCK_LIMIT,
+            metadata=resource_metadata(run_id),
+        )
+        created.append((letta_client.blocks.delete, shared_block.id))
+        print(f"Created shared memory block: {shared_block.id}")
+
+        # Create supervisor agent - coordinates and synthesizes
+        persona = supervisor_persona(worker_tag)
+        supervisor = letta_client.agents.create(
+            name="github-issue-supervisor",
+            memory_blocks=[
+                CreateBlock(label="persona", value=persona, limit=len(persona) + 1000)
+            ],
+            tools=["send_message_to_agents_matching_tags"],
+            tool_ids=mcp_tool_ids,
+            block_ids=[shared_block.id],
+            model=route.supervisor_model,
+            embedding="openai/text-embedding-3-small",
+            tags=tags,
+            metadata=resource_metadata(run_id),
+            # limit context window to improve latency
+            context_window_limit=route.supervisor_context_window,
+            response_format=(
+                JsonSchemaResponseFormat(
+                    json_schema={
+                        "name": "GitHubIssueAnalysis",
+                        "schema": output_schema,
+                    }
+                )
+                if STRUCTURED_OUTPUT_SCHEMA
+                else None
+            ),
+        )
+        created.append((letta_client.agents.delete, supervisor.id))
+        print(f"Created supervisor agent: {supervisor.id}")
+
+        # Create worker agent - does detailed technical analysis
+        worker = letta_client.agents.create(
+            name="github-issue-worker",
+            memory_blocks=[CreateBlock(label="persona", value=WORKER_PERSONA)],
+            tools=["send_message_to_agent_async"],
+            tool_ids=mcp_tool_ids + repo_index_tool_ids(),
+            tool_exec_environment_variables=(
+                {"REPO_INDEX_URL": LETTA_CALLBACK_URL} if LETTA_CALLBACK_URL else None
+            ),
+            block_ids=[shared_block.id],
+            model=route.worker_model,
+            embedding="google_ai/gemini-embedding-exp-03-07",
+            context_window_limit=route.worker_context_window,
+            tags=["worker", worker_tag, *tags],
+            metadata=resource_metadata(run_id),
+        )
+        print(f"Created worker agent: {worker.id}")
+    except BaseException:
+        # Release what was created so far instead of leaving it to the reaper
+        for delete, resource_id in reversed(created):
+            try:
+                delete(resource_id)
+            except Exception as e:
+                print(f"Error deleting {resource_id} of a failed pair: {e}")
+        raise
+
+    return AgentPair(
+        supervisor_id=supervisor.id,
+        worker_id=worker.id,
+        block_id=shared_block.id,
+        worker_tag=worker_tag,
+        route=route.name,
+    )
+
+
+def configure_agent_pair(pair: AgentPair, route: Route):
+    """Switch a pair's models and context windows to `route` if needed."""
+    if pair.route == route.name:
+        return
+    with tracer.span("agent.configure", route=route.name):
+        _configure_agents(pair, route)
+    print(f"Configured agent pair {pair.supervisor_id} for route {route.name}")
+    pair.route = route.name
+
+
+def _configure_agents(pair: AgentPair, route: Route):
+    letta_client = get_letta_client()
+    for agent_id, model, context_window in (
+        (pair.supervisor_id, route.supervisor_model, route.supervisor_context_window),
+        (pair.worker_id, route.worker_model, route.worker_context_window),
+    ):
+        agent = letta_client.agents.modify(agent_id, model=model)
+        if context_window and agent.llm_config.context_window != context_window:
+            letta_client.agents.modify(
+                agent_id,
+                llm_config=agent.llm_config.model_copy(
+                    update={"context_window": context_window}
+                ),
+            )
+
+
+def reset_agent_pair(pair: AgentPair):
+    """Clear message history and the shared block so the next lease starts fresh.
+    After a cancelled lease, the pair's runs are let finish first."""
+    letta_client = get_letta_client()
+    if pair.interrupted:
+        _wait_for_idle(letta_client, pair)
+        pair.interrupted = False
+    letta_client.agents.messages.reset(agent_id=pair.supervisor_id)
+    letta_client.agents.messages.reset(agent_id=pair.worker_id)
+    letta_client.blocks.modify(pair.block_id, value=session_ledger.render())
+
+
+def _wait_for_idle(letta_client: Letta, pair: AgentPair):
+    """Wait for the pair's active runs to end; raising gets the pair evicted,
+    which stops them."""
+    agent_ids = [pair.supervisor_id, pair.worker_id]
+    deadline = time.monotonic() + AGENT_POOL_CANCEL_GRACE
+    while letta_client.runs.list_active(agent_ids=agent_ids):
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"Runs of cancelled agent pair {pair.supervisor_id} still active "
+                f"after {AGENT_POOL_CANCEL_GRACE:.0f}s"
+            )
+        time.sleep(1)
 
 
-def analyze_gh_issue(issue_url: str):
+def delete_agent_pair(pair: AgentPair):
+    letta_client = get_letta_client()
+    # One failed delete mustn't keep the others from running
+    try:
+        letta_client.agents.delete(pair.supervisor_id)
+    finally:
+        try:
+            letta_client.agents.delete(pair.worker_id)
+        finally:
+            letta_client.blocks.delete(pair.block_id)
+    print(f"Deleted agent pair {pair.supervisor_id} / {pair.worker_id}")
+
+
+github_tools = ToolRegistry(
+    get_letta_client,
+    "github",
+    prefixes=GH_TOOL_PREFIXES,
+    ttl=MCP_TOOLS_TTL,
+    poll_interval=MCP_TOOLS_POLL_INTERVAL,
+    return_char_limit=tool_return_char_limit,
+)
+
+agent_pool = AgentPool(
+    create_pair=create_agent_pair,
+    reset_pair=reset_agent_pair,
+    destroy_pair=delete_agent_pair,
+    max_size=AGENT_POOL_SIZE,
+    min_idle=AGENT_POOL_MIN_IDLE,
+    max_leases=AGENT_POOL_MAX_LEASES,
+    lease_timeout=AGENT_POOL_LEASE_TIMEOUT,
+    max_age=AGENT_POOL_MAX_AGE,
+    # A cancelled analysis says nothing about its agents, so they're kept
+    keep_on=(AnalysisCancelled, FlightCancelled),
+)
+
+# Collects agents and blocks that were never deleted, e.g. after a crash
+letta_reaper = LettaReaper(
+    get_letta_client,
+    live_ids=agent_pool.live_ids,
+    before_pass=agent_pool.retire_expired,
+)
+
+# Pooled agents were created with the old tool IDs, so retire them
+github_tools.on_change(lambda tool_ids: agent_pool.recycle_all())
+
+run_waiter = RunWaiter(max_interval=RUN_POLL_MAX_INTERVAL, deadline=RUN_DEADLINE)
+
+
+def analyze_gh_issue(
+    issue_url: str,
+    should_cancel=None,
+    on_event=None,
+    head_sha: str | None = None,
+    mode: str | None = None,
+    repo_context: dict | None = None,
+):
     """
     Analyze a GitHub issue and return structured JSON with relevant files and information.
 
     Args:
         issue_url: URL of the GitHub issue to analyze
+        should_cancel: Optional callable polled while the run is in progress;
+            the analysis raises AnalysisCancelled once it returns True
+        on_event: Optional callable receiving `(event, data)` progress updates:
+            tool calls, tool return previews, supervisor output and each
+            analysis section as soon as it validates
+        head_sha: Optional default-branch commit to pin repository reads to
+        mode: "supervisor" or "sectioned"; defaults to the route's mode
+        repo_context: Optional repository-level sections (`project_context`,
+            `build_and_test`) from an analysis of another issue in the same
+            repository; agents take them as given instead of investigating
 
     Returns:
         GitHubIssueAnalysis: Structured analysis data
@@ -120,86 +453,666 @@ def analyze_gh_issue(issue_url: str):
     if not issue_url:
         raise ValueError("GitHub issue URL is required")
 
-    letta_client = Letta(token=LETTA_API_KEY)
+    if mode not in (None, "supervisor", "sectioned"):
+        raise ValueError(f"Unknown analysis mode: {mode}")
 
-    # Add MCP tools
-    mcp_tool_ids = []
-    # mcp_tool_ids.extend(add_mcp_tools(letta_client, "deepwiki"))
-    mcp_tool_ids.extend(add_mcp_tools(letta_client, "github"))
+    known = {
+        name: SECTION_ADAPTERS[name].validate_python(value)
+        for name, value in (repo_context or {}).items()
+        if name in REPO_SECTIONS
+    }
 
-    # Create shared r/w memory block with analysis context
-    shared_block = letta_client.blocks.create(
-        label="analysis_session",
-        value=f"GitHub Issue Analysis Session\nTarget: {issue_url}",
-    )
+    with tracer.span("analysis", issue_url=issue_url, head_sha=head_sha) as span:
+        span.set(known=",".join(known) or None)
+        return _analyze_gh_issue(
+            span, issue_url, should_cancel, on_event, head_sha, mode, known
+        )
 
-    print(f"Created shared memory block: {shared_block.id}")
-
-    # Create supervisor agent - coordinates and synthesizes
-    supervisor = letta_client.agents.create(
-        name="github-issue-supervisor",
-        memory_blocks=[
-            CreateBlock(label="persona", value=SUPERVISOR_PERSONA, limit=7000)
-        ],
-        tools=["send_message_to_agents_matching_tags"],
-        tool_ids=mcp_tool_ids,
-        block_ids=[shared_block.id],
-        model="anthropic/claude-sonnet-4-20250514",
-        embedding="openai/text-embedding-3-small",
-        context_window_limit=32000,  # limit context window to improve latency
-        # TODO: Use json_schema when schema is ready
-        # response_format={"type": "json_schema", "json_schema": output_schema},
-    )
-    print(f"Created supervisor agent: {supervisor.id}")
-
-    # Create worker agent - does detailed technical analysis
-    worker = letta_client.agents.create(
-        name="github-issue-worker",
-        memory_blocks=[CreateBlock(label="persona", value=WORKER_PERSONA)],
-        tools=["send_message_to_agent_async"],
-        tool_ids=mcp_tool_ids,
-        block_ids=[shared_block.id],
-        model="gemini-key/gemini-2.5-flash-preview-05-20",
-        embedding="google_ai/gemini-embedding-exp-03-07",
-        tags=["worker"],
-    )
-    print(f"Created worker agent: {worker.id}")
 
-    # Start the analysis with supervisor
-    print(f"Starting analysis of: {issue_url}")
+def _analyze_gh_issue(span, issue_url, should_cancel, on_event, head_sha, mode, known):
+    letta_client = get_letta_client()
+
+    ref = parse_issue_url(issue_url)
+    if head_sha and (LETTA_CALLBACK_URL or RETRIEVAL_TOP_K):
+        # Clone and index in the background while the issue is prefetched
+        repo_indexes.prepare(ref.owner, ref.repo, head_sha)
+
+    # Gather the issue and build manifests directly so agents don't spend
+    # model turns on simple lookups
+    with tracer.span("prefetch", issue_url=issue_url) as prefetch_span:
+        context = prefetch(issue_url, head_sha)
+        prefetch_span.set(ok=context is not None)
+    if context is not None and on_event is not None:
+        on_event(
+            "section",
+            {
+                "name": "issue_summary",
+                "value": context.issue_summary().model_dump(mode="json"),
+            },
+        )
+    index = None
+    if context is not None and head_sha and RETRIEVAL_TOP_K:
+        try:
+            with tracer.span("retrieval", repo=ref.full_name) as retrieval_span:
+                index = repo_indexes.sync(
+                    ref.owner, ref.repo, head_sha, timeout=RETRIEVAL_INDEX_WAIT
+                )
+                context.candidates = retriever.search(index, issue_query(context.issue))
+                retrieval_span.set(candidates=len(context.candidates))
+        except TimeoutError:
+            print(f"Index of {ref.full_name} not ready, going on without candidates")
+        except Exception as e:
+            print(f"Error retrieving candidate code for {issue_url}: {e}")
 
-    run = letta_client.agents.messages.create_async(
-        agent_id=supervisor.id,
-        messages=[
-            MessageCreate(
-                role="user",
-                content=f"Please analyze this GitHub issue and provide a comprehensive JSON response: {issue_url}",
+    # Repository-level sections from an earlier analysis of this repository
+    if not known and context is not None and head_sha:
+        with tracer.span("repo_context.get", repo=ref.full_name) as context_span:
+            known = repo_contexts.get(ref.full_name, head_sha, context)
+            context_span.set(hit=bool(known))
+    if on_event is not None:
+        for name, value in known.items():
+            on_event(
+                "section", {"name": name, "value": value.model_dump(mode="json")}
             )
-        ],
+
+    # Pick models, context windows and worker count from what's known so far,
+    # without waiting for a clone
+    profile = AnalysisProfile.from_context(
+        context, index or repo_indexes.get(ref.owner, ref.repo, head_sha, timeout=0)
     )
+    route = routes.get(classify(profile), routes[DEFAULT_ROUTE])
+    mode = mode or route.mode
+    print(f"Routing {issue_url} to {route.name} ({mode}): {profile}")
+    span.set(route=route.name, mode=mode, repo_files=profile.repo_files)
+    if on_event is not None:
+        on_event("progress", {"message": f"Route: {route.name}", "mode": mode})
 
-    run = letta_client.runs.retrieve(run.id)
-    while run.status not in ["completed", "failed"]:
-        time.sleep(5)
-        run = letta_client.runs.retrieve(run.id)
+    # Turn the analysis away early rather than failing it midway when the
+    # upstreams it needs have no budget left
+    with tracer.span("admission") as admission_span:
+        upstreams.admit(
+            {model_upstream(route.supervisor_model), model_upstream(route.worker_model)}
+            | {"github"}
+        )
+        admission_span.set(priority=current_priority())
 
-    # Extract the final JSON response
-    analysis_result = None
-    messages = letta_client.runs.messages.list(run.id)
-    for message in messages:
-        if message.message_type == "assistant_message":
-            print(f"Supervisor response: {message.content}")
+    started = time.monotonic()
+    outcome, usage = "error", {}
+    try:
+        if mode == "sectioned":
+            result, usage, repairs = _run_sectioned_analysis(
+                letta_client, route, issue_url, should_cancel, on_event, context, known
+            )
+        else:
+            with agent_pool.lease(route.name) as pair:
+                configure_agent_pair(pair, route)
+                _start_session(letta_client, pair, issue_url, context, known)
+                result, usage, repairs = _run_analysis(
+                    letta_client,
+                    pair,
+                    issue_url,
+                    should_cancel,
+                    on_event,
+                    context,
+                    known,
+                )
+        outcome = "repaired" if repairs else "ok"
+    except AnalysisCancelled:
+        outcome = "cancelled"
+        raise
+    except InvalidAnalysisError:
+        outcome = "invalid"
+        raise
+    except RateLimitedError:
+        outcome = "rate_limited"
+        raise
+    finally:
+        span.set(outcome=outcome)
+        route_stats.record(route, time.monotonic() - started, outcome, usage)
+
+    if usage:
+        token_usage.record(usage)
+        print(f"Token usage for {issue_url}: {usage}")
+        if on_event is not None:
+            on_event("usage", usage)
+    if context is not None:
+        result = context.apply_to(result)
+        if head_sha and not known:
+            repo_contexts.put(
+                ref.full_name,
+                head_sha,
+                context,
+                {name: getattr(result, name) for name in REPO_SECTIONS},
+            )
+    if head_sha and CODE_REFS:
+        # Quote the repository instead of the model, and say where from
+        with tracer.span("code_refs", repo=ref.full_name) as refs_span:
             try:
-                analysis_result = GitHubIssueAnalysis.model_validate_json(
-                    message.content
+                refs_span.set(
+                    attached=attach_code_refs(result, ref.full_name, head_sha)
                 )
             except Exception as e:
-                print(f"Error validating with Pydantic: {e}")
+                print(f"Error attaching code references for {issue_url}: {e}")
+    return result
+
+
+def warm_repo_context(issue_url: str, head_sha: str):
+    """Investigate only the repository-level sections for the repository of
+    `issue_url` at `head_sha` and store them, so the repository's analyses
+    start with them known. Returns the sections."""
+    if not LETTA_API_KEY:
+        raise ValueError("LETTA_API_KEY environment variable is required")
+
+    letta_client = get_letta_client()
+    ref = parse_issue_url(issue_url)
+    with upstreams.priority(BATCH), tracer.span(
+        "repo_context.warm", repo=ref.full_name, head_sha=head_sha
+    ):
+        context = prefetch(issue_url, head_sha)
+        if context is None:
+            raise ValueError(f"Could not prefetch {ref.full_name}")
+        known = repo_contexts.get(ref.full_name, head_sha, context)
+        if known:
+            return known
+
+        route = routes[DEFAULT_ROUTE]
+        sections, usage, _ = _run_sections(
+            letta_client, route, issue_url, list(REPO_SECTIONS), context=context
+        )
+        context.fill_build_and_test(sections["build_and_test"])
+        if usage:
+            token_usage.record(usage)
+            print(f"Token usage warming {ref.full_name}: {usage}")
+        repo_contexts.put(ref.full_name, head_sha, context, sections)
+        return sections
+
+
+def _start_session(
+    letta_client: Letta, pair: AgentPair, issue_url, context=None, known=None
+):
+    sections = context.session_sections() if context else {}
+    if known:
+        sections["known"] = known_sections_note(known)
+    value = session_ledger.render(issue_url, sections)
+    with tracer.span("agent.session", chars=len(value)):
+        letta_client.blocks.modify(pair.block_id, value=value)
+
+
+def _pair_upstreams(pair: AgentPair, agent_id: str | None = None):
+    """Model providers a run on `agent_id` calls; a supervisor run also
+    drives its worker."""
+    route = routes.get(pair.route) or routes[DEFAULT_ROUTE]
+    models = [route.worker_model]
+    if agent_id != pair.worker_id:
+        models.append(route.supervisor_model)
+    return {model_upstream(model) for model in models} - {None}
+
+
+def _create_run(letta_client: Letta, pair: AgentPair, agent_id: str, prompt: str):
+    """Start a run on `agent_id` once its model providers have budget."""
+    providers = _pair_upstreams(pair, agent_id)
+    for upstream in providers:
+        upstreams.acquire(upstream, timeout=ADMISSION_MAX_WAIT)
+    try:
+        return letta_client.agents.messages.create_async(
+            agent_id=agent_id,
+            messages=[MessageCreate(role="user", content=prompt)],
+            **_callback_kwargs(),
+        )
+    except ApiError as e:
+        if e.status_code != 429:
+            raise
+        pause = max((upstreams.penalize(name) for name in providers), default=None)
+        raise RateLimitedError(
+            f"Rate limited starting a run on {agent_id}", pause, ",".join(providers)
+        ) from e
+
+
+def _charge_steps(pair: AgentPair, worker: bool, steps: int, paid=1):
+    """Charge the worker's or supervisor's model provider for `steps` model
+    calls, less the `paid` ones `_create_run` already took tokens for."""
+    route = routes.get(pair.route) or routes[DEFAULT_ROUTE]
+    model = route.worker_model if worker else route.supervisor_model
+    upstreams.charge(model_upstream(model), max(steps - paid, 0))
+
+
+def _callback_kwargs():
+    if not LETTA_CALLBACK_URL:
+        return {}
+    return {"callback_url": f"{LETTA_CALLBACK_URL.rstrip('/')}/letta/callback"}
+
+
+class _MessageRelay:
+    """Logs run messages, forwards them as progress events and keeps, per
+    GitHubIssueAnalysis section, the latest value the agent sent that validates.
+
+    Sections are validated independently, so one bad field doesn't discard
+    the rest of a reply; `errors` says why each section still missing failed.
+    With `section` set it relays a worker answering for that one section.
+
+    Fed under a run's span, it also traces the run's model steps and agent
+    tool calls from message timestamps: a step spans from the previous
+    message (or `started_ns`) to its first output, a tool call from the call
+    to its return, and `steps` counts them. The agents' GitHub tool calls
+    count against the shared GitHub rate limit.
+    """
+
+    def __init__(self, on_event=None, sections_sent=(), section=None):
+        self.on_event = on_event
+        self.section = section
+        self.names = [section] if section else list(SECTION_ADAPTERS)
+        self.last_message_id = None
+        self.sections = {}
+        self.errors = {name: "no reply yet" for name in self.names}
+        self._seen = set()
+        self._sections = set(sections_sent)
+        self.started_ns = None
+        self.steps = 0
+        self._step_id = None
+        self._tool_calls = {}
+
+    def feed(self, messages):
+        for message in messages:
+            key = (message.id, message.message_type)
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            self.last_message_id = message.id
+            self._trace(message)
+            self._handle(message)
+
+    def _trace(self, message):
+        date = getattr(message, "date", None)
+        if date is None:
+            return
+        at = int(date.timestamp() * 1e9)
+        step_id = getattr(message, "step_id", None)
+        if step_id and step_id != self._step_id:
+            self.steps += 1
+            if self.started_ns is not None:
+                tracer.record("agent.step", self.started_ns, at, step_id=step_id)
+            self._step_id = step_id
+        if message.message_type == "tool_call_message":
+            call = message.tool_call
+            self._tool_calls[call.tool_call_id] = (call.name, at)
+        elif message.message_type == "tool_return_message":
+            name, called_at = self._tool_calls.pop(
+                message.tool_call_id, (message.name, at)
+            )
+            tracer.record(
+                "agent.tool",
+                called_at,
+                at,
+                error=message.status if message.status == "error" else None,
+                tool=name,
+            )
+        self.started_ns = at
+
+    def _emit(self, event, data):
+        if self.on_event is not None:
+            self.on_event(event, data)
+
+    def _handle(self, message):
+        if message.message_type == "assistant_message":
+            speaker = f"Worker ({self.section})" if self.section else "Supervisor"
+            print(f"{speaker} response: {message.content}")
+            self._emit("assistant", {"preview": str(message.content)[:500]})
+            with tracer.span("validation", section=self.section) as span:
+                sections, errors = parse_sections(str(message.content), self.names)
+                span.set(valid=len(sections), invalid=len(errors))
+            for name, value in sections.items():
+                self.sections[name] = value
+                self.errors.pop(name, None)
+                if name not in self._sections:
+                    self._sections.add(name)
+                    value = SECTION_ADAPTERS[name].dump_python(value, mode="json")
+                    self._emit("section", {"name": name, "value": value})
+            for name, error in errors.items():
+                if name not in self.sections:
+                    self.errors[name] = error
+            if errors:
+                print(f"Sections missing or invalid in reply: {errors}")
         elif message.message_type == "tool_call_message":
             print(f"Tool called: {message.tool_call.name}")
+            if message.tool_call.name in github_tools.tool_names:
+                # Letta calls GitHub for the agents; it counts against our budget
+                upstreams.charge(github_upstream(message.tool_call.name))
+            self._emit(
+                "tool_call",
+                {
+                    "name": message.tool_call.name,
+                    "arguments": str(message.tool_call.arguments)[:200],
+                },
+            )
         elif message.message_type == "tool_return_message":
             print(f"Tool result preview: {str(message.tool_return)[:200]}...")
-    return analysis_result
+            if (
+                message.status == "error"
+                and message.name in github_tools.tool_names
+                and is_rate_limit_message(message.tool_return)
+            ):
+                upstreams.penalize(github_upstream(message.name))
+            self._emit(
+                "tool_return",
+                {
+                    "name": message.name,
+                    "status": message.status,
+                    "preview": str(message.tool_return)[:200],
+                },
+            )
+
+
+def _run_analysis(
+    letta_client: Letta,
+    pair: AgentPair,
+    issue_url: str,
+    should_cancel=None,
+    on_event=None,
+    context=None,
+    known=None,
+):
+    # Start the analysis with supervisor
+    print(f"Starting analysis of: {issue_url}")
+
+    prompt = f"Please analyze this GitHub issue and provide a comprehensive JSON response: {issue_url}"
+    if context is not None:
+        prompt += (
+            "\n\nThe issue details, top-level file tree and build manifests are "
+            "already in your `analysis_session` memory block. Use them directly "
+            "for issue_summary and build_and_test, and only delegate code "
+            "investigation to your worker."
+        )
+        if context.candidates:
+            prompt += (
+                " It also lists candidate code sections ranked by similarity to "
+                "the issue; have the worker confirm or rule those out before "
+                "searching the repository further."
+            )
+    if known:
+        prompt += (
+            f"\n\n{', '.join(known)} for this repository are already known and "
+            "listed in your `analysis_session` memory block. Reply with empty "
+            "values for them; they are filled in afterwards. Spend your worker's "
+            "turns on relevant_files and analysis."
+        )
+
+    started_at = utc_now()
+    run = _create_run(letta_client, pair, pair.supervisor_id, prompt)
+
+    # Known and prefetched sections are streamed before the run starts
+    sent = list(known or ())
+    if context is not None:
+        sent.append("issue_summary")
+    relay = _MessageRelay(on_event, sections_sent=sent)
+    if on_event is not None:
+        on_event("progress", {"message": "Supervisor started", "run_id": run.id})
+
+    _wait_for_run(letta_client, pair, run.id, issue_url, relay, should_cancel)
+    # Known sections replace the model's, and the prefetched issue summary
+    # stands in for the model's, so they can't fail
+    known = dict(known or {})
+    if context is not None:
+        known["issue_summary"] = context.issue_summary()
+    repairs = _repair_sections(
+        letta_client, pair, pair.supervisor_id, issue_url, relay, should_cancel, known
+    )
+    sections = {**relay.sections, **known}
+    if "issue_summary" in relay.sections:
+        # apply_to keeps the model's description and overlays GitHub's facts
+        sections["issue_summary"] = relay.sections["issue_summary"]
+    analysis = merge_sections(sections, cross_reference=False)
+    usage = _collect_usage(letta_client, pair, [run.id, *repairs], started_at)
+    # The worker's steps don't show in the supervisor's runs, each of which
+    # took one worker token up front
+    worker_steps = usage.get("worker", {}).get("steps", 0)
+    _charge_steps(pair, True, worker_steps, paid=1 + len(repairs))
+    return analysis, usage, len(repairs)
+
+
+def _run_sectioned_analysis(
+    letta_client: Letta,
+    route: Route,
+    issue_url: str,
+    should_cancel=None,
+    on_event=None,
+    context=None,
+    known=None,
+):
+    """Have one worker per GitHubIssueAnalysis section investigate concurrently,
+    then merge their sections without a synthesis turn.
+
+    Each section leases its own agent pair and only prompts the pair's worker,
+    so latency tracks the slowest section rather than the sum of them. Up to
+    `route.section_workers` sections run at once. The issue summary is taken
+    from the prefetched issue when there is one, and `known` sections as
+    given. If any section fails, the others are cancelled. Returns
+    `(analysis, token usage, repair rounds)`.
+    """
+    known = known or {}
+    names = [
+        name
+        for name in SECTION_TASKS
+        if name not in known and not (name == "issue_summary" and context is not None)
+    ]
+    sections, usage, repairs = _run_sections(
+        letta_client, route, issue_url, names, should_cancel, on_event, context, known
+    )
+    sections.update(known)
+    if context is not None:
+        sections["issue_summary"] = context.issue_summary()
+    return merge_sections(sections), usage, repairs
+
+
+def _run_sections(
+    letta_client: Letta,
+    route: Route,
+    issue_url: str,
+    names,
+    should_cancel=None,
+    on_event=None,
+    context=None,
+    known=None,
+):
+    """Run one worker per section in `names` concurrently; returns
+    `(sections, token usage, repair rounds)`."""
+    failed = threading.Event()
+
+    def cancelled():
+        return failed.is_set() or (should_cancel is not None and should_cancel())
+
+    def run(name):
+        if cancelled():
+            raise AnalysisCancelled(f"Section {name} of {issue_url} was cancelled")
+        with tracer.span("section", section=name):
+            with agent_pool.lease(route.name) as pair:
+                configure_agent_pair(pair, route)
+                _start_session(letta_client, pair, issue_url, context, known)
+                return _run_section(
+                    letta_client, pair, name, issue_url, cancelled, on_event, context
+                )
+
+    if on_event is not None:
+        on_event("progress", {"message": f"Analyzing sections: {', '.join(names)}"})
+
+    sections, usage, repairs = {}, {}, 0
+    executor = ThreadPoolExecutor(
+        max_workers=route.section_workers, thread_name_prefix="analysis-section"
+    )
+    futures = {executor.submit(bind(run), name): name for name in names}
+    try:
+        for future in as_completed(futures):
+            name = futures[future]
+            sections[name], usage[f"section:{name}"], rounds = future.result()
+            repairs += rounds
+    except BaseException:
+        failed.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    return sections, usage, repairs
+
+
+def _run_section(
+    letta_client: Letta,
+    pair: AgentPair,
+    name: str,
+    issue_url: str,
+    should_cancel=None,
+    on_event=None,
+    context=None,
+):
+    """Ask a worker for one section; returns `(value, token usage, repair
+    rounds)`."""
+    print(f"Starting section {name} of: {issue_url}")
+    prompt = section_prompt(
+        name,
+        issue_url,
+        prefetched=context is not None,
+        # Only the code-facing sections have use for the ranked candidates
+        candidates=bool(context and context.candidates)
+        and name in ("relevant_files", "analysis"),
+    )
+    run = _create_run(letta_client, pair, pair.worker_id, prompt)
+    relay = _MessageRelay(on_event, section=name)
+    _wait_for_run(letta_client, pair, run.id, issue_url, relay, should_cancel)
+    repairs = _repair_sections(
+        letta_client, pair, pair.worker_id, issue_url, relay, should_cancel
+    )
+
+    try:
+        usage = runs_usage(letta_client, [run.id, *repairs])
+    except Exception as e:
+        print(f"Error collecting token usage for run {run.id}: {e}")
+        usage = {}
+    return relay.sections[name], usage, len(repairs)
+
+
+def _repair_sections(
+    letta_client: Letta,
+    pair: AgentPair,
+    agent_id: str,
+    issue_url: str,
+    relay: _MessageRelay,
+    should_cancel=None,
+    known=(),
+):
+    """Ask the agent again for only the sections that failed validation.
+
+    Returns the IDs of the repair runs. Raises InvalidAnalysisError once
+    STRUCTURED_OUTPUT_RETRIES rounds still leave sections invalid, so a broken
+    reply fails the analysis rather than yielding no result.
+    """
+    run_ids = []
+    for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+        failed = {
+            name: error for name, error in relay.errors.items() if name not in known
+        }
+        if not failed:
+            return run_ids
+        if attempt == STRUCTURED_OUTPUT_RETRIES:
+            break
+        print(f"Asking {agent_id} again for sections: {', '.join(failed)}")
+        if relay.on_event is not None:
+            relay.on_event(
+                "progress", {"message": f"Repairing sections: {', '.join(failed)}"}
+            )
+        with tracer.span("repair", sections=",".join(failed), attempt=attempt + 1):
+            run = _create_run(letta_client, pair, agent_id, repair_prompt(failed))
+            run_ids.append(run.id)
+            _wait_for_run(letta_client, pair, run.id, issue_url, relay, should_cancel)
+    details = "; ".join(f"{name}: {error}" for name, error in failed.items())
+    raise InvalidAnalysisError(f"Invalid analysis sections for {issue_url}: {details}")
+
+
+def _wait_for_run(
+    letta_client: Letta,
+    pair: AgentPair,
+    run_id: str,
+    issue_url: str,
+    relay: _MessageRelay,
+    should_cancel=None,
+):
+    """Wait for a run while relaying its messages and keeping the session block
+    within budget, then feed the relay whatever messages remain."""
+    last_compacted = time.monotonic()
+    polls = 0
+    steps = relay.steps
+
+    def on_poll(run):
+        nonlocal last_compacted, polls
+        polls += 1
+        # Raising returns the leased pair, to be reset once the run has ended
+        if should_cancel is not None and should_cancel():
+            raise AnalysisCancelled(f"Analysis of {issue_url} was cancelled")
+        if time.monotonic() - last_compacted >= LEDGER_COMPACT_INTERVAL:
+            last_compacted = time.monotonic()
+            _compact_session_block(letta_client, pair.block_id)
+        if relay.on_event is not None:
+            # Relay what the agents have done so far instead of waiting for the end
+            relay.feed(
+                letta_client.runs.messages.list(run.id, after=relay.last_message_id)
+            )
+
+    with tracer.span("letta.run", run_id=run_id) as span:
+        relay.started_ns = span.start_ns
+        relay.last_message_id = None
+        try:
+            run = run_waiter.wait(letta_client, run_id, on_poll=on_poll)
+        finally:
+            span.set(polls=polls)
+        span.set(status=run.status)
+        providers = _pair_upstreams(pair)
+        if run.status != "completed":
+            if is_rate_limit_message(run.metadata or ""):
+                # A provider 429 inside the run; pause it for every analysis
+                pause = max(
+                    (upstreams.penalize(name) for name in providers), default=None
+                )
+                raise RateLimitedError(
+                    f"Letta run {run.id} was rate limited", pause, ",".join(providers)
+                )
+            raise RuntimeError(f"Letta run {run.id} ended with status {run.status}")
+        for upstream in providers:
+            upstreams.succeeded(upstream)
+
+        # Extract the final JSON response
+        relay.feed(
+            letta_client.runs.messages.list(run.id, after=relay.last_message_id)
+        )
+    # Every step is a model call; a worker relay follows a worker run
+    _charge_steps(pair, bool(relay.section), relay.steps - steps)
+    return run
+
+
+def _compact_session_block(letta_client: Letta, block_id: str):
+    """Trim the findings ledger before agents hit the block's hard limit.
+
+    A finding appended between the read and the write is lost; the ledger is
+    a working scratchpad, so that's preferable to a failed memory edit.
+    """
+    try:
+        block = letta_client.blocks.retrieve(block_id)
+        compacted = session_ledger.compact(block.value)
+        if compacted is not None:
+            letta_client.blocks.modify(block_id, value=compacted)
+            print(
+                f"Compacted session block {block_id}: "
+                f"{len(block.value)} -> {len(compacted)} chars"
+            )
+    except Exception as e:
+        print(f"Error compacting session block {block_id}: {e}")
+
+
+def _collect_usage(letta_client: Letta, pair: AgentPair, run_ids, started_at):
+    try:
+        usage = collect_run_usage(letta_client, run_ids, pair.worker_id, started_at)
+        block = letta_client.blocks.retrieve(pair.block_id)
+    except Exception as e:
+        print(f"Error collecting token usage for runs {run_ids}: {e}")
+        return {}
+    # The shared block is part of every step's prompt for both agents
+    usage["session_block"] = {"prompt_tokens": estimate_tokens(block.value)}
+    return usage
 
 
 if __name__ == "__main__":
@@ -214,5 +1127,7 @@ if __name__ == "__main__":
             print(json.dumps(result.model_dump(), indent=2))
         except Exception as e:
             print(f"Analysis failed: {e}")
+        finally:
+            agent_pool.close()
     else:
         print("No issue URL provided")
@@ -0,0 +1,304 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from tracing import tracer
+
+
+@dataclass
+class AgentPair:
+    supervisor_id: str
+    worker_id: str
+    block_id: str
+    worker_tag: str
+    # Name of the model route the agents are currently configured for
+    route: str | None = None
+    leases: int = 0
+    generation: int = 0
+    created_at: float = field(default_factory=time.time)
+    # The last lease was cancelled, so runs it started may still be going
+    interrupted: bool = False
+
+
+class PoolExhaustedError(RuntimeError):
+    """Raised when no agent pair becomes available before the lease timeout."""
+
+
+class AgentPool:
+    """Bounded pool of long-lived supervisor/worker agent pairs.
+
+    Pairs are created through `create_pair`, handed out one request at a time
+    with `lease()`, reset in the background through `reset_pair` when returned,
+    and destroyed through `destroy_pair` when they fail, hit `max_leases` or
+    outlive `max_age` seconds, so they're gone well before their Letta
+    resources expire. A lease that ends with one of the `keep_on` exceptions,
+    such as a cancellation, marks its pair `interrupted` and returns it to be
+    reset like any other. `live_ids()` names the resources of every pair the pool
+    still owns.
+
+    Example usage:
+    ```with agent_pool.lease() as pair:
+        run = client.agents.messages.create_async(agent_id=pair.supervisor_id, ...)
+    ```
+    """
+
+    def __init__(
+        self,
+        create_pair,
+        reset_pair,
+        destroy_pair,
+        max_size=4,
+        min_idle=1,
+        max_leases=50,
+        lease_timeout=300.0,
+        max_age=None,
+        keep_on=(),
+    ):
+        self._create_pair = create_pair
+        self._reset_pair = reset_pair
+        self._destroy_pair = destroy_pair
+        self.max_size = max_size
+        self.min_idle = min(min_idle, max_size)
+        self.max_leases = max_leases
+        self.lease_timeout = lease_timeout
+        self.max_age = max_age
+        self.keep_on = tuple(keep_on)
+
+        self._cond = threading.Condition()
+        self._idle: list[AgentPair] = []
+        self._in_use: set[str] = set()
+        self._owned: dict[str, AgentPair] = {}
+        self._size = 0  # idle + in use + resetting + being created
+        self._closed = False
+        self._generation = 0
+        self._background = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="agent-pool"
+        )
+
+        self._leases_served = 0
+        self._evictions = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @staticmethod
+    def new_worker_tag():
+        # Each pair gets a unique tag so a supervisor only ever messages its own
+        # worker, not every `worker`-tagged agent in the Letta project.
+        return f"worker-{uuid.uuid4().hex[:12]}"
+
+    def warm(self):
+        """Create pairs until `min_idle` pairs are ready. Called at app startup."""
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) >= self.min_idle:
+                    return
+                if self._size >= self.max_size:
+                    return
+                self._size += 1
+            pair = self._new_pair()
+            if pair is None:
+                return
+            self._return_idle(pair)
+
+    @contextmanager
+    def lease(self, route=None):
+        """Lease a supervisor/worker pair for the duration of one analysis.
+
+        An idle pair already configured for `route` is preferred, so pairs
+        rarely need reconfiguring. The pair is recycled when the block exits
+        normally or with a `keep_on` exception, and evicted when it raises
+        anything else, so a failed agent never serves the next run.
+        """
+        with tracer.span("agent.lease", route=route) as span:
+            pair = self._acquire(route)
+            span.set(supervisor_id=pair.supervisor_id, leases=pair.leases)
+        try:
+            yield pair
+        except self.keep_on:
+            pair.interrupted = True
+            self._release(pair)
+            raise
+        except BaseException:
+            self._evict(pair)
+            raise
+        else:
+            self._release(pair)
+
+    def stats(self):
+        with self._cond:
+            served = self._leases_served
+            return {
+                "size": self._size,
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "leases_served": served,
+                "evictions": self._evictions,
+                "avg_wait_seconds": round(self._wait_total / served, 3)
+                if served
+                else 0.0,
+                "max_wait_seconds": round(self._wait_max, 3),
+            }
+
+    def live_ids(self):
+        """IDs of the agents and blocks of pairs this pool owns."""
+        with self._cond:
+            pairs = list(self._owned.values())
+        return {
+            resource_id
+            for pair in pairs
+            for resource_id in (pair.supervisor_id, pair.worker_id, pair.block_id)
+        }
+
+    def retire_expired(self):
+        """Evict idle pairs older than `max_age`; leased ones go when returned."""
+        with self._cond:
+            expired = [pair for pair in self._idle if self._expired(pair)]
+            self._idle = [pair for pair in self._idle if pair not in expired]
+        for pair in expired:
+            self._evict(pair, in_use=False)
+
+    def _expired(self, pair):
+        return self.max_age is not None and time.time() - pair.created_at > self.max_age
+
+    def recycle_all(self):
+        """Retire every existing pair, e.g. after the agents' tool set changed.
+
+        Idle pairs are evicted now; leased pairs are evicted when returned.
+        """
+        with self._cond:
+            self._generation += 1
+            stale, self._idle = self._idle, []
+        for pair in stale:
+            self._evict(pair, in_use=False)
+
+    def close(self):
+        """Destroy idle pairs and stop handing out new leases."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pair in idle:
+            self._destroy_quietly(pair)
+        self._background.shutdown(wait=True)
+
+    def _acquire(self, route=None):
+        start = time.monotonic()
+        deadline = start + self.lease_timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Agent pool is closed")
+                if self._idle:
+                    matching = [
+                        i for i, idle in enumerate(self._idle) if idle.route == route
+                    ]
+                    pair = self._idle.pop(matching[-1] if matching else -1)
+                    self._mark_leased(pair, start)
+                    return pair
+                if self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            f"No agent pair available after {self.lease_timeout:.0f}s"
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                pair = self._new_pair()
+                if pair is None:
+                    raise RuntimeError("Failed to create agent pair")
+                with self._cond:
+                    self._mark_leased(pair, start)
+                return pair
+
+    def _mark_leased(self, pair, start):
+        waited = time.monotonic() - start
+        pair.leases += 1
+        self._in_use.add(pair.supervisor_id)
+        self._leases_served += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _release(self, pair):
+        with self._cond:
+            self._in_use.discard(pair.supervisor_id)
+        if (
+            pair.leases >= self.max_leases
+            or pair.generation < self._generation
+            or self._expired(pair)
+        ):
+            self._evict(pair, in_use=False)
+            return
+        self._submit(self._reset_and_return, pair)
+
+    def _submit(self, fn, pair):
+        try:
+            self._background.submit(fn, pair)
+        except RuntimeError:
+            # Executor already shut down by close(); finish the work inline.
+            fn(pair)
+
+    def _reset_and_return(self, pair):
+        try:
+            self._reset_pair(pair)
+        except Exception as e:
+            print(f"Error resetting agent pair {pair.supervisor_id}: {e}")
+            self._evict(pair, in_use=False)
+            return
+        self._return_idle(pair)
+
+    def _return_idle(self, pair):
+        with self._cond:
+            if self._closed:
+                self._size -= 1
+                closed = True
+            else:
+                self._idle.append(pair)
+                self._cond.notify()
+                closed = False
+        if closed:
+            self._destroy_quietly(pair)
+
+    def _evict(self, pair, in_use=True):
+        with self._cond:
+            if in_use:
+                self._in_use.discard(pair.supervisor_id)
+            self._size -= 1
+            self._evictions += 1
+            self._cond.notify()
+        print(f"Evicting agent pair {pair.supervisor_id}")
+        self._submit(self._destroy_quietly, pair)
+
+    def _new_pair(self):
+        generation = self._generation
+        try:
+            pair = self._create_pair(self.new_worker_tag())
+            pair.generation = generation
+            with self._cond:
+                self._owned[pair.supervisor_id] = pair
+            return pair
+        except Exception as e:
+            print(f"Error creating agent pair: {e}")
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return None
+
+    def _destroy_quietly(self, pair):
+        try:
+            self._destroy_pair(pair)
+        except Exception as e:
+            # Left for the reaper once the pair's resources expire
+            print(f"Error deleting agent pair {pair.supervisor_id}: {e}")
+        finally:
+            with self._cond:
+                self._owned.pop(pair.supervisor_id, None)
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from github import IssueState
+from schema import GitHubIssueAnalysis
+
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1000"))
+ANALYSIS_CACHE_MEMORY_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MEMORY_ENTRIES", "128"))
+
+
+class AnalysisCache:
+    """Persistent cache of validated analyses keyed by normalized issue URL.
+
+    Entries live in SQLite so they survive restarts and are shared between
+    uvicorn workers, with an in-memory LRU in front for hot issues. An entry
+    is only served while it is younger than `ttl` and was produced for the
+    same issue `updated_at` and default-branch head SHA as the current
+    `IssueState`. When the state is unknown (GitHub unreachable) the TTL alone
+    decides.
+    """
+
+    def __init__(
+        self,
+        path=os.path.join(CACHE_DIR, "analysis.sqlite3"),
+        ttl=ANALYSIS_CACHE_TTL,
+        max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+        memory_entries=ANALYSIS_CACHE_MEMORY_ENTRIES,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS analyses (
+                issue_url TEXT PRIMARY KEY,
+                issue_updated_at TEXT,
+                head_sha TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                payload TEXT NOT NULL
+            )"""
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, issue_url: str, state: IssueState | None = None):
+        with self._lock:
+            entry = self._memory.get(issue_url)
+            if entry is not None and self._is_fresh(entry, state):
+                self._memory.move_to_end(issue_url)
+                return self._hit(issue_url, entry)
+            # Another worker may have stored a newer entry, so check the
+            # database before declaring the in-memory copy stale
+            self._memory.pop(issue_url, None)
+
+            row = self._db.execute(
+                "SELECT issue_updated_at, head_sha, created_at, payload "
+                "FROM analyses WHERE issue_url = ?",
+                (issue_url,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            updated_at, head_sha, created_at, payload = row
+            entry = (
+                IssueState(updated_at, head_sha),
+                created_at,
+                GitHubIssueAnalysis.model_validate_json(payload),
+            )
+            if not self._is_fresh(entry, state):
+                self._delete(issue_url)
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._remember(issue_url, entry)
+            return self._hit(issue_url, entry)
+
+    def put(
+        self,
+        issue_url: str,
+        state: IssueState | None,
+        analysis: GitHubIssueAnalysis,
+    ):
+        now = time.time()
+        state = state or IssueState(None, None)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    issue_url,
+                    state.issue_updated_at,
+                    state.head_sha,
+                    now,
+                    now,
+                    analysis.model_dump_json(),
+                ),
+            )
+            # Size-bounded eviction of the least recently used entries
+            evicted = self._db.execute(
+                "DELETE FROM analyses WHERE issue_url IN ("
+                "SELECT issue_url FROM analyses ORDER BY last_access DESC "
+                "LIMIT -1 OFFSET ?) RETURNING issue_url",
+                (self.max_entries,),
+            ).fetchall()
+            self._db.commit()
+            for (evicted_url,) in evicted:
+                self._memory.pop(evicted_url, None)
+            self._remember(issue_url, (state, now, analysis))
+
+    def invalidate(self, issue_url: str):
+        with self._lock:
+            self._delete(issue_url)
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def _is_fresh(self, entry, state):
+        entry_state, created_at, _ = entry
+        if time.time() - created_at > self.ttl:
+            return False
+        return state is None or state == entry_state
+
+    def _hit(self, issue_url, entry):
+        self._db.execute(
+            "UPDATE analyses SET last_access = ? WHERE issue_url = ?",
+            (time.time(), issue_url),
+        )
+        self._db.commit()
+        self.hits += 1
+        return entry[2]
+
+    def _remember(self, issue_url, entry):
+        self._memory[issue_url] = entry
+        self._memory.move_to_end(issue_url)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _delete(self, issue_url):
+        self._memory.pop(issue_url, None)
+        self._db.execute("DELETE FROM analyses WHERE issue_url = ?", (issue_url,))
+        self._db.commit()
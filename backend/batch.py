@@ -0,0 +1,438 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from analysis_cache import CACHE_DIR
+from github import parse_issue_url
+from jobs import JobEvents
+from rate_limits import BATCH, RateLimitedError, is_rate_limit_message, upstreams
+from sections import REPO_SECTIONS
+from tracing import bind, tracer
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+BATCH_MAX_ISSUES = int(os.getenv("BATCH_MAX_ISSUES", "200"))
+BATCH_RETRIES = int(os.getenv("BATCH_RETRIES", "3"))
+# Wait before retrying a rate-limited analysis when the upstream gives no hint
+BATCH_BACKOFF = 60.0
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def batch_id_for(issue_urls=(), repo=None, labels=()):
+    """Deterministic batch ID, so submitting the same batch again resumes it."""
+    key = json.dumps(
+        {"issue_urls": sorted(issue_urls), "repo": repo, "labels": sorted(labels)}
+    )
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def rate_limit_delay(error: Exception):
+    """Seconds to wait before retrying after `error`, or None if it wasn't
+    caused by a rate limit."""
+    if isinstance(error, RateLimitedError):
+        return error.retry_after or BATCH_BACKOFF
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(
+        response, "status_code", None
+    )
+    if status == 429:
+        retry_after = (
+            response.headers.get("retry-after") if response is not None else None
+        )
+        return float(retry_after) if retry_after else BATCH_BACKOFF
+    # Provider rate limits inside a Letta run only surface as a failed run
+    if is_rate_limit_message(error):
+        return BATCH_BACKOFF
+    return None
+
+
+class BatchStore:
+    """Per-issue progress of batches in SQLite, so an interrupted batch resumes
+    where it stopped instead of starting over."""
+
+    def __init__(self, path=os.path.join(CACHE_DIR, "batches.sqlite3")):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS batch_items (
+                batch_id TEXT NOT NULL,
+                issue_url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                PRIMARY KEY (batch_id, issue_url)
+            )"""
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def add(self, batch_id: str, issue_urls):
+        """Add issues not yet in the batch; existing ones keep their progress."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO batch_items "
+                "(batch_id, issue_url, position, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (batch_id, issue_url, position, PENDING, now)
+                    for position, issue_url in enumerate(issue_urls)
+                ],
+            )
+            self._db.commit()
+
+    def items(self, batch_id: str):
+        """`(issue_url, status, result, error)` rows in submission order."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT issue_url, status, result, error FROM batch_items "
+                "WHERE batch_id = ? ORDER BY position",
+                (batch_id,),
+            ).fetchall()
+
+    def finish(self, batch_id, issue_url, status, result=None, error=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE batch_items SET status = ?, updated_at = ?, result = ?, "
+                "error = ? WHERE batch_id = ? AND issue_url = ?",
+                (status, time.time(), result, error, batch_id, issue_url),
+            )
+            self._db.commit()
+
+    def summary(self, batch_id: str):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM batch_items WHERE batch_id = ? "
+                "GROUP BY status",
+                (batch_id,),
+            ).fetchall()
+        if not rows:
+            return None
+        counts = {PENDING: 0, COMPLETED: 0, FAILED: 0, **dict(rows)}
+        return {"batch_id": batch_id, "issues": sum(counts.values()), **counts}
+
+
+class BatchRunner:
+    """Analyzes many issues with bounded parallelism, one repository at a time.
+
+    Issues are grouped by repository. The first issue of each repository runs
+    alone; its `project_context` and `build_and_test` are then given to the
+    repository's other issues, which also reuse its file index and cached tool
+    results, so each repository is explored once. Up to `concurrency`
+    analyses run at once across repositories. A rate-limited analysis is
+    retried up to `retries` times, and new analyses wait out the delay the
+    upstream asked for. Progress is kept in `store`: running a batch again
+    replays completed issues and only analyzes the rest.
+
+    Example usage:
+    ```for record in runner.run(batch_id, issue_urls):
+        print(json.dumps(record))
+    ```
+    """
+
+    def __init__(
+        self,
+        run_fn,
+        store: BatchStore,
+        concurrency=BATCH_CONCURRENCY,
+        retries=BATCH_RETRIES,
+    ):
+        self._run_fn = run_fn
+        self.store = store
+        self.concurrency = concurrency
+        self.retries = retries
+
+    def run(self, batch_id: str, issue_urls, refresh=False, should_stop=None):
+        """Yield a record per issue as it finishes, then a summary record.
+
+        Issues already completed in an earlier run are yielded first, marked
+        `resumed`; `refresh` only bypasses the analysis cache for the rest.
+        With `should_stop`, running analyses are cancelled once it returns
+        True and unfinished issues stay pending for the next run.
+        """
+        started = time.monotonic()
+        should_stop = should_stop or (lambda: False)
+        self.store.add(batch_id, issue_urls)
+        wanted = set(issue_urls)
+        counts = Counter()
+
+        contexts, pending = {}, []
+        for issue_url, status, result, _ in self.store.items(batch_id):
+            if issue_url not in wanted:
+                continue
+            if status != COMPLETED:
+                pending.append(issue_url)
+                continue
+            result = json.loads(result)
+            contexts.setdefault(_repo(issue_url), _repo_context(result))
+            counts[COMPLETED] += 1
+            counts["resumed"] += 1
+            yield _record(issue_url, COMPLETED, result=result, resumed=True)
+
+        # Repositories without a known context start with one issue, the rest
+        # of their issues wait for its sections
+        ready, waiting = deque(), {}
+        for issue_url in pending:
+            repo = _repo(issue_url)
+            if repo in contexts:
+                ready.append(issue_url)
+            elif repo in waiting:
+                waiting[repo].append(issue_url)
+            else:
+                ready.append(issue_url)
+                waiting[repo] = []
+
+        attempts = Counter()
+        paused_until = 0.0
+        futures = {}
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="batch"
+        )
+        try:
+            while ready or futures:
+                stopped = should_stop()
+                while (
+                    ready
+                    and not stopped
+                    and len(futures) < self.concurrency
+                    and time.monotonic() >= paused_until
+                ):
+                    issue_url = ready.popleft()
+                    future = executor.submit(
+                        bind(self._analyze),
+                        batch_id,
+                        issue_url,
+                        refresh,
+                        should_stop,
+                        contexts.get(_repo(issue_url)),
+                    )
+                    futures[future] = issue_url
+                if not futures:
+                    if stopped:
+                        break
+                    time.sleep(min(max(paused_until - time.monotonic(), 0.0), 1.0))
+                    continue
+
+                done, _ = wait(futures, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    issue_url = futures.pop(future)
+                    repo = _repo(issue_url)
+                    try:
+                        result = future.result()
+                        if result is None:
+                            raise RuntimeError("No analysis was produced")
+                    except Exception as e:
+                        if should_stop():
+                            continue  # Left pending for the next run
+                        delay = rate_limit_delay(e)
+                        attempts[issue_url] += 1
+                        if delay is not None and attempts[issue_url] <= self.retries:
+                            print(f"Rate limited on {issue_url}, retry in {delay:g}s")
+                            paused_until = max(paused_until, time.monotonic() + delay)
+                            ready.appendleft(issue_url)
+                            continue
+                        self.store.finish(batch_id, issue_url, FAILED, error=str(e))
+                        counts[FAILED] += 1
+                        # The next issue of the repository takes over exploring it
+                        if waiting.get(repo):
+                            ready.append(waiting[repo].pop(0))
+                        yield _record(issue_url, FAILED, error=str(e))
+                        continue
+
+                    payload = result.model_dump(mode="json")
+                    self.store.finish(
+                        batch_id, issue_url, COMPLETED, result=json.dumps(payload)
+                    )
+                    counts[COMPLETED] += 1
+                    if repo not in contexts:
+                        contexts[repo] = _repo_context(payload)
+                        ready.extend(waiting.pop(repo, []))
+                    yield _record(issue_url, COMPLETED, result=payload)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        yield {
+            "type": "summary",
+            "batch_id": batch_id,
+            "issues": len(wanted),
+            "completed": counts[COMPLETED],
+            "failed": counts[FAILED],
+            "resumed": counts["resumed"],
+            "pending": len(wanted) - counts[COMPLETED] - counts[FAILED],
+            "seconds": round(time.monotonic() - started, 1),
+        }
+
+    def _analyze(self, batch_id, issue_url, refresh, should_stop, repo_context):
+        # Batch calls yield to interactive ones at every shared rate limit
+        with upstreams.priority(BATCH), tracer.span(
+            "batch.issue",
+            batch_id=batch_id,
+            issue_url=issue_url,
+            known=repo_context is not None,
+        ):
+            return self._run_fn(
+                issue_url,
+                refresh,
+                should_stop,
+                None,
+                repo_context=repo_context,
+            )
+
+
+def _repo(issue_url: str):
+    return parse_issue_url(issue_url).full_name
+
+
+def _repo_context(analysis: dict):
+    return {name: analysis[name] for name in REPO_SECTIONS if analysis.get(name)}
+
+
+def _record(issue_url, status, result=None, error=None, resumed=False):
+    record = {"type": "issue", "issue_url": issue_url, "status": status}
+    if result is not None:
+        record["result"] = result
+    if error is not None:
+        record["error"] = error
+    if resumed:
+        record["resumed"] = True
+    return record
+
+
+class BatchManager:
+    """Runs batches on background threads for the API.
+
+    Each running batch publishes its records to a `JobEvents` log that any
+    number of clients can follow; starting a batch that is already running
+    returns its log instead of running it twice.
+    """
+
+    def __init__(self, runner: BatchRunner):
+        self.runner = runner
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def start(self, batch_id: str, issue_urls, refresh=False):
+        with self._lock:
+            if batch_id in self._active:
+                return self._active[batch_id][0]
+            events, stop = JobEvents(), threading.Event()
+            self._active[batch_id] = (events, stop)
+        thread = threading.Thread(
+            target=bind(self._run),
+            args=(batch_id, issue_urls, refresh, events, stop),
+            name=f"batch-{batch_id}",
+            daemon=True,
+        )
+        thread.start()
+        return events
+
+    def _run(self, batch_id, issue_urls, refresh, events, stop):
+        try:
+            for record in self.runner.run(batch_id, issue_urls, refresh, stop.is_set):
+                events.publish(record["type"], record)
+        except Exception as e:
+            print(f"Error running batch {batch_id}: {e}")
+            events.publish("error", {"type": "error", "detail": str(e)})
+        finally:
+            events.close()
+            with self._lock:
+                self._active.pop(batch_id, None)
+
+    def running(self, batch_id: str):
+        with self._lock:
+            return batch_id in self._active
+
+    def stop(self, batch_id: str):
+        """Cancel a running batch; its unfinished issues stay pending."""
+        with self._lock:
+            active = self._active.get(batch_id)
+        if active is None:
+            return False
+        active[1].set()
+        return True
+
+    def shutdown(self):
+        with self._lock:
+            batch_ids = list(self._active)
+        for batch_id in batch_ids:
+            self.stop(batch_id)
+
+    def stats(self):
+        with self._lock:
+            running = list(self._active)
+        return {
+            "running": running,
+            "concurrency": self.runner.concurrency,
+            "max_issues": BATCH_MAX_ISSUES,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Analyze many GitHub issues, writing one JSON line per issue"
+    )
+    parser.add_argument("issue_urls", nargs="*")
+    parser.add_argument("--repo", help="Also analyze this owner/repo's open issues")
+    parser.add_argument(
+        "--label",
+        action="append",
+        default=[],
+        help="Only issues with this label (repeatable), e.g. 'good first issue'",
+    )
+    parser.add_argument("--limit", type=int, default=BATCH_MAX_ISSUES)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--refresh", action="store_true")
+    parser.add_argument(
+        "--batch-id", help="Resume this batch (default: derived from the arguments)"
+    )
+    parser.add_argument(
+        "--out", help="NDJSON output file (default: stdout); rewritten on resume"
+    )
+    args = parser.parse_args()
+
+    from agent import agent_pool, github_tools
+    from github import list_issue_urls, normalize_issue_url
+    from main import run_analysis
+    from mcp_client import mcp_pool
+
+    issue_urls = [normalize_issue_url(url) for url in args.issue_urls]
+    # Derived from the query rather than its results, so it survives new issues
+    batch_id = args.batch_id or batch_id_for(issue_urls, args.repo, args.label)
+    if args.repo:
+        issue_urls += list_issue_urls(args.repo, args.label, limit=args.limit)
+    issue_urls = list(dict.fromkeys(issue_urls))[: args.limit]
+    if not issue_urls:
+        parser.error("No issues to analyze")
+
+    print(f"Batch {batch_id}: {len(issue_urls)} issues", file=sys.stderr)
+    runner = BatchRunner(run_analysis, BatchStore(), concurrency=args.concurrency)
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        # The pipeline logs with print; keep stdout for records
+        with contextlib.redirect_stdout(sys.stderr):
+            for record in runner.run(batch_id, issue_urls, refresh=args.refresh):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        github_tools.stop()
+        agent_pool.close()
+        mcp_pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""Offline benchmark of the analysis API against recorded Letta/MCP sessions.
+
+Record sessions once against the real services (needs LETTA_API_KEY and
+network access):
+
+    uv run python bench.py record https://github.com/owner/repo/issues/1 --out bench
+
+Replay them, or the built-in synthetic session, with no network access:
+
+    uv run python bench.py run bench/*.json --concurrency 8 --requests 32 --scale 0.05
+    uv run python bench.py run --baseline baseline.json --max-regression 0.2
+
+`run` drives the FastAPI app in-process and reports latency percentiles,
+throughput, threadpool saturation and memory. With `--baseline` it exits
+non-zero when p95 latency or throughput regressed by more than
+`--max-regression`, so it can gate performance changes.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SAMPLE_INTERVAL = 0.05
+
+
+def _isolate(mode=None):
+    """Point caches and traces at a scratch directory and turn off the stages
+    that reach the network outside the replayed services. Must run before the
+    app's modules are imported, since they read the environment at import."""
+    os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-")
+    os.environ["TRACE_FILE"] = ""
+    os.environ["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"] = ""
+    os.environ["RETRIEVAL_TOP_K"] = "0"
+    os.environ["LETTA_CALLBACK_URL"] = ""
+    # Replayed upstreams have no rate limits to respect
+    for upstream in ("GITHUB", "GITHUB_SEARCH", "ANTHROPIC", "GEMINI"):
+        os.environ[f"{upstream}_RATE_PER_MINUTE"] = "1000000"
+        os.environ[f"{upstream}_RATE_BURST"] = "100000"
+    if mode:
+        os.environ["ANALYSIS_MODE"] = mode
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def record(args):
+    _isolate(args.mode)
+    import agent
+    import main
+    from github import (
+        fetch_issue_state,
+        fetch_repo_size,
+        normalize_issue_url,
+        parse_issue_url,
+    )
+    from replay import Recorder, RecordingLetta, record_mcp, save_session
+
+    letta_client = agent.get_letta_client()
+    recorder = Recorder()
+    agent._letta_client = RecordingLetta(letta_client, recorder)
+    os.makedirs(args.out, exist_ok=True)
+    try:
+        with record_mcp(recorder):
+            for issue_url in args.issue_urls:
+                issue_url = normalize_issue_url(issue_url)
+                print(f"Recording {issue_url}")
+                main.run_analysis(issue_url, refresh=True)
+                session = recorder.session(
+                    letta_client, issue_url, fetch_issue_state(issue_url)
+                )
+                ref = parse_issue_url(issue_url)
+                session["repo_size_kb"] = fetch_repo_size(ref.owner, ref.repo)
+                path = os.path.join(
+                    args.out, f"{ref.owner}-{ref.repo}-{ref.number}.json"
+                )
+                save_session(session, path)
+                print(f"Saved session to {path}")
+    finally:
+        agent.github_tools.stop()
+        agent.agent_pool.close()
+        main.mcp_pool.close()
+
+
+async def _drive(app, issue_urls, concurrency, samples):
+    """POST /analyze for every URL, `concurrency` at a time, sampling the
+    threadpool and job workers meanwhile."""
+    import anyio
+    import httpx
+
+    import main
+
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+    stop = asyncio.Event()
+
+    async def sample():
+        limiter = anyio.to_thread.current_default_thread_limiter()
+        while not stop.is_set():
+            samples.append(
+                {
+                    "threads_in_use": limiter.borrowed_tokens,
+                    "threads_total": limiter.total_tokens,
+                    "jobs_running": main.analysis_jobs.stats()["running"],
+                    "jobs_queued": main.analysis_jobs.stats()["queued"],
+                    "pairs_in_use": main.agent_pool.stats()["in_use"],
+                }
+            )
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def request(client, issue_url):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(
+                "/analyze", params={"refresh": "true"}, json={"github_url": issue_url}
+            )
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code != 200:
+                print(
+                    f"{issue_url}: {response.status_code} {response.text[:200]}",
+                    file=sys.stderr,
+                )
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            sampler = asyncio.create_task(sample())
+            start = time.perf_counter()
+            await asyncio.gather(*(request(client, url) for url in issue_urls))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await sampler
+    return latencies, statuses, elapsed
+
+
+def run(args):
+    _isolate(args.mode)
+    os.environ["LETTA_API_KEY"] = "replay"
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    import agent
+    import main
+    import prefetch
+    from github import parse_issue_url
+    from prefetch import GITHUB_MCP_URL
+    from replay import (
+        ReplayLetta,
+        ReplayMCPClient,
+        ReplaySessions,
+        load_sessions,
+        synthetic_session,
+    )
+
+    recorded = load_sessions(args.sessions) or [synthetic_session()]
+    sessions = ReplaySessions(recorded, scale=args.scale)
+    letta = ReplayLetta(sessions)
+    agent._letta_client = letta
+    main.fetch_issue_state = sessions.issue_state
+    prefetch.fetch_repo_size = sessions.repo_size
+    main.mcp_pool._clients[GITHUB_MCP_URL] = ReplayMCPClient(
+        sessions,
+        GITHUB_MCP_URL,
+        max_concurrency=main.mcp_pool.max_concurrency,
+        timeout=main.mcp_pool.timeout,
+        cache=main.mcp_pool.cache,
+    )
+
+    issue_urls = []
+    for i in range(args.requests):
+        issue_url = recorded[i % len(recorded)]["issue_url"]
+        if not args.same_issue:
+            # Distinct issues keep concurrent requests from sharing one run
+            ref = parse_issue_url(issue_url)
+            issue_url = f"{ref.url.rsplit('/', 1)[0]}/{ref.number + 1000 + i}"
+        issue_urls.append(issue_url)
+
+    samples = []
+    # The pipeline logs every message; keep the report readable
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+        latencies, statuses, elapsed = asyncio.run(
+            _drive(main.app, issue_urls, args.concurrency, samples)
+        )
+
+    in_use = [sample["threads_in_use"] for sample in samples] or [0]
+    total = samples[0]["threads_total"] if samples else 0
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scale": args.scale,
+        "mode": os.environ.get("ANALYSIS_MODE", "supervisor"),
+        "sessions": len(recorded),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "latency_seconds": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies, default=0.0), 3),
+        },
+        "threadpool": {
+            "size": total,
+            "max_in_use": max(in_use),
+            "avg_in_use": round(sum(in_use) / len(in_use), 2),
+            "saturated_ratio": round(
+                sum(1 for used in in_use if total and used >= total) / len(in_use), 3
+            ),
+        },
+        "jobs": {
+            "workers": main.analysis_jobs.max_workers,
+            "max_running": max((s["jobs_running"] for s in samples), default=0),
+            "max_queued": max((s["jobs_queued"] for s in samples), default=0),
+        },
+        "agent_pairs": {
+            "max_size": main.agent_pool.max_size,
+            "max_in_use": max((s["pairs_in_use"] for s in samples), default=0),
+        },
+        "memory": {
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            "max_rss_mb": round(
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                / (1024 * 1024 if sys.platform == "darwin" else 1024),
+                1,
+            ),
+            "tracemalloc_peak_mb": round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            if args.tracemalloc
+            else None,
+        },
+        "letta_calls": dict(sorted(letta.calls.items())),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            return 1
+    return 0 if set(statuses) == {200} else 1
+
+
+def compare(report: dict, baseline: dict, max_regression: float):
+    """Ways `report` is worse than `baseline` by more than `max_regression`."""
+    regressions = []
+    p95, base_p95 = report["latency_seconds"]["p95"], baseline["latency_seconds"]["p95"]
+    if base_p95 and p95 > base_p95 * (1 + max_regression):
+        regressions.append(f"p95 latency {p95}s vs {base_p95}s in the baseline")
+    rps, base_rps = report["throughput_rps"], baseline["throughput_rps"]
+    if base_rps and rps < base_rps * (1 - max_regression):
+        regressions.append(f"throughput {rps}/s vs {base_rps}/s in the baseline")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser(
+        "record", help="Record sessions against the real Letta and MCP services"
+    )
+    record_parser.add_argument("issue_urls", nargs="+")
+    record_parser.add_argument("--out", default="bench", help="Session directory")
+    record_parser.add_argument("--mode", choices=["supervisor", "sectioned"])
+    record_parser.set_defaults(handler=record)
+
+    run_parser = subparsers.add_parser(
+        "run", help="Replay sessions through the API and report performance"
+    )
+    run_parser.add_argument(
+        "sessions", nargs="*", help="Recorded session files (default: synthetic)"
+    )
+    run_parser.add_argument("--concurrency", type=int, default=4)
+    run_parser.add_argument("--requests", type=int, default=16)
+    run_parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplier for recorded latencies, e.g. 0.05 to replay 20x faster",
+    )
+    run_parser.add_argument("--mode", choices=["supervisor", "sectioned"])
+    run_parser.add_argument(
+        "--same-issue",
+        action="store_true",
+        help="Send every request for the recorded issue, so they share runs",
+    )
+    run_parser.add_argument(
+        "--tracemalloc", action="store_true", help="Also report peak Python heap"
+    )
+    run_parser.add_argument(
+        "--verbose", action="store_true", help="Show the pipeline's own logging"
+    )
+    run_parser.add_argument("--out", help="Write the JSON report here")
+    run_parser.add_argument("--baseline", help="Report to compare against")
+    run_parser.add_argument("--max-regression", type=float, default=0.2)
+    run_parser.set_defaults(handler=run)
+
+    args = parser.parse_args()
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from analysis_cache import ANALYSIS_CACHE_TTL, CACHE_DIR
+from mcp_client import mcp_pool
+from prefetch import fetch_files
+from repo_index import repo_indexes
+from schema import CodeRef
+
+# Key sections quote code read from the repository and carry a reference to it
+CODE_REFS = os.getenv("CODE_REFS", "1") == "1"
+CODE_SLICE_CACHE_MAX_FILES = int(os.getenv("CODE_SLICE_CACHE_MAX_FILES", "5000"))
+
+
+def slice_lines(text: str, line_start: int, line_end: int):
+    lines = text.splitlines()
+    return "\n".join(lines[max(line_start, 1) - 1 : max(line_end, 0)])
+
+
+def slice_hash(text: str):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CodeSliceCache:
+    """Files at pinned commits, read once for key sections and slice requests.
+
+    Contents at a commit never change, so entries don't expire; the least
+    recently read files beyond `max_files` are dropped. Missing files are read
+    from the local checkout when it is at that commit, and otherwise through
+    GitHub MCP with the commit pinned. `add_refs` records the files analyses
+    point clients at, for `ref_ttl` seconds, so the slice endpoint serves
+    those and nothing else.
+
+    Example usage:
+    ```code_slices.add_refs("owner/repo", sha, ["src/app.py"])
+    if code_slices.is_referenced("owner/repo", sha, "src/app.py"):
+        code_slices.slice("owner/repo", sha, "src/app.py", 10, 24)
+    code_slices.files("owner/repo", sha, ["src/app.py", "README.md"])
+    ```
+    """
+
+    def __init__(
+        self,
+        path=os.path.join(CACHE_DIR, "code_slices.sqlite3"),
+        max_files=CODE_SLICE_CACHE_MAX_FILES,
+        ref_ttl=ANALYSIS_CACHE_TTL,
+    ):
+        self.max_files = max_files
+        self.ref_ttl = ref_ttl
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                path TEXT NOT NULL,
+                last_access REAL NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (repo, sha, path)
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS refs (
+                repo TEXT NOT NULL,
+                sha TEXT NOT NULL,
+                path TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (repo, sha, path)
+            )"""
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.local_reads = 0
+        self.fetched = 0
+        self.failed = 0
+
+    def files(self, repo: str, sha: str, paths):
+        """Contents of `paths` in `repo` at `sha`; unreadable files are left out."""
+        files, missing = {}, []
+        with self._lock:
+            for path in dict.fromkeys(paths):
+                row = self._db.execute(
+                    "SELECT content FROM files WHERE repo = ? AND sha = ? AND path = ?",
+                    (repo, sha, path),
+                ).fetchone()
+                if row is None:
+                    missing.append(path)
+                    continue
+                files[path] = row[0]
+                self.hits += 1
+                self._db.execute(
+                    "UPDATE files SET last_access = ? "
+                    "WHERE repo = ? AND sha = ? AND path = ?",
+                    (time.time(), repo, sha, path),
+                )
+            self._db.commit()
+        if missing:
+            read = self._read(repo, sha, missing)
+            with self._lock:
+                self.failed += len(missing) - len(read)
+                for path, content in read.items():
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO files (repo, sha, path, "
+                        "last_access, content) VALUES (?, ?, ?, ?, ?)",
+                        (repo, sha, path, time.time(), content),
+                    )
+                self._db.execute(
+                    "DELETE FROM files WHERE rowid NOT IN "
+                    "(SELECT rowid FROM files ORDER BY last_access DESC LIMIT ?)",
+                    (self.max_files,),
+                )
+                self._db.commit()
+            files.update(read)
+        return files
+
+    def add_refs(self, repo: str, sha: str, paths):
+        """Record that an analysis references `paths` in `repo` at `sha`."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?)",
+                [(repo, sha, path, now) for path in dict.fromkeys(paths)],
+            )
+            self._db.execute(
+                "DELETE FROM refs WHERE created_at < ?", (now - self.ref_ttl,)
+            )
+            self._db.commit()
+
+    def is_referenced(self, repo: str, sha: str, path: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT created_at FROM refs WHERE repo = ? AND sha = ? AND path = ?",
+                (repo, sha, path),
+            ).fetchone()
+        return row is not None and row[0] >= time.time() - self.ref_ttl
+
+    def slice(self, repo: str, sha: str, path: str, line_start: int, line_end: int):
+        """Lines `line_start` to `line_end` of `path`, or None if it can't be read."""
+        content = self.files(repo, sha, [path]).get(path)
+        if content is None:
+            return None
+        return slice_lines(content, line_start, line_end)
+
+    def _read(self, repo, sha, paths):
+        owner, name = repo.split("/", 1)
+        read = {}
+        # Another commit's sync never touches this one's checkout
+        index = repo_indexes.get(owner, name, sha)
+        if index is not None:
+            for path in paths:
+                try:
+                    read[path] = index.read_lines(path, numbered=False)
+                except (OSError, ValueError):
+                    pass  # Not in the checkout, e.g. a directory
+            with self._lock:
+                self.local_reads += len(read)
+        remote = [path for path in paths if path not in read]
+        if remote:
+            try:
+                fetched = mcp_pool.run(fetch_files(owner, name, remote, sha))
+            except Exception as e:
+                print(f"Error fetching files of {repo}@{sha}: {e}")
+                fetched = {}
+            with self._lock:
+                self.fetched += len(fetched)
+            read.update(fetched)
+        return read
+
+    def stats(self):
+        with self._lock:
+            (files,) = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+            (refs,) = self._db.execute("SELECT COUNT(*) FROM refs").fetchone()
+            return {
+                "files": files,
+                "refs": refs,
+                "hits": self.hits,
+                "local_reads": self.local_reads,
+                "fetched": self.fetched,
+                "failed": self.failed,
+            }
+
+
+code_slices = CodeSliceCache()
+
+
+def _key_sections(files: dict, prefix=""):
+    for name, info in files.items():
+        path = f"{prefix}{name.strip('/')}"
+        if info.files:
+            yield from _key_sections(info.files, f"{path}/")
+        for section in info.key_sections or []:
+            yield path, section
+
+
+def attach_code_refs(analysis, repo: str, sha: str, cache=code_slices):
+    """Replace the quoted code of every key section with the actual lines at
+    `sha` and record where they came from. Sections of files that can't be
+    read keep the model's quote and get no reference. The referenced files are
+    recorded in `cache` for the slice endpoint. Returns how many sections got
+    one."""
+    sections = list(_key_sections(analysis.relevant_files))
+    files = cache.files(repo, sha, [path for path, _ in sections])
+    attached, paths = 0, set()
+    for path, section in sections:
+        content = files.get(path)
+        if content is None:
+            continue
+        code = slice_lines(content, section.line_start, section.line_end)
+        if not code.strip():
+            continue  # Lines past the end of the file
+        section.code = code
+        section.ref = CodeRef(
+            repo=repo,
+            sha=sha,
+            path=path,
+            line_start=section.line_start,
+            line_end=section.line_end,
+            hash=slice_hash(code),
+        )
+        attached += 1
+        paths.add(path)
+    if paths:
+        cache.add_refs(repo, sha, paths)
+    return attached
+
+
+def strip_code(data: dict):
+    """Drop the code of key sections that carry a reference from a dumped
+    analysis, in place; clients fetch the slices they show."""
+    stack = [data.get("relevant_files") or {}]
+    while stack:
+        for info in stack.pop().values():
+            for section in info.get("key_sections") or []:
+                if section.get("ref"):
+                    section.pop("code", None)
+            if info.get("files"):
+                stack.append(info["files"])
+    return data
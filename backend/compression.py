@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, IdentityResponder
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are only gzipped
+    brotli = None
+
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1000"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# Streams are left alone: their bodies aren't known up front
+ETAG_EXCLUDED_CONTENT_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size, quality=BROTLI_QUALITY):
+        super().__init__(
+            app, minimum_size, exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES
+        )
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        if more_body:
+            return self._compressor.process(body) + self._compressor.flush()
+        return self._compressor.process(body) + self._compressor.finish()
+
+
+class BrotliMiddleware:
+    """Brotli-encode responses for clients that accept it, the way Starlette's
+    GZipMiddleware gzips them; a no-op when the `brotli` package is missing.
+    Add it before GZipMiddleware so gzip only handles the other clients.
+
+    Example usage:
+    ```app.add_middleware(BrotliMiddleware)
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+    ```
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if (
+            brotli is not None
+            and scope["type"] == "http"
+            and "br" in Headers(scope=scope).get("Accept-Encoding", "")
+        ):
+            responder = BrotliResponder(self.app, self.minimum_size)
+            await responder(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def etag_matches(etag: str, if_none_match: str | None):
+    """Weak comparison of `etag` against an If-None-Match header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tag = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == tag
+        for candidate in if_none_match.split(",")
+    )
+
+
+async def with_etag(request, response):
+    """Give a successful GET response an ETag, a weak one over its body unless
+    the endpoint set its own, and turn it into a 304 when the client's copy is
+    current."""
+    content_type = response.headers.get("content-type", "")
+    if (
+        request.method != "GET"
+        or response.status_code != 200
+        or content_type.startswith(ETAG_EXCLUDED_CONTENT_TYPES)
+    ):
+        return response
+    etag = response.headers.get("etag")
+    if etag is None:
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = f'W/"{hashlib.sha256(body).hexdigest()[:32]}"'
+        response = Response(body, headers={**response.headers, "etag": etag})
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        headers = {"etag": etag}
+        if "cache-control" in response.headers:
+            headers["cache-control"] = response.headers["cache-control"]
+        return Response(status_code=304, headers=headers)
+    return response
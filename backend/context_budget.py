@@ -0,0 +1,294 @@
+import os
+import threading
+import types
+import typing
+from collections import Counter
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+from pydantic.json_schema import SkipJsonSchema
+
+SESSION_BLOCK_LIMIT = int(os.getenv("SESSION_BLOCK_LIMIT", "20000"))
+TOOL_RETURN_CHAR_LIMIT = int(os.getenv("TOOL_RETURN_CHAR_LIMIT", "6000"))
+# Longest line window the repository tools hand to an agent in one call
+READ_WINDOW_LINES = 200
+# Rough conversion used where no tokenizer count is available
+CHARS_PER_TOKEN = 4
+
+# Per-tool caps on what a tool return may add to an agent's context, applied by
+# Letta as `return_char_limit`, which keeps the head of a return. GitHub MCP
+# returns aren't windowed: past its cap a long file loses its tail, which is
+# why agents are steered to `read_repository_lines` for line windows. Whole-file
+# reads get the most room; listings and searches are mostly skimmed.
+TOOL_RETURN_CHAR_LIMITS = {
+    "get_file_contents": 12000,
+    "read_repository_lines": 12000,
+    "get_commit": 8000,
+    "get_pull_request": 6000,
+    "search_repository": 6000,
+    "search_code": 4000,
+    "find_symbol": 3000,
+    "get_issue": 4000,
+    "list_commits": 3000,
+    "list_issues": 3000,
+    "list_pull_requests": 3000,
+    "search_issues": 3000,
+    "search_repositories": 2000,
+}
+
+# Share of the session block each prefetched section may use; findings written
+# by the agents get whatever is left
+LEDGER_BUDGETS = {
+    "issue": 0.15,
+    "repository": 0.2,
+    "candidates": 0.25,
+    # Repository-level sections given by an earlier analysis
+    "known": 0.15,
+}
+FINDINGS_HEADING = "## Findings"
+FINDINGS_NOTE = (
+    "(one line each: `- path:start-end: what it shows`; older lines are "
+    "compacted away when the block fills up)"
+)
+# Compact the findings once the block is this full, down to LEDGER_COMPACT_TO
+LEDGER_COMPACT_AT = 0.85
+LEDGER_COMPACT_TO = 0.7
+
+
+def tool_return_char_limit(tool_name: str):
+    return TOOL_RETURN_CHAR_LIMITS.get(tool_name, TOOL_RETURN_CHAR_LIMIT)
+
+
+def estimate_tokens(text: str):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def _clip(text: str, limit: int):
+    """Cut `text` to `limit` characters at a line boundary, marking the cut."""
+    if len(text) <= limit:
+        return text
+    marker = "\n… (truncated)"
+    cut = text.rfind("\n", 0, max(limit - len(marker), 0))
+    if cut <= 0:
+        cut = max(limit - len(marker), 0)
+    return text[:cut] + marker
+
+
+def _short(description: str | None, limit=70):
+    if not description:
+        return ""
+    description = description.split(". ")[0].rstrip(".")
+    if len(description) > limit:
+        description = description[: limit - 1] + "…"
+    return description
+
+
+def _references(model, target, seen=None):
+    """Whether `model`'s fields refer to `target`, directly or transitively."""
+    seen = seen if seen is not None else set()
+    for field in model.model_fields.values():
+        for annotation in _walk(field.annotation):
+            if annotation is target:
+                return True
+            if annotation not in seen:
+                seen.add(annotation)
+                if _references(annotation, target, seen):
+                    return True
+    return False
+
+
+def _walk(annotation):
+    """Model classes mentioned anywhere in a type annotation."""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        yield annotation
+    for arg in typing.get_args(annotation):
+        yield from _walk(arg)
+
+
+class _SchemaRenderer:
+    def __init__(self):
+        self.named = {}
+
+    def type(self, annotation, indent):
+        origin = typing.get_origin(annotation)
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if origin in (typing.Union, types.UnionType):
+            return " | ".join(self.type(arg, indent) for arg in args) + " | null"
+        if origin is list:
+            return f"[{self.type(args[0], indent)}]"
+        if origin is dict:
+            return f"{{[key: string]: {self.type(args[1], indent)}}}"
+        if origin is typing.Literal:
+            return " | ".join(repr(arg) for arg in typing.get_args(annotation))
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            if _references(annotation, annotation):
+                # Recursive models are spelled out once, after the main object
+                if annotation.__name__ not in self.named:
+                    self.named[annotation.__name__] = None
+                    self.named[annotation.__name__] = self.object(annotation, "")
+                return annotation.__name__
+            return self.object(annotation, indent)
+        return {str: "string", int: "integer", float: "number", bool: "boolean"}.get(
+            annotation, "any"
+        )
+
+    def object(self, model, indent):
+        inner = indent + "  "
+        lines = ["{"]
+        for name, field in model.model_fields.items():
+            if any(isinstance(meta, SkipJsonSchema) for meta in field.metadata):
+                continue  # Filled in by the server
+            optional = "" if field.is_required() else "?"
+            comment = _short(field.description)
+            line = f"{inner}{name}{optional}: {self.type(field.annotation, inner)},"
+            lines.append(f"{line}  // {comment}" if comment else line)
+        lines.append(indent + "}")
+        return "\n".join(lines)
+
+
+def compact_schema(annotation):
+    """A TypeScript-like outline of a model (or any field type) for prompts.
+
+    It's a fraction of the size of the JSON schema while keeping every field,
+    its type and a one-line description. `?` marks optional fields.
+    """
+    renderer = _SchemaRenderer()
+    text = renderer.type(annotation, "")
+    for name, definition in renderer.named.items():
+        text += f"\n\nwhere {name} = {definition}"
+    return text
+
+
+class SessionLedger:
+    """Layout of the shared `analysis_session` block under a size cap.
+
+    The prefetched sections (issue, repository, retrieved candidates) each get
+    a fixed share of `limit`; the rest is reserved for a findings ledger that
+    agents append one line per finding to. `compact()` keeps that ledger
+    within budget by dropping duplicate and then the oldest findings.
+
+    Example usage:
+    ```value = session_ledger.render(issue_url, {"issue": ..., "repository": ...})
+    compacted = session_ledger.compact(block.value)  # None if within budget
+    ```
+    """
+
+    def __init__(self, limit=SESSION_BLOCK_LIMIT):
+        self.limit = limit
+
+    def render(self, issue_url=None, sections=None, findings=()):
+        if issue_url is None:
+            return "GitHub Issue Analysis Session\nTarget: (idle)"
+        parts = [f"GitHub Issue Analysis Session\nTarget: {issue_url}"]
+        for name, text in (sections or {}).items():
+            if text:
+                budget = int(self.limit * LEDGER_BUDGETS.get(name, 0.1))
+                parts.append(_clip(text.strip(), budget))
+        head = "\n\n".join(parts)
+        return self._with_findings(head, list(findings), self.limit)
+
+    def compact(self, value: str):
+        """Compacted block value, or None when `value` is still within budget."""
+        if len(value) < self.limit * LEDGER_COMPACT_AT:
+            return None
+        head, _, ledger = value.partition(f"\n\n{FINDINGS_HEADING}")
+        findings = [
+            line
+            for line in ledger.splitlines()
+            if line.strip() and line.strip() != FINDINGS_NOTE
+        ]
+        return self._with_findings(
+            head, findings, int(self.limit * LEDGER_COMPACT_TO)
+        )
+
+    def _with_findings(self, head, findings, limit):
+        heading = f"{FINDINGS_HEADING}\n{FINDINGS_NOTE}"
+        # The head never pushes the block past its hard limit, so nothing has
+        # to be cut mid-line afterwards
+        head = _clip(head, self.limit - len(heading) - 2)
+        # Keep the latest copy of each finding, then the newest that fit
+        unique = list(dict.fromkeys(reversed(findings)))
+        kept, size = [], len(head) + len(heading) + 2
+        for line in unique:
+            if size + len(line) + 1 > min(limit, self.limit):
+                break
+            kept.append(line)
+            size += len(line) + 1
+        return "\n".join([f"{head}\n\n{heading}", *reversed(kept)])
+
+
+class TokenUsage:
+    """Tokens in and out per analysis stage, summed over all analyses.
+    Averages are over the analyses that ran the stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._stage_analyses = Counter()
+        self.analyses = 0
+
+    def record(self, usage: dict):
+        with self._lock:
+            self.analyses += 1
+            for stage, counts in usage.items():
+                self._stage_analyses[stage] += 1
+                totals = self._stages.setdefault(
+                    stage, {"prompt_tokens": 0, "completion_tokens": 0, "steps": 0}
+                )
+                for key in totals:
+                    totals[key] += counts.get(key, 0) or 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "analyses": self.analyses,
+                "stages": {
+                    stage: {
+                        **totals,
+                        "analyses": self._stage_analyses[stage],
+                        "avg_prompt_tokens": round(
+                            totals["prompt_tokens"] / self._stage_analyses[stage]
+                        ),
+                        "avg_completion_tokens": round(
+                            totals["completion_tokens"] / self._stage_analyses[stage]
+                        ),
+                    }
+                    for stage, totals in self._stages.items()
+                },
+            }
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def runs_usage(letta_client, run_ids):
+    """Tokens in and out summed over runs of one agent."""
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "steps": 0}
+    for run_id in run_ids:
+        usage = letta_client.runs.usage.retrieve(run_id)
+        totals["prompt_tokens"] += usage.prompt_tokens or 0
+        totals["completion_tokens"] += usage.completion_tokens or 0
+        # The API's UsageStatistics has no step count unless the server adds one
+        steps = getattr(usage, "step_count", None)
+        if steps is None:
+            steps = len(letta_client.runs.steps.list(run_id, limit=1000))
+        totals["steps"] += steps
+    return totals
+
+
+def collect_run_usage(letta_client, run_ids, worker_id: str, since: str):
+    """Token usage of one analysis: the supervisor's runs and the worker steps
+    taken since the lease started (pooled agents are reset between leases)."""
+    usage = {"supervisor": runs_usage(letta_client, run_ids)}
+    steps = letta_client.steps.list(agent_id=worker_id, start_date=since, limit=1000)
+    usage["worker"] = {
+        "prompt_tokens": sum(step.prompt_tokens or 0 for step in steps),
+        "completion_tokens": sum(step.completion_tokens or 0 for step in steps),
+        "steps": len(steps),
+    }
+    return usage
+
+
+session_ledger = SessionLedger()
+token_usage = TokenUsage()
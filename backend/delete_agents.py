@@ -1,21 +1,48 @@
+"""Delete Letta agents and session blocks left behind by analyses.
+
+By default only resources of this service whose TTL has passed are deleted,
+as the API's background reaper does. With `--all`, every agent and
+`analysis_session` block in the project goes. Either way, IDs listed in
+LETTA_KEEP_IDS (comma-separated) are kept, as are this service's resources
+that may still belong to a running worker's agent pool.
+
+    uv run python delete_agents.py
+    uv run python delete_agents.py --all
+"""
+
+import argparse
 import os
-from dotenv import load_dotenv
 
+from dotenv import load_dotenv
 from letta_client import Letta
 
+from letta_gc import LettaReaper
+
 load_dotenv()
 
 LETTA_API_KEY = os.getenv("LETTA_API_KEY")
 
-letta_client = Letta(token=LETTA_API_KEY)
 
-for agent in letta_client.agents.list():
-    # Keep this agent for testing purposes
-    if agent.id in [
-        "agent-d234d3b9-6dd2-4e8d-930a-8111163704fb",
-        "agent-9431f02a-d92a-4e64-971e-130a5cad8187",
-    ]:
-        continue
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Delete every agent and session block that isn't kept, not just "
+        "expired ones",
+    )
+    args = parser.parse_args()
+    if not LETTA_API_KEY:
+        raise SystemExit("LETTA_API_KEY environment variable is required")
+
+    letta_client = Letta(token=LETTA_API_KEY)
+    reaper = LettaReaper(lambda: letta_client)
+    deleted = reaper.reap(everything=args.all)
+    print(
+        f"Deleted {deleted['agents']} agents and {deleted['blocks']} blocks, "
+        f"kept {len(reaper.keep_ids)} IDs"
+    )
+
 
-    print(f"Deleting agent {agent.name} with id {agent.id}")
-    letta_client.agents.delete(agent.id)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import re
+import time
+from dataclasses import dataclass
+
+import httpx
+from dotenv import load_dotenv
+
+from rate_limits import ADMISSION_MAX_WAIT, RateLimitedError, upstreams
+
+load_dotenv()
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+
+ISSUE_URL_RE = re.compile(
+    r"^https?://(?:www\.)?github\.com/([\w.-]+)/([\w.-]+)/issues/(\d+)(?:[/?#].*)?$"
+)
+
+
+@dataclass(frozen=True)
+class IssueRef:
+    owner: str
+    repo: str
+    number: int
+
+    @property
+    def full_name(self):
+        return f"{self.owner}/{self.repo}"
+
+    @property
+    def url(self):
+        return f"https://github.com/{self.owner}/{self.repo}/issues/{self.number}"
+
+
+@dataclass(frozen=True)
+class IssueState:
+    """Snapshot used to decide whether a stored analysis is still current."""
+
+    issue_updated_at: str
+    head_sha: str
+
+
+def parse_issue_url(issue_url: str):
+    match = ISSUE_URL_RE.match(issue_url.strip())
+    if not match:
+        raise ValueError(f"Not a GitHub issue URL: {issue_url}")
+    owner, repo, number = match.groups()
+    if repo.endswith(".git"):
+        repo = repo[:-4]
+    # GitHub owner and repo names are case-insensitive
+    return IssueRef(owner.lower(), repo.lower(), int(number))
+
+
+def normalize_issue_url(issue_url: str):
+    """Canonical form of an issue URL: lowercase owner/repo, no query or fragment."""
+    return parse_issue_url(issue_url).url
+
+
+def _headers(accept="application/vnd.github+json"):
+    headers = {"Accept": accept, "X-GitHub-Api-Version": "2022-11-28"}
+    if GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {GITHUB_TOKEN}"
+    return headers
+
+
+def fetch_issue_state(issue_url: str, timeout=10.0):
+    """Fetch the issue's `updated_at` and the repo's default-branch head SHA.
+
+    Returns None when GitHub can't be reached, so callers can fall back to
+    time-based expiry instead of failing the request.
+    """
+    ref = parse_issue_url(issue_url)
+    repo_url = f"{GITHUB_API_URL}/repos/{ref.owner}/{ref.repo}"
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            issue = _get(
+                client,
+                f"{repo_url}/issues/{ref.number}",
+                wait=ADMISSION_MAX_WAIT,
+                headers=_headers(),
+            )
+            issue.raise_for_status()
+            # `HEAD` resolves to the default branch; the sha media type returns
+            # just the commit SHA instead of the full commit payload
+            head = _get(
+                client,
+                f"{repo_url}/commits/HEAD",
+                wait=ADMISSION_MAX_WAIT,
+                headers=_headers("application/vnd.github.sha"),
+            )
+            head.raise_for_status()
+    except (httpx.HTTPError, RateLimitedError) as e:
+        print(f"Error fetching issue state for {ref.url}: {e}")
+        return None
+    return IssueState(
+        issue_updated_at=issue.json()["updated_at"], head_sha=head.text.strip()
+    )
+
+
+def fetch_repo_size(owner: str, repo: str, timeout=10.0):
+    """Size of a repository in KB as GitHub reports it, or None when GitHub
+    can't be reached."""
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            response = _get(
+                client,
+                f"{GITHUB_API_URL}/repos/{owner}/{repo}",
+                wait=ADMISSION_MAX_WAIT,
+                headers=_headers(),
+            )
+            response.raise_for_status()
+    except (httpx.HTTPError, RateLimitedError) as e:
+        print(f"Error fetching the size of {owner}/{repo}: {e}")
+        return None
+    return response.json().get("size")
+
+
+def _get(client: httpx.Client, url: str, wait=None, **kwargs):
+    """GET from the GitHub REST API within the shared rate limit. Raises
+    RateLimitedError when GitHub pushes back, or when no budget frees up
+    within `wait` seconds."""
+    upstreams.acquire("github", timeout=wait)
+    response = client.get(url, **kwargs)
+    retry_after = _retry_after(response)
+    if retry_after is not None:
+        upstreams.penalize("github", retry_after)
+        raise RateLimitedError(f"GitHub rate limit on {url}", retry_after, "github")
+    upstreams.succeeded("github")
+    return response
+
+
+def _retry_after(response: httpx.Response):
+    """Seconds GitHub asks us to wait, or None if the response isn't a rate limit."""
+    if response.status_code not in (403, 429):
+        return None
+    if "retry-after" in response.headers:
+        return float(response.headers["retry-after"])
+    if response.headers.get("x-ratelimit-remaining") == "0":
+        reset = float(response.headers.get("x-ratelimit-reset", time.time() + 60))
+        return max(reset - time.time(), 1.0)
+    return None
+
+
+def list_issue_urls(repo: str, labels=(), state="open", limit=100, timeout=10.0):
+    """URLs of a repository's issues carrying all of `labels`, newest first.
+
+    `repo` is `owner/name`. Pull requests, which the issues API also returns,
+    are skipped. Raises RateLimitedError when GitHub rate-limits the listing.
+    """
+    owner, _, name = repo.strip().strip("/").partition("/")
+    if not owner or not name or "/" in name:
+        raise ValueError(f"Not a GitHub repository: {repo}")
+    params = {"state": state, "per_page": min(limit, 100), "page": 1}
+    if labels:
+        params["labels"] = ",".join(labels)
+    urls = []
+    with httpx.Client(timeout=timeout) as client:
+        while len(urls) < limit:
+            response = _get(
+                client,
+                f"{GITHUB_API_URL}/repos/{owner}/{name}/issues",
+                wait=ADMISSION_MAX_WAIT,
+                params=params,
+                headers=_headers(),
+            )
+            response.raise_for_status()
+            page = response.json()
+            urls += [
+                normalize_issue_url(issue["html_url"])
+                for issue in page
+                if "pull_request" not in issue
+            ]
+            if len(page) < params["per_page"]:
+                break
+            params["page"] += 1
+    return urls[:limit]
@@ -0,0 +1,339 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from analysis_cache import CACHE_DIR
+from schema import GitHubIssueAnalysis
+from tracing import bind, tracer
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", "32"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the job queue is at `max_queue` and can't accept more work."""
+
+
+class JobEvents:
+    """Append-only event log for one job that async subscribers can follow.
+
+    `publish()` is called from the job's worker thread; `follow()` replays the
+    history and then yields new events as they arrive on the subscriber's loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._history = []
+        self._subscribers = []
+        self._closed = False
+
+    def publish(self, event: str, data=None):
+        with self._lock:
+            if self._closed:
+                return
+            item = (event, data)
+            self._history.append(item)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def follow(self, heartbeat=15.0):
+        """Yield `(event, data)` pairs; yields `None` on idle heartbeats."""
+        queue = asyncio.Queue()
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            for item in self._history:
+                queue.put_nowait(item)
+            if self._closed:
+                queue.put_nowait(None)
+            else:
+                self._subscribers.append(subscriber)
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if item is None:
+                    return
+                yield item
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+
+class JobManager:
+    """Runs analyses on a bounded background executor and persists their state.
+
+    `submit()` returns a job ID immediately; the job runs `run_fn(issue_url,
+    refresh, should_cancel, on_event)` on one of `max_workers` threads. At most
+    `max_queue` jobs wait for a thread, so overload is rejected up front
+    instead of piling up. Job rows live in SQLite so any uvicorn worker can
+    answer status polls and record cancellation requests; `should_cancel`
+    checks both the local flag and the database, and `run_fn` is expected to
+    raise once it returns True. Progress reported through `on_event` is kept in
+    a per-job `JobEvents` log for streaming to clients.
+
+    Example usage:
+    ```job_id, _ = jobs.submit("https://github.com/owner/repo/issues/1")
+    jobs.get(job_id)["status"]  # "queued" -> "running" -> "completed"
+    ```
+    """
+
+    def __init__(
+        self,
+        run_fn,
+        path=os.path.join(CACHE_DIR, "jobs.sqlite3"),
+        max_workers=JOB_WORKERS,
+        max_queue=JOB_QUEUE_DEPTH,
+        retention=JOB_RETENTION,
+    ):
+        self._run_fn = run_fn
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retention = retention
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                issue_url TEXT NOT NULL,
+                refresh INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                result TEXT,
+                error TEXT
+            )"""
+        )
+        self._db.commit()
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures: dict[str, Future] = {}
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._events: dict[str, JobEvents] = {}
+        self._queued = 0
+        self._running = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="analysis-job"
+            )
+        self._recover()
+
+    def shutdown(self):
+        if self._executor is not None:
+            for job_id in list(self._futures):
+                self.cancel(job_id)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, issue_url: str, refresh: bool = False):
+        """Queue an analysis and return `(job_id, future)`."""
+        if self._executor is None:
+            raise RuntimeError("Job manager is not started")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            if self._queued >= self.max_queue:
+                raise QueueFullError(
+                    f"Analysis queue is full ({self.max_queue} jobs waiting)"
+                )
+            self._queued += 1
+            self._cancel_events[job_id] = threading.Event()
+            self._events[job_id] = JobEvents()
+        self._execute(
+            "INSERT INTO jobs (id, issue_url, refresh, status, owner, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, issue_url, int(refresh), QUEUED, self.owner, time.time()),
+        )
+        # The job is traced as part of the request that submitted it
+        future = self._executor.submit(bind(self._run), job_id, issue_url, refresh)
+        with self._lock:
+            self._futures[job_id] = future
+        future.add_done_callback(lambda _: self._forget(job_id))
+        return job_id, future
+
+    def events(self, job_id: str):
+        """The live event log of a job running in this process, if any."""
+        with self._lock:
+            return self._events.get(job_id)
+
+    def get(self, job_id: str):
+        with self._db_lock:
+            cursor = self._db.execute(
+                "SELECT id, issue_url, status, created_at, started_at, finished_at, "
+                "result, error FROM jobs WHERE id = ?",
+                (job_id,),
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        if job["result"] is not None:
+            job["result"] = GitHubIssueAnalysis.model_validate_json(job["result"])
+        return job
+
+    def cancel(self, job_id: str):
+        """Request cancellation. Returns False if the job is unknown or finished."""
+        with self._db_lock:
+            updated = self._db.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN (?, ?)",
+                (job_id, QUEUED, RUNNING),
+            ).rowcount
+            self._db.commit()
+        if not updated:
+            return False
+        with self._lock:
+            event = self._cancel_events.get(job_id)
+            future = self._futures.get(job_id)
+        if event is not None:
+            event.set()
+        if future is not None and future.cancel():
+            with self._lock:
+                self._queued -= 1
+            self._set_status(job_id, CANCELLED, finished=True)
+            self._finish_events(job_id, "status", {"status": CANCELLED})
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "max_queue": self.max_queue,
+            }
+
+    def _run(self, job_id, issue_url, refresh):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            event = self._cancel_events[job_id]
+            events = self._events[job_id]
+
+        def should_cancel():
+            return event.is_set() or self._cancel_requested(job_id)
+
+        try:
+            if should_cancel():
+                self._set_status(job_id, CANCELLED, finished=True)
+                self._finish_events(job_id, "status", {"status": CANCELLED})
+                return None
+            self._set_status(job_id, RUNNING, started=True)
+            events.publish("status", {"status": RUNNING})
+            with tracer.span("analysis.job", job_id=job_id, issue_url=issue_url):
+                result = self._run_fn(
+                    issue_url, refresh, should_cancel, events.publish
+                )
+        except Exception as e:
+            if should_cancel():
+                self._set_status(job_id, CANCELLED, finished=True)
+                self._finish_events(job_id, "status", {"status": CANCELLED})
+            else:
+                self._set_status(job_id, FAILED, finished=True, error=str(e))
+                self._finish_events(job_id, "error", {"detail": str(e)})
+            raise
+        else:
+            result_json = None if result is None else result.model_dump_json()
+            self._set_status(job_id, COMPLETED, finished=True, result=result_json)
+            self._finish_events(
+                job_id, "result", None if result is None else result.model_dump(mode="json")
+            )
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _finish_events(self, job_id, event, data):
+        with self._lock:
+            events = self._events.get(job_id)
+        if events is not None:
+            events.publish(event, data)
+            events.close()
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._cancel_events.pop(job_id, None)
+            self._events.pop(job_id, None)
+
+    def _cancel_requested(self, job_id):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def _set_status(
+        self, job_id, status, started=False, finished=False, result=None, error=None
+    ):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, "
+            "started_at = CASE WHEN ? THEN ? ELSE started_at END, "
+            "finished_at = CASE WHEN ? THEN ? ELSE finished_at END, "
+            "result = ?, error = ? WHERE id = ?",
+            (status, started, now, finished, now, result, error, job_id),
+        )
+
+    def _recover(self):
+        """Fail jobs whose owning process on this host is gone, and prune old ones."""
+        host = socket.gethostname()
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+        for job_id, owner in rows:
+            owner_host, _, pid = owner.rpartition(":")
+            if owner_host == host and owner != self.owner and not _pid_alive(int(pid)):
+                self._set_status(
+                    job_id, FAILED, finished=True, error="Interrupted by server restart"
+                )
+        self._execute(
+            "DELETE FROM jobs WHERE finished_at < ?", (time.time() - self.retention,)
+        )
+
+    def _execute(self, sql, params):
+        with self._db_lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
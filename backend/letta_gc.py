@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Every agent and session block this service creates carries this tag (blocks,
+# which can't be tagged, carry it in their metadata)
+LETTA_RESOURCE_TAG = os.getenv("LETTA_RESOURCE_TAG", "issue-analyzer")
+# Created resources expire after this long; pooled pairs are retired before
+AGENT_POOL_MAX_AGE = float(os.getenv("AGENT_POOL_MAX_AGE", "21600"))
+LETTA_RESOURCE_TTL = float(os.getenv("LETTA_RESOURCE_TTL", "86400"))
+# Longest an analysis holds a pair, as bounded by its single-flight lease; a
+# pair past max_age is only retired once its lease ends
+AGENT_POOL_MAX_LEASE = float(os.getenv("SINGLEFLIGHT_LEASE_TTL", "1800"))
+# Comma-separated agent and block IDs the reaper never deletes
+LETTA_KEEP_IDS = {
+    resource_id.strip()
+    for resource_id in os.getenv("LETTA_KEEP_IDS", "").split(",")
+    if resource_id.strip()
+}
+LETTA_REAPER_INTERVAL = float(os.getenv("LETTA_REAPER_INTERVAL", "900"))
+LETTA_REAPER_BATCH_SIZE = int(os.getenv("LETTA_REAPER_BATCH_SIZE", "50"))
+LETTA_REAPER_WORKERS = int(os.getenv("LETTA_REAPER_WORKERS", "8"))
+SESSION_BLOCK_LABEL = "analysis_session"
+
+
+def run_tag(run_id: str):
+    return f"run:{run_id}"
+
+
+def resource_metadata(run_id: str, ttl=LETTA_RESOURCE_TTL):
+    """Metadata marking a resource as ours, with when the reaper may take it."""
+    return {
+        "managed_by": LETTA_RESOURCE_TAG,
+        "run_id": run_id,
+        "created_at": time.time(),
+        "expires_at": time.time() + ttl,
+    }
+
+
+def _expired(resource, now):
+    expires_at = (getattr(resource, "metadata", None) or {}).get("expires_at")
+    return expires_at is not None and float(expires_at) <= now
+
+
+def _maybe_live(resource, now):
+    """Whether `resource` is ours and young enough to belong to a pair that
+    another worker process still pools or leases."""
+    metadata = getattr(resource, "metadata", None) or {}
+    if metadata.get("managed_by") != LETTA_RESOURCE_TAG:
+        return False
+    created_at = metadata.get("created_at")
+    if created_at is None:
+        if metadata.get("expires_at") is None:
+            return False
+        created_at = float(metadata["expires_at"]) - LETTA_RESOURCE_TTL
+    return now - float(created_at) < AGENT_POOL_MAX_AGE + AGENT_POOL_MAX_LEASE
+
+
+class LettaReaper:
+    """Deletes expired Letta agents and session blocks in the background.
+
+    Resources are created with `LETTA_RESOURCE_TAG`, a `run:<id>` tag and
+    `resource_metadata()`, and are normally deleted by whoever created them.
+    Whatever a crash or a failed delete leaves behind is found here every
+    `interval` seconds, once its `expires_at` has passed, and deleted
+    `batch_size` at a time with `max_workers` concurrent requests. IDs in
+    `keep_ids` and those `live_ids()` reports as in use are never deleted.
+    `live_ids()` only knows this process's pool, so resources of ours younger
+    than `AGENT_POOL_MAX_AGE` plus the longest lease are spared too: they may
+    belong to a pair another worker still uses.
+    `before_pass()`, if given, runs first, e.g. to retire old pooled pairs.
+
+    Example usage:
+    ```reaper = LettaReaper(get_letta_client, live_ids=agent_pool.live_ids)
+    reaper.start()
+    reaper.reap()  # one pass now
+    ```
+    """
+
+    def __init__(
+        self,
+        get_client,
+        live_ids=None,
+        before_pass=None,
+        keep_ids=LETTA_KEEP_IDS,
+        interval=LETTA_REAPER_INTERVAL,
+        batch_size=LETTA_REAPER_BATCH_SIZE,
+        max_workers=LETTA_REAPER_WORKERS,
+    ):
+        self._get_client = get_client
+        self._live_ids = live_ids or set
+        self._before_pass = before_pass
+        self.keep_ids = set(keep_ids)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.passes = 0
+        self.deleted = {"agents": 0, "blocks": 0}
+        self.failed = 0
+        self.last_pass_at = None
+
+    def start(self):
+        """Reap now and then every `interval` seconds on a daemon thread."""
+        if self._thread is None and self.interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._loop, name="letta-reaper", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Error reaping Letta resources: {e}")
+            self._stop.wait(self.interval)
+
+    def reap(self, everything=False):
+        """Delete expired resources of this service; with `everything`, every
+        agent and session block in the project that isn't kept or in use.
+        Returns the number of agents and blocks deleted."""
+        if self._before_pass is not None:
+            self._before_pass()
+        letta_client = self._get_client()
+        now = time.time()
+        spared = self.keep_ids | set(self._live_ids())
+        if everything:
+            spared |= self._kept_block_ids(letta_client)
+
+        agents = [
+            agent
+            for agent in self._list_agents(letta_client, everything)
+            if agent.id not in spared
+            and not _maybe_live(agent, now)
+            and (everything or _expired(agent, now))
+        ]
+        agents_deleted = self._delete(letta_client.agents.delete, agents)
+
+        # Deleting an agent leaves its blocks; only orphans are collected here
+        blocks = [
+            block
+            for block in self._list_blocks(letta_client)
+            if block.id not in spared
+            and not _maybe_live(block, now)
+            and (
+                everything
+                or (
+                    (block.metadata or {}).get("managed_by") == LETTA_RESOURCE_TAG
+                    and _expired(block, now)
+                )
+            )
+        ]
+        blocks_deleted = self._delete(letta_client.blocks.delete, blocks)
+
+        with self._lock:
+            self.passes += 1
+            self.deleted["agents"] += agents_deleted
+            self.deleted["blocks"] += blocks_deleted
+            self.last_pass_at = now
+        if agents_deleted or blocks_deleted:
+            print(
+                f"Reaped {agents_deleted} Letta agents and {blocks_deleted} blocks"
+            )
+        return {"agents": agents_deleted, "blocks": blocks_deleted}
+
+    def _kept_block_ids(self, letta_client):
+        block_ids = set()
+        for agent_id in self.keep_ids:
+            try:
+                agent = letta_client.agents.retrieve(agent_id)
+            except Exception:
+                continue  # A block ID, or an agent that's gone
+            block_ids |= {block.id for block in agent.memory.blocks}
+        return block_ids
+
+    def _list_agents(self, letta_client, everything):
+        tags = None if everything else [LETTA_RESOURCE_TAG]
+        agents, after = [], None
+        while True:
+            page = letta_client.agents.list(
+                tags=tags, limit=self.batch_size, after=after
+            )
+            agents += page
+            if len(page) < self.batch_size:
+                return agents
+            after = page[-1].id
+
+    def _list_blocks(self, letta_client):
+        blocks, after = [], None
+        while True:
+            # This client's blocks.list has no `after` argument, but the API does
+            page = letta_client.blocks.list(
+                label=SESSION_BLOCK_LABEL,
+                limit=self.batch_size,
+                request_options=(
+                    {"additional_query_parameters": {"after": after}} if after else None
+                ),
+            )
+            blocks += page
+            if len(page) < self.batch_size:
+                return blocks
+            after = page[-1].id
+
+    def _delete(self, delete, resources):
+        deleted = 0
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="letta-reaper"
+        ) as executor:
+            for start in range(0, len(resources), self.batch_size):
+                batch = resources[start : start + self.batch_size]
+                for resource, error in zip(
+                    batch, executor.map(lambda r: self._delete_one(delete, r), batch)
+                ):
+                    if error is None:
+                        deleted += 1
+                    else:
+                        print(f"Error deleting Letta resource {resource.id}: {error}")
+        return deleted
+
+    def _delete_one(self, delete, resource):
+        try:
+            delete(resource.id)
+            return None
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            return e
+
+    def stats(self):
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "deleted": dict(self.deleted),
+                "failed": self.failed,
+                "kept": len(self.keep_ids),
+                "last_pass_seconds_ago": round(time.time() - self.last_pass_at)
+                if self.last_pass_at
+                else None,
+            }
@@ -1,11 +1,130 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import copy
+import json
+import re
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, HttpUrl
 
-from agent import analyze_gh_issue
-from schema import create_mock_analysis
+from agent import (
+    LETTA_API_KEY,
+    agent_pool,
+    analyze_gh_issue,
+    github_tools,
+    letta_reaper,
+    run_waiter,
+    warm_repo_context,
+)
+from analysis_cache import AnalysisCache
+from batch import (
+    BATCH_MAX_ISSUES,
+    BatchManager,
+    BatchRunner,
+    BatchStore,
+    batch_id_for,
+)
+from code_slices import code_slices, slice_hash, strip_code
+from compression import COMPRESSION_MINIMUM_SIZE, BrotliMiddleware, with_etag
+from context_budget import READ_WINDOW_LINES, token_usage
+from github import (
+    fetch_issue_state,
+    list_issue_urls,
+    normalize_issue_url,
+)
+from mcp_client import MCP_TOOL_LATENCY, mcp_pool
+from metrics import render_samples
+from rate_limits import RateLimitedError, upstreams
+from repo_context import RepoContextWarmer, repo_contexts
+from repo_index import repo_indexes
+from retrieval import retriever
+from routing import ANALYSIS_LATENCY, route_stats
+from schema import GitHubIssueAnalysis, create_mock_analysis
+from jobs import QueueFullError, JobManager
+from singleflight import SingleFlight
+from tracing import STAGE_LATENCY, parse_traceparent, tracer
+
+COMMIT_SHA_RE = re.compile(r"[0-9a-f]{40}")
+UNTRACED_PATHS = {"/metrics", "/health"}
+
+analysis_cache = AnalysisCache()
+analyses_in_flight = SingleFlight()
+
+
+def run_analysis(
+    issue_url: str,
+    refresh: bool = False,
+    should_cancel=None,
+    on_event=None,
+    repo_context=None,
+):
+    """Serve an analysis from cache or run the agents, sharing concurrent runs."""
+    with tracer.span("github.issue_state"):
+        issue_state = fetch_issue_state(issue_url)
+    if not refresh:
+        with tracer.span("analysis_cache.get") as span:
+            cached = analysis_cache.get(issue_url, issue_state)
+            span.set(hit=cached is not None)
+        if cached is not None:
+            if on_event is not None:
+                on_event("progress", {"message": "Served from cache"})
+            return cached
+
+    def run(shared_should_cancel, shared_on_event):
+        result = analyze_gh_issue(
+            issue_url,
+            should_cancel=shared_should_cancel,
+            on_event=shared_on_event,
+            head_sha=issue_state.head_sha if issue_state else None,
+            repo_context=repo_context,
+        )
+        if result is not None:
+            analysis_cache.put(issue_url, issue_state, result)
+        return result
+
+    return analyses_in_flight.do(
+        issue_url,
+        run,
+        dumps=GitHubIssueAnalysis.model_dump_json,
+        loads=GitHubIssueAnalysis.model_validate_json,
+        should_cancel=should_cancel,
+        on_event=on_event,
+    )
+
+
+analysis_jobs = JobManager(run_analysis)
+batches = BatchManager(BatchRunner(run_analysis, BatchStore()))
+repo_context_warmer = RepoContextWarmer(warm_repo_context)
+
 
-app = FastAPI(title="Berkeley AI 25 - GitHub Issue Analysis API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Register MCP tools and warm the agent pool so the first request doesn't
+    # pay for tool registration or agent creation
+    if LETTA_API_KEY:
+        await run_in_threadpool(github_tools.start)
+        await run_in_threadpool(agent_pool.warm)
+        letta_reaper.start()
+    else:
+        print("LETTA_API_KEY not set, skipping agent pool warm-up")
+    analysis_jobs.start()
+    yield
+    batches.shutdown()
+    analysis_jobs.shutdown()
+    github_tools.stop()
+    letta_reaper.stop()
+    await run_in_threadpool(agent_pool.close)
+    await run_in_threadpool(mcp_pool.close)
+    repo_indexes.close()
+    await run_in_threadpool(tracer.close)
+
+
+app = FastAPI(title="Berkeley AI 25 - GitHub Issue Analysis API", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -17,6 +136,38 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request, continuing the caller's trace when it sends a
+    W3C `traceparent` header; the response's `traceparent` names the span.
+    Scrapes of /metrics and /health aren't traced."""
+    if request.url.path in UNTRACED_PATHS:
+        return await call_next(request)
+    with tracer.span(
+        "http.request",
+        parent=parse_traceparent(request.headers.get("traceparent")),
+        method=request.method,
+        path=request.url.path,
+    ) as span:
+        response = await call_next(request)
+        span.set(status_code=response.status_code)
+    response.headers["traceparent"] = span.traceparent
+    return response
+
+
+@app.middleware("http")
+async def etag_responses(request: Request, call_next):
+    """ETags on GET responses, so clients polling a job or reloading an
+    analysis get a 304 instead of the same body again."""
+    return await with_etag(request, await call_next(request))
+
+
+# Outermost, so everything above is compressed: brotli for clients that accept
+# it when the package is installed, gzip for the rest. Event streams aren't.
+app.add_middleware(BrotliMiddleware)
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MINIMUM_SIZE)
+
+
 class GitHubIssueRequest(BaseModel):
     github_url: HttpUrl
 
@@ -26,8 +177,33 @@ def root():
     return {"message": "Berkeley AI 25 - GitHub Issue Analysis API"}
 
 
+def rate_limited(error: RateLimitedError):
+    return HTTPException(
+        status_code=429,
+        detail=str(error),
+        headers={"Retry-After": str(max(round(error.retry_after or 60), 1))},
+    )
+
+
+def compact_result(result: GitHubIssueAnalysis | None):
+    """A result without the code of key sections that reference it."""
+    return None if result is None else strip_code(result.model_dump(mode="json"))
+
+
+def submit_job(request: GitHubIssueRequest, refresh: bool):
+    try:
+        issue_url = normalize_issue_url(str(request.github_url))
+        return analysis_jobs.submit(issue_url, refresh=refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
 @app.post("/analyze")
-def analyze_github_issue(request: GitHubIssueRequest):
+async def analyze_github_issue(
+    request: GitHubIssueRequest, refresh: bool = False, compact: bool = False
+):
     """
     Analyze a GitHub issue URL and return structured analysis data.
 
@@ -36,30 +212,455 @@ def analyze_github_issue(request: GitHubIssueRequest):
     - Relevant files with directory structure and relevance scores
     - Technical analysis with problem type, complexity, and suggested approaches
 
+    Results are cached per issue and reused until the issue or the repository's
+    default branch changes. Pass `?refresh=true` to bypass the cache. Concurrent
+    requests for the same issue share a single agent run. The analysis runs as a
+    background job; this endpoint awaits it without holding a threadpool worker.
+    Prefer `POST /analyses` for long analyses.
+
     Args:
         request: GitHubIssueRequest containing the GitHub issue URL
+        refresh: Ignore any cached analysis and run the agents again
+        compact: Leave out the code of key sections that carry a `ref`; fetch
+            it from `GET /repos/{owner}/{repo}/slices` when it's shown
 
     Returns:
         GitHubIssueResponse: Structured analysis data following GitHubIssueAnalysis schema
     """
+    job_id, future = submit_job(request, refresh)
     try:
-        # For now, return mock data instead of calling the actual agent
-        # TODO: Replace with actual agent call when ready
-        issue_url = str(request.github_url)
-        analysis_result = analyze_gh_issue(issue_url)
-
         # analysis_result = create_mock_analysis()
-        return analysis_result
-
+        result = await asyncio.wrap_future(future)
+        return compact_result(result) if compact else result
+    except asyncio.CancelledError:
+        analysis_jobs.cancel(job_id)
+        raise
     except ValueError as e:
         # Handle validation errors (missing API keys, invalid URLs, etc.)
         raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except RateLimitedError as e:
+        # Upstreams are saturated: tell the client when to come back
+        raise rate_limited(e)
     except Exception as e:
         # Handle unexpected errors
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.post("/analyses", status_code=202)
+def create_analysis_job(request: GitHubIssueRequest, refresh: bool = False):
+    """
+    Start analyzing a GitHub issue in the background.
+
+    Returns the job ID immediately; poll `GET /analyses/{job_id}` for the result.
+    Responds with 503 when the analysis queue is full.
+    """
+    job_id, _ = submit_job(request, refresh)
+    return analysis_jobs.get(job_id)
+
+
+@app.get("/analyses/{job_id}")
+def get_analysis_job(job_id: str, compact: bool = False):
+    """Return a job's status, and its GitHubIssueAnalysis result once completed;
+    `?compact=true` leaves out code that key sections reference."""
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    if compact:
+        return {**job, "result": compact_result(job["result"])}
+    return job
+
+
+def sse_message(event: str, data=None):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/analyses/{job_id}/events")
+async def stream_analysis_job(job_id: str, compact: bool = False):
+    """
+    Stream a job's progress as Server-Sent Events.
+
+    Events: `status`, `progress`, `tool_call`, `tool_return`, `assistant`,
+    `section` (one per GitHubIssueAnalysis section as soon as it validates),
+    then a final `result` or `error`. With `?compact=true` the result leaves
+    out code that key sections reference.
+    """
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+
+    async def job_events():
+        events = analysis_jobs.events(job_id)
+        if events is not None:
+            async for item in events.follow():
+                if item is None:
+                    yield ": keep-alive\n\n"
+                elif compact and item[0] == "result" and item[1] is not None:
+                    yield sse_message("result", strip_code(copy.deepcopy(item[1])))
+                else:
+                    yield sse_message(*item)
+            return
+
+        # Finished, or running in another worker process: follow the job table
+        last_status = None
+        while True:
+            current = analysis_jobs.get(job_id)
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_message("status", {"status": last_status})
+            if current["status"] == "completed":
+                result = current["result"]
+                if compact:
+                    yield sse_message("result", compact_result(result))
+                else:
+                    yield sse_message(
+                        "result",
+                        None if result is None else result.model_dump(mode="json"),
+                    )
+                return
+            if current["status"] == "failed":
+                yield sse_message("error", {"detail": current["error"]})
+                return
+            if current["status"] == "cancelled":
+                return
+            await asyncio.sleep(2)
+
+    return StreamingResponse(
+        job_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.delete("/analyses/{job_id}")
+def cancel_analysis_job(job_id: str):
+    """Cancel a queued or running analysis job."""
+    if not analysis_jobs.cancel(job_id):
+        job = analysis_jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Analysis job not found")
+        raise HTTPException(
+            status_code=409, detail=f"Analysis job already {job['status']}"
+        )
+    return analysis_jobs.get(job_id)
+
+
+class BatchRequest(BaseModel):
+    issue_urls: list[HttpUrl] = []
+    # Also analyze this owner/repo's open issues carrying all of `labels`
+    repo: str | None = None
+    labels: list[str] = []
+    limit: int = 50
+    refresh: bool = False
+    # Resume a specific batch; by default the ID is derived from the request
+    batch_id: str | None = None
+
+
+@app.post("/batches")
+async def run_batch(request: BatchRequest):
+    """
+    Analyze many issues, streaming one NDJSON line per issue as it finishes.
+
+    Issues are grouped by repository so repository-level sections are
+    investigated once per repository and shared. Lines have `type` `issue`
+    (with `status`, and `result` or `error`) and a final `summary`; blank
+    lines are keep-alives. Progress is stored, so sending the same request
+    again after an interruption resumes the batch, replaying finished issues;
+    while it is still running, the request follows the running batch. The
+    batch ID is returned in the `X-Batch-Id` header.
+    """
+    try:
+        issue_urls = [normalize_issue_url(str(url)) for url in request.issue_urls]
+        batch_id = request.batch_id or batch_id_for(
+            issue_urls, request.repo, request.labels
+        )
+        if request.repo:
+            issue_urls += await run_in_threadpool(
+                list_issue_urls,
+                request.repo,
+                request.labels,
+                limit=min(request.limit, BATCH_MAX_ISSUES),
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except RateLimitedError as e:
+        raise rate_limited(e)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Could not list issues: {e}")
+    issue_urls = list(dict.fromkeys(issue_urls))
+    if not issue_urls:
+        raise HTTPException(status_code=400, detail="No issues to analyze")
+    if len(issue_urls) > BATCH_MAX_ISSUES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BATCH_MAX_ISSUES} issues per batch",
+        )
+
+    events = batches.start(batch_id, issue_urls, refresh=request.refresh)
+
+    async def lines():
+        async for item in events.follow():
+            yield "\n" if item is None else json.dumps(item[1]) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id, "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/batches/{batch_id}")
+def get_batch(batch_id: str):
+    """Per-status issue counts of a batch and whether it is running."""
+    summary = batches.runner.store.summary(batch_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {**summary, "running": batches.running(batch_id)}
+
+
+@app.delete("/batches/{batch_id}")
+def stop_batch(batch_id: str):
+    """Stop a running batch; unfinished issues stay pending for a resume."""
+    if not batches.stop(batch_id):
+        raise HTTPException(status_code=409, detail="Batch is not running")
+    return get_batch(batch_id)
+
+
+@app.post("/letta/callback")
+async def letta_run_callback(request: Request):
+    """Completion callback from Letta; wakes the thread waiting on the run."""
+    payload = await request.json()
+    run_id = payload.get("run_id") or payload.get("job_id") or payload.get("id")
+    if not run_id:
+        raise HTTPException(status_code=400, detail="Missing run ID")
+    return {"notified": run_waiter.notify(run_id)}
+
+
+@app.post("/repos/{owner}/{repo}/context", status_code=202)
+async def warm_repo(owner: str, repo: str):
+    """
+    Investigate a repository's `project_context` and `build_and_test` in the
+    background, so its issues' analyses start with them known.
+
+    Uses the newest open issue to reach the repository. Returns
+    `{"status": "cached" | "started" | "running", "head_sha": ...}`.
+    """
+    full_name = f"{owner}/{repo}"
+    try:
+        issue_urls = await run_in_threadpool(list_issue_urls, full_name, limit=1)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except RateLimitedError as e:
+        raise rate_limited(e)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=502, detail=f"Could not list issues: {e}")
+    if not issue_urls:
+        raise HTTPException(status_code=404, detail="Repository has no open issues")
+    state = await run_in_threadpool(fetch_issue_state, issue_urls[0])
+    if state is None:
+        raise HTTPException(status_code=502, detail="Could not reach GitHub")
+
+    latest = repo_contexts.latest(full_name)
+    if latest is not None and latest["head_sha"] == state.head_sha:
+        status = "cached"
+    elif repo_context_warmer.start(full_name, issue_urls[0], state.head_sha):
+        status = "started"
+    else:
+        status = "running"
+    return {"status": status, "head_sha": state.head_sha}
+
+
+@app.get("/repos/{owner}/{repo}/context")
+def get_repo_context(owner: str, repo: str):
+    """The newest stored repository-level sections of a repository."""
+    stored = repo_contexts.latest(f"{owner}/{repo}")
+    if stored is None:
+        raise HTTPException(status_code=404, detail="No context for repository")
+    return {**stored, "warming": repo_context_warmer.running(f"{owner}/{repo}")}
+
+
+def get_repo_index(owner: str, repo: str, sha: str | None = None):
+    if sha and not COMMIT_SHA_RE.fullmatch(sha):
+        raise HTTPException(status_code=400, detail="sha must be a commit SHA")
+    index = repo_indexes.get(owner, repo, sha or None)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Repository is not indexed")
+    return index
+
+
+@app.get("/repos/{owner}/{repo}/search")
+def search_repo_index(
+    owner: str,
+    repo: str,
+    q: str,
+    limit: int = 10,
+    path: str | None = None,
+    sha: str | None = None,
+):
+    """Full-text search over the local index of a repository at `sha`, or at
+    its latest indexed commit."""
+    return get_repo_index(owner, repo, sha).search(
+        q, limit=min(limit, 50), path_prefix=path
+    )
+
+
+@app.get("/repos/{owner}/{repo}/symbols")
+def find_repo_symbol(
+    owner: str, repo: str, name: str, limit: int = 20, sha: str | None = None
+):
+    """Definitions of a function, method or class in an indexed repository."""
+    return get_repo_index(owner, repo, sha).find_symbol(name, limit=min(limit, 100))
+
+
+@app.get("/repos/{owner}/{repo}/lines", response_class=PlainTextResponse)
+def read_repo_lines(
+    owner: str,
+    repo: str,
+    path: str,
+    start: int = 1,
+    end: int = 200,
+    sha: str | None = None,
+):
+    """Numbered lines of a file at `sha`, or at the latest indexed commit, at
+    most READ_WINDOW_LINES at a time."""
+    index = get_repo_index(owner, repo, sha)
+    try:
+        return index.read_lines(path, start, min(end, start + READ_WINDOW_LINES - 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError:
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+
+
+@app.get("/repos/{owner}/{repo}/slices", response_class=PlainTextResponse)
+def read_code_slice(owner: str, repo: str, sha: str, path: str, start: int, end: int):
+    """Lines `start` to `end` of a file at commit `sha`, as referenced by the
+    `ref` of a key section; files no analysis references are a 404. Slices
+    never change, so they are cacheable for good; the ETag is the `ref` hash."""
+    if not COMMIT_SHA_RE.fullmatch(sha):
+        raise HTTPException(status_code=400, detail="sha must be a commit SHA")
+    if not code_slices.is_referenced(f"{owner}/{repo}", sha, path):
+        raise HTTPException(
+            status_code=404, detail=f"No analysis references {path} at {sha}"
+        )
+    code = code_slices.slice(f"{owner}/{repo}", sha, path, start, end)
+    if code is None:
+        # The file was read at this commit before, so GitHub is failing us
+        raise HTTPException(
+            status_code=503,
+            detail=f"Couldn't read {path} at {sha}, try again later",
+            headers={"Retry-After": "30"},
+        )
+    return PlainTextResponse(
+        code,
+        headers={
+            "ETag": f'"{slice_hash(code)}"',
+            "Cache-Control": "public, max-age=31536000, immutable",
+        },
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of per-stage latency histograms, cache hit
+    rates, token usage and in-flight work."""
+    caches = {"analysis": analysis_cache.stats()}
+    if mcp_pool.cache is not None:
+        caches["tool"] = mcp_pool.cache.stats()
+    pool = agent_pool.stats()
+    jobs = analysis_jobs.stats()
+    stages = token_usage.stats()["stages"]
+
+    lines = []
+    for histogram in (STAGE_LATENCY, MCP_TOOL_LATENCY, ANALYSIS_LATENCY):
+        lines += histogram.render()
+    for name, key, description, kind in (
+        ("cache_hits_total", "hits", "Cache lookups served from cache", "counter"),
+        ("cache_misses_total", "misses", "Cache lookups that missed", "counter"),
+        ("cache_hit_ratio", "hit_rate", "Share of cache lookups that hit", "gauge"),
+    ):
+        lines += render_samples(
+            name,
+            description,
+            [({"cache": cache}, stats[key]) for cache, stats in caches.items()],
+            kind,
+        )
+    lines += render_samples(
+        "analysis_tokens_total",
+        "Model tokens used by analyses, per stage",
+        [
+            ({"stage": stage, "kind": kind}, totals[f"{kind}_tokens"])
+            for stage, totals in stages.items()
+            for kind in ("prompt", "completion")
+        ],
+        "counter",
+    )
+    lines += render_samples(
+        "analyses_in_flight",
+        "Distinct analyses currently running",
+        analyses_in_flight.stats()["in_flight"],
+    )
+    lines += render_samples(
+        "analysis_jobs",
+        "Analysis jobs in this process by state",
+        [({"state": state}, jobs[state]) for state in ("queued", "running")],
+    )
+    lines += render_samples(
+        "agent_pairs",
+        "Pooled agent pairs by state",
+        [({"state": state}, pool[state]) for state in ("idle", "in_use")],
+    )
+    limits = upstreams.stats()["upstreams"]
+    lines += render_samples(
+        "upstream_tokens_available",
+        "Tokens left in each upstream's rate-limit bucket",
+        [({"upstream": name}, stats["tokens"]) for name, stats in limits.items()],
+    )
+    lines += render_samples(
+        "upstream_rate_limited_total",
+        "Rate-limit responses per upstream",
+        [({"upstream": name}, stats["rate_limited"]) for name, stats in limits.items()],
+        "counter",
+    )
+    lines += render_samples(
+        "upstream_waiting",
+        "Calls waiting for rate-limit budget per upstream and priority",
+        [
+            ({"upstream": name, "priority": priority}, count)
+            for name, stats in limits.items()
+            for priority, count in stats["waiting"].items()
+        ],
+    )
+    lines += render_samples(
+        "letta_runs_waiting", "Letta runs being waited on", run_waiter.stats()["waiting"]
+    )
+    return PlainTextResponse(
+        "\n".join(lines) + "\n", media_type="text/plain; version=0.0.4"
+    )
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint to verify the API is running."""
-    return {"service": "github-issue-analyzer"}
+    return {
+        "service": "github-issue-analyzer",
+        "agent_pool": agent_pool.stats(),
+        "letta_reaper": letta_reaper.stats(),
+        "mcp_tools": github_tools.stats(),
+        "mcp_sessions": mcp_pool.stats(),
+        "analysis_cache": analysis_cache.stats(),
+        "in_flight": analyses_in_flight.stats(),
+        "jobs": analysis_jobs.stats(),
+        "batches": batches.stats(),
+        "runs": run_waiter.stats(),
+        "repo_index": repo_indexes.stats(),
+        "repo_context": {
+            **repo_contexts.stats(),
+            "warmer": repo_context_warmer.stats(),
+        },
+        "retrieval": retriever.stats(),
+        "code_slices": code_slices.stats(),
+        "context": token_usage.stats(),
+        "routing": route_stats.stats(),
+        "rate_limits": upstreams.stats(),
+        "tracing": tracer.exporter.stats(),
+    }
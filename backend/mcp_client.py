@@ -1,8 +1,19 @@
+import asyncio
+import threading
 import time
 
-from mcp import ClientSession, Tool
+from mcp import ClientSession, McpError, Tool
 from mcp.client.streamable_http import streamablehttp_client
 
+from metrics import Histogram
+from rate_limits import is_rate_limit_message, upstreams
+from tool_cache import ToolResultCache
+from tracing import propagate, tracer
+
+MCP_TOOL_LATENCY = Histogram(
+    "mcp_tool_latency_seconds", "MCP tool call latency", ("server", "tool", "outcome")
+)
+
 
 class MCPClient:
     """Example usage:
@@ -20,14 +31,42 @@ class MCPClient:
     )
     pprint(f"Tool response: {response}")
     ```
+
+    A connected client can serve many concurrent `call_tool` invocations over
+    its one session, up to `max_concurrency` in flight. Calls time out after
+    `timeout` seconds; calls that fail at the connection level are retried
+    once on a fresh session, which concurrent failures share. Use
+    `MCPSessionPool` to share long-lived clients.
+
+    With a `ToolResultCache`, read-only tool calls are served from disk when a
+    valid result is stored and successful results are written back.
+
+    With `upstream_for(tool_name)`, uncached calls wait for the returned
+    upstream's shared rate limit, and error results that report a rate limit
+    pause that upstream.
     """
 
-    def __init__(self, server_url):
+    def __init__(
+        self,
+        server_url,
+        headers=None,
+        max_concurrency=8,
+        timeout=60.0,
+        cache=None,
+        upstream_for=None,
+    ):
         self.server_url = server_url
-        self._connection = None
+        self.headers = headers
+        self.timeout = timeout
+        self.cache = cache
+        self.upstream_for = upstream_for
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._connect_lock = asyncio.Lock()
         self._session = None
-        self._read_stream = None
-        self._write_stream = None
+        self._holder = None
+        self._ready = None
+        self._closing = None
+        self._tools = None
 
     async def __aenter__(self):
         await self._connect()
@@ -36,51 +75,238 @@ class MCPClient:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self._disconnect()
 
+    @property
+    def connected(self):
+        return self._session is not None and not self._holder.done()
+
     async def _connect(self):
         """Connect to the MCP server and return a session."""
-        if self._session is not None:
-            return self._session
-
-        self._connection = streamablehttp_client(self.server_url)
-        self._read_stream, self._write_stream, _ = await self._connection.__aenter__()
+        async with self._connect_lock:
+            return await self._open()
 
-        self._session = await ClientSession(
-            self._read_stream, self._write_stream
-        ).__aenter__()
-        await self._session.initialize()
+    async def _open(self):
+        # Callers hold _connect_lock
+        if self.connected:
+            return self._session
+        self._ready = asyncio.Event()
+        self._closing = asyncio.Event()
+        # The transport's task group must be entered and exited by the same
+        # task, so a dedicated task holds the connection open
+        self._holder = asyncio.create_task(self._hold())
+        ready = asyncio.create_task(self._ready.wait())
+        await asyncio.wait([ready, self._holder], return_when=asyncio.FIRST_COMPLETED)
+        if not self._ready.is_set():
+            ready.cancel()
+            self._session = None
+            self._holder.result()  # Re-raise the connection error
+            raise ConnectionError(f"Could not connect to {self.server_url}")
         return self._session
 
+    async def _hold(self):
+        try:
+            async with streamablehttp_client(
+                self.server_url, headers=self.headers
+            ) as (read_stream, write_stream, _):
+                async with ClientSession(read_stream, write_stream) as session:
+                    await session.initialize()
+                    self._session = session
+                    self._ready.set()
+                    await self._closing.wait()
+        finally:
+            self._session = None
+
     async def _disconnect(self):
         """Disconnect from the MCP server."""
-        if self._session:
-            await self._session.__aexit__(None, None, None)
-            self._session = None
-        if self._connection:
-            await self._connection.__aexit__(None, None, None)
-            self._connection = None
+        async with self._connect_lock:
+            await self._close()
+
+    async def _close(self):
+        # Callers hold _connect_lock
+        if self._holder is None:
+            return
+        self._closing.set()
+        try:
+            await self._holder
+        except Exception as e:
+            print(f"Error disconnecting from {self.server_url}: {e}")
+        self._holder = None
         self._session = None
-        self._read_stream = None
-        self._write_stream = None
 
-    async def list_tools(self):
-        """List available tools on the MCP server."""
-        if not self._session:
+    async def list_tools(self, refresh=False):
+        """List available tools on the MCP server, cached after the first call."""
+        if self._tools is None or refresh:
+            session = await self._require_session()
+            response = await session.list_tools()
+            self._tools = response.tools
+        return self._tools
+
+    async def call_tool(self, tool: Tool | str, args=None):
+        name = tool if isinstance(tool, str) else tool.name
+        with tracer.span("mcp.tool", tool=name, server=self.server_url) as span:
+            if self.cache is not None:
+                cached = self.cache.get(name, args)
+                span.set(cached=cached is not None)
+                if cached is not None:
+                    return cached
+            upstream = self.upstream_for(name) if self.upstream_for else None
+            if upstream is not None:
+                await upstreams.acquire_async(upstream)
+            result = await self._call_tool_uncached(name, args)
+            span.set(is_error=bool(result.isError))
+            if upstream is not None:
+                text = " ".join(getattr(item, "text", "") for item in result.content)
+                if result.isError and is_rate_limit_message(text):
+                    upstreams.penalize(upstream)
+                else:
+                    upstreams.succeeded(upstream)
+            if self.cache is not None:
+                self.cache.put(name, args, result)
+            return result
+
+    async def _call_tool_uncached(self, name, args):
+        async with self._semaphore:
+            start_time = time.perf_counter()
+            outcome = "ok"
+            try:
+                session = await self._require_session()
+                try:
+                    return await self._call_once(name, args, session)
+                except (McpError, TimeoutError):
+                    # A tool error or a slow call; the session itself is fine
+                    # and other calls are still using it
+                    raise
+                except Exception as e:
+                    # Connection-level failure: reconnect and retry once
+                    print(f"Retrying {name} on {self.server_url} after error: {e!r}")
+                    outcome = "retried"
+                    session = await self._reconnect(session)
+                    return await self._call_once(name, args, session)
+            except BaseException:
+                outcome = "error"
+                raise
+            finally:
+                MCP_TOOL_LATENCY.observe(
+                    time.perf_counter() - start_time,
+                    server=self.server_url,
+                    tool=name,
+                    outcome=outcome,
+                )
+
+    async def call_tools(self, calls):
+        """Run `[(tool, args), ...]` concurrently.
+
+        Results come back in order; a failed call yields its exception instead
+        of cancelling the rest of the batch.
+        """
+        return await asyncio.gather(
+            *[self.call_tool(tool, args) for tool, args in calls],
+            return_exceptions=True,
+        )
+
+    async def _call_once(self, name, args, session):
+        return await asyncio.wait_for(session.call_tool(name, args), self.timeout)
+
+    async def _require_session(self):
+        if self.connected:
+            return self._session
+        if self._holder is None and self._ready is None:
             raise RuntimeError(
                 "Session is not initialized. Use `async with MCPClient` to connect."
             )
+        # Previously connected but the connection dropped
+        return await self._connect()
 
-        response = await self._session.list_tools()
-        return response.tools
+    async def _reconnect(self, failed_session):
+        """Replace `failed_session` unless a concurrent call already has."""
+        async with self._connect_lock:
+            if self._session is failed_session:
+                await self._close()
+            return await self._open()
 
-    async def call_tool(self, tool: Tool, args=None):
-        if not self._session:
-            raise RuntimeError(
-                "Session is not initialized. Use `async with MCPClient` to connect."
+
+class MCPSessionPool:
+    """Long-lived MCP clients keyed by server URL, shared across threads.
+
+    The clients live on a private event loop running in a background thread,
+    so synchronous code (job threads, the agent pipeline) can use them with
+    `run()` and every caller reuses the same initialized sessions.
+
+    Example usage:
+    ```async def fetch():
+        client = await mcp_pool.get(GITHUB_MCP_URL, headers)
+        return await client.call_tools([("get_issue", args), ...])
+
+    results = mcp_pool.run(fetch())
+    ```
+    """
+
+    def __init__(self, max_concurrency=8, timeout=60.0, cache=None):
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self._clients: dict[str, MCPClient] = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the pool's loop and wait for its result. It runs
+        under the caller's current span."""
+        return asyncio.run_coroutine_threadsafe(
+            propagate(coro), self._ensure_loop()
+        ).result(timeout)
+
+    async def get(self, server_url, headers=None, upstream_for=None):
+        """Connected client for `server_url`; must be awaited on the pool's loop.
+        `upstream_for` applies when the client is created."""
+        client = self._clients.get(server_url)
+        if client is None:
+            client = self._clients[server_url] = MCPClient(
+                server_url,
+                headers=headers,
+                max_concurrency=self.max_concurrency,
+                timeout=self.timeout,
+                cache=self.cache,
+                upstream_for=upstream_for,
             )
+        await client._connect()
+        return client
+
+    def stats(self):
+        return {
+            "servers": {
+                url: {"connected": client.connected}
+                for url, client in list(self._clients.items())
+            },
+            "tool_latency": MCP_TOOL_LATENCY.summary(),
+            "tool_cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop is None:
+            return
+
+        async def disconnect_all():
+            for client in self._clients.values():
+                await client._disconnect()
+            self._clients.clear()
+
+        asyncio.run_coroutine_threadsafe(disconnect_all(), loop).result(30)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="mcp-pool", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
 
-        print(f"\nCalling tool: {tool.name}")
-        start_time = time.time()
-        response = await self._session.call_tool(tool.name, args)
-        end_time = time.time()
-        print(f"Tool call took {end_time - start_time:.2f} seconds")
-        return response
+mcp_pool = MCPSessionPool(cache=ToolResultCache())
@@ -0,0 +1,104 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Histogram:
+    """Cumulative latency histogram with optional labels, Prometheus-style.
+
+    Example usage:
+    ```TOOL_LATENCY = Histogram("mcp_tool_latency_seconds", "MCP tool call latency", ("tool",))
+    TOOL_LATENCY.observe(0.42, tool="get_issue")
+    ```
+    """
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        """Per-label-set count, sum and cumulative bucket counts."""
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        result = []
+        for key, series in items:
+            counts, total = series[:-1], series[-1]
+            cumulative, running = [], 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            result.append(
+                {
+                    "labels": dict(zip(self.labelnames, key)),
+                    "count": running,
+                    "sum": total,
+                    "buckets": dict(zip(self.buckets + (float("inf"),), cumulative)),
+                }
+            )
+        return result
+
+    def summary(self):
+        """Compact view for JSON stats endpoints: count and mean per label set."""
+        return {
+            ",".join(f"{k}={v}" for k, v in series["labels"].items()) or "all": {
+                "count": series["count"],
+                "avg_seconds": round(series["sum"] / series["count"], 3)
+                if series["count"]
+                else 0.0,
+            }
+            for series in self.snapshot()
+        }
+
+    def render(self):
+        """Prometheus text exposition lines for this histogram."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for series in self.snapshot():
+            labels = series["labels"]
+            for bound, count in series["buckets"].items():
+                le = "+Inf" if bound == float("inf") else str(bound)
+                bucket_labels = _labels({**labels, "le": le})
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{_labels(labels)} {series['count']}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render_samples(name: str, description: str, samples, kind="gauge"):
+    """Prometheus text exposition lines for a gauge or counter.
+
+    `samples` is a single value or a list of `(labels, value)` pairs.
+    """
+    if not isinstance(samples, list):
+        samples = [({}, samples)]
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+    return lines
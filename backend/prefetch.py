@@ -0,0 +1,429 @@
+import asyncio
+import base64
+import json
+import os
+import re
+import tomllib
+from dataclasses import dataclass, field
+
+from dotenv import load_dotenv
+
+from github import GITHUB_TOKEN, fetch_repo_size, parse_issue_url
+from mcp_client import mcp_pool
+from rate_limits import github_upstream
+from retrieval import candidate_notes
+from schema import BuildAndTest, IssueSummary
+
+load_dotenv()
+
+GITHUB_MCP_URL = os.getenv("GITHUB_MCP_URL", "https://api.githubcopilot.com/mcp/")
+MANIFEST_CHAR_LIMIT = 1500
+ISSUE_BODY_CHAR_LIMIT = 2000
+ISSUE_DESCRIPTION_CHAR_LIMIT = 500
+
+# Top-level files that describe how to set up, build and test a project
+BUILD_MANIFESTS = [
+    "package.json",
+    "pyproject.toml",
+    "requirements.txt",
+    "setup.py",
+    "Cargo.toml",
+    "go.mod",
+    "Makefile",
+    "pom.xml",
+    "build.gradle",
+    "build.gradle.kts",
+    "Gemfile",
+    "CONTRIBUTING.md",
+]
+
+
+@dataclass
+class PrefetchResult:
+    """Issue and repository facts gathered without any model turns."""
+
+    issue_url: str
+    issue: dict
+    tree: list[dict] = field(default_factory=list)
+    manifests: dict[str, str] = field(default_factory=dict)
+    head_sha: str | None = None
+    # Code chunks ranked against the issue text by the retrieval stage
+    candidates: list[dict] = field(default_factory=list)
+    # GitHub's size of the repository in KB, known before any clone
+    repo_size_kb: int | None = None
+
+    @property
+    def tree_names(self):
+        return {entry["name"] for entry in self.tree}
+
+    def issue_summary(self):
+        body = (self.issue.get("body") or "").strip()
+        # The first paragraph is usually the problem statement
+        description = (
+            _clip_text(body.split("\n\n")[0], ISSUE_DESCRIPTION_CHAR_LIMIT)
+            if body
+            else self.issue["title"]
+        )
+        return IssueSummary(
+            title=self.issue["title"],
+            description=description,
+            labels=[
+                label["name"] if isinstance(label, dict) else label
+                for label in self.issue.get("labels", [])
+            ],
+            status=self.issue.get("state", "open"),
+        )
+
+    def build_and_test(self):
+        """Best-effort commands inferred from the build manifests."""
+        commands = BuildAndTest()
+        names = self.tree_names
+        for name, content in self.manifests.items():
+            parser = _MANIFEST_PARSERS.get(name)
+            if parser is not None:
+                try:
+                    parser(content, names, commands)
+                except (ValueError, tomllib.TOMLDecodeError) as e:
+                    print(f"Error parsing {name}: {e}")
+        return commands
+
+    def apply_to(self, analysis):
+        """Overlay the facts that came straight from GitHub onto a model's analysis."""
+        analysis.issue_summary = self.overlay_issue_summary(analysis.issue_summary)
+        self.fill_build_and_test(analysis.build_and_test)
+        # Retrieved candidates only steer the agents; the model decides which
+        # of them are relevant
+        return analysis
+
+    def overlay_issue_summary(self, summary: IssueSummary | None):
+        """`summary` with the title, labels and status from GitHub; the model's
+        description is kept unless it is empty."""
+        facts = self.issue_summary()
+        if summary is None:
+            return facts
+        return summary.model_copy(
+            update={
+                "title": facts.title,
+                "labels": facts.labels,
+                "status": facts.status,
+                "description": summary.description.strip() or facts.description,
+            }
+        )
+
+    def fill_build_and_test(self, build_and_test: BuildAndTest):
+        """Fill fields the model left empty with commands from the manifests."""
+        inferred = self.build_and_test()
+        for name in BuildAndTest.model_fields:
+            if not getattr(build_and_test, name):
+                setattr(build_and_test, name, getattr(inferred, name))
+        return build_and_test
+
+    def session_sections(self):
+        """The prefetched facts as `SessionLedger` sections for the shared
+        `analysis_session` block."""
+        body = (self.issue.get("body") or "")[:ISSUE_BODY_CHAR_LIMIT]
+        summary = self.issue_summary()
+        tree = ", ".join(
+            entry["name"] + ("/" if entry.get("type") == "dir" else "")
+            for entry in self.tree
+        )
+        issue = [
+            "## Issue (prefetched)",
+            f"Title: {summary.title}",
+            f"State: {summary.status}",
+            f"Labels: {', '.join(summary.labels) or 'none'}",
+            f"Body:\n{body}",
+        ]
+        repository = [
+            f"## Top-level tree at {self.head_sha} (prefetched)"
+            if self.head_sha
+            else "## Top-level tree (prefetched)",
+            tree or "(unavailable)",
+        ]
+        build = self.build_and_test().model_dump(exclude_defaults=True)
+        if build:
+            # Ahead of the raw manifests so it survives the section's size cap
+            repository += ["", "## Inferred build commands", json.dumps(build)]
+        for name, content in self.manifests.items():
+            repository += [
+                "",
+                f"## {name} (prefetched)",
+                content[:MANIFEST_CHAR_LIMIT],
+            ]
+        return {
+            "issue": "\n".join(issue),
+            "repository": "\n".join(repository),
+            "candidates": candidate_notes(self.candidates) if self.candidates else "",
+        }
+
+
+def _clip_text(text: str, limit: int):
+    """`text` cut to `limit` characters at a sentence end, or else a word."""
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    end = max(head.rfind(f"{mark} ") for mark in ".!?")
+    if end >= limit // 2:
+        return head[: end + 1]
+    return head.rsplit(None, 1)[0].rstrip(",;:") + "…"
+
+
+def _tool_text(result):
+    """Concatenate the text parts of an MCP CallToolResult."""
+    parts = []
+    for item in result.content:
+        if getattr(item, "text", None) is not None:
+            parts.append(item.text)
+        elif getattr(getattr(item, "resource", None), "text", None) is not None:
+            parts.append(item.resource.text)
+    text = "\n".join(parts)
+    if result.isError:
+        raise RuntimeError(text or "MCP tool call failed")
+    return text
+
+
+def _file_text(result):
+    """File contents from `get_file_contents`, whichever shape the server returns."""
+    for item in result.content:
+        resource = getattr(item, "resource", None)
+        if getattr(resource, "text", None) is not None:
+            return resource.text
+    text = _tool_text(result)
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        return text
+    if isinstance(payload, dict) and payload.get("encoding") == "base64":
+        return base64.b64decode(payload["content"]).decode("utf-8", "replace")
+    if isinstance(payload, dict) and "content" in payload:
+        return payload["content"]
+    return text
+
+
+def _dir_entries(result):
+    for item in result.content:
+        text = getattr(item, "text", None)
+        if text is None:
+            continue
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(payload, list):
+            return [entry for entry in payload if isinstance(entry, dict)]
+    return []
+
+
+async def prefetch_issue_context(
+    issue_url: str, head_sha: str | None = None, server_url=GITHUB_MCP_URL
+):
+    """Fetch the issue, top-level tree, build manifests and repository size
+    concurrently.
+
+    With `head_sha`, repository reads are pinned to that commit so their
+    results are immutable and can be served from the tool cache indefinitely.
+    """
+    ref = parse_issue_url(issue_url)
+    repo_args = {"owner": ref.owner, "repo": ref.repo}
+    file_args = {**repo_args, "sha": head_sha} if head_sha else repo_args
+    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else None
+
+    client = await mcp_pool.get(
+        server_url, headers=headers, upstream_for=github_upstream
+    )
+    repo_size = asyncio.create_task(
+        asyncio.to_thread(fetch_repo_size, ref.owner, ref.repo)
+    )
+    tools = {tool.name: tool for tool in await client.list_tools()}
+    get_file = tools["get_file_contents"]
+
+    issue_result, tree_result = await client.call_tools(
+        [
+            (tools["get_issue"], {**repo_args, "issue_number": ref.number}),
+            (get_file, {**file_args, "path": "/"}),
+        ]
+    )
+    if isinstance(issue_result, BaseException):
+        raise issue_result
+    issue = json.loads(_tool_text(issue_result))
+    tree = [] if isinstance(tree_result, BaseException) else _dir_entries(tree_result)
+
+    present = [
+        entry["name"]
+        for entry in tree
+        if entry.get("type") == "file" and entry["name"] in BUILD_MANIFESTS
+    ]
+    manifest_results = await client.call_tools(
+        [(get_file, {**file_args, "path": name}) for name in present]
+    )
+
+    manifests = {}
+    for name, result in zip(present, manifest_results):
+        if isinstance(result, BaseException):
+            print(f"Error fetching {name}: {result}")
+            continue
+        try:
+            manifests[name] = _file_text(result)
+        except RuntimeError as e:
+            print(f"Error fetching {name}: {e}")
+    return PrefetchResult(
+        issue_url=ref.url,
+        issue=issue,
+        tree=tree,
+        manifests=manifests,
+        head_sha=head_sha,
+        repo_size_kb=await repo_size,
+    )
+
+
+async def fetch_files(
+    owner: str, repo: str, paths, sha: str, server_url=GITHUB_MCP_URL
+):
+    """Contents of `paths` at commit `sha`, fetched concurrently; files that
+    can't be read are left out."""
+    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"} if GITHUB_TOKEN else None
+    client = await mcp_pool.get(
+        server_url, headers=headers, upstream_for=github_upstream
+    )
+    paths = list(paths)
+    results = await client.call_tools(
+        [
+            (
+                "get_file_contents",
+                {"owner": owner, "repo": repo, "sha": sha, "path": path},
+            )
+            for path in paths
+        ]
+    )
+    files = {}
+    for path, result in zip(paths, results):
+        try:
+            if isinstance(result, BaseException):
+                raise result
+            files[path] = _file_text(result)
+        except Exception as e:
+            print(f"Error fetching {owner}/{repo}/{path}@{sha}: {e}")
+    return files
+
+
+def prefetch(issue_url: str, head_sha: str | None = None):
+    """Synchronous wrapper over the shared MCP session pool; returns None when
+    prefetching fails so agents fall back to gathering the context themselves."""
+    try:
+        return mcp_pool.run(prefetch_issue_context(issue_url, head_sha))
+    except Exception as e:
+        print(f"Error prefetching {issue_url}: {e}")
+        return None
+
+
+def _package_json(content, names, commands):
+    package = json.loads(content)
+    scripts = package.get("scripts", {})
+    if "pnpm-lock.yaml" in names:
+        manager, run = "pnpm", "pnpm"
+    elif "yarn.lock" in names:
+        manager, run = "yarn", "yarn"
+    else:
+        manager, run = "npm", "npm run"
+    commands.setup_commands.append(f"{manager} install")
+    if "build" in scripts:
+        commands.build_commands.append(f"{run} build")
+    if "test" in scripts:
+        commands.test_commands.append(f"{manager} test")
+    for script in ("lint", "format", "typecheck"):
+        if script in scripts:
+            commands.lint_commands.append(f"{run} {script}")
+    if commands.development_server is None:
+        if "dev" in scripts:
+            commands.development_server = f"{run} dev"
+        elif "start" in scripts:
+            commands.development_server = f"{manager} start"
+    if "engines" in package:
+        commands.environment_requirements += [
+            f"{engine} {version}" for engine, version in package["engines"].items()
+        ]
+
+
+def _pyproject(content, names, commands):
+    pyproject = tomllib.loads(content)
+    tools = pyproject.get("tool", {})
+    if "uv.lock" in names:
+        commands.setup_commands.append("uv sync")
+        prefix = "uv run "
+    elif "poetry" in tools:
+        commands.setup_commands.append("poetry install")
+        prefix = "poetry run "
+    else:
+        commands.setup_commands.append("pip install -e .")
+        prefix = ""
+    if "pytest" in tools or "pytest" in content or "tests" in names:
+        commands.test_commands.append(f"{prefix}pytest")
+    if "ruff" in tools:
+        commands.lint_commands.append(f"{prefix}ruff check .")
+    if "black" in tools:
+        commands.lint_commands.append(f"{prefix}black --check .")
+    if "mypy" in tools:
+        commands.lint_commands.append(f"{prefix}mypy .")
+    requires_python = pyproject.get("project", {}).get("requires-python")
+    if requires_python:
+        commands.environment_requirements.append(f"Python {requires_python}")
+
+
+def _requirements(content, names, commands):
+    commands.setup_commands.append("pip install -r requirements.txt")
+
+
+def _cargo(content, names, commands):
+    commands.build_commands.append("cargo build")
+    commands.test_commands.append("cargo test")
+    commands.lint_commands.append("cargo clippy")
+
+
+def _go_mod(content, names, commands):
+    commands.setup_commands.append("go mod download")
+    commands.build_commands.append("go build ./...")
+    commands.test_commands.append("go test ./...")
+    commands.lint_commands.append("go vet ./...")
+
+
+def _makefile(content, names, commands):
+    targets = set(re.findall(r"^([A-Za-z][\w-]*):", content, re.MULTILINE))
+    for target, bucket in (
+        ("install", commands.setup_commands),
+        ("setup", commands.setup_commands),
+        ("build", commands.build_commands),
+        ("test", commands.test_commands),
+        ("lint", commands.lint_commands),
+    ):
+        if target in targets:
+            bucket.append(f"make {target}")
+
+
+def _maven(content, names, commands):
+    commands.build_commands.append("mvn install")
+    commands.test_commands.append("mvn test")
+
+
+def _gradle(content, names, commands):
+    gradle = "./gradlew" if "gradlew" in names else "gradle"
+    commands.build_commands.append(f"{gradle} build")
+    commands.test_commands.append(f"{gradle} test")
+
+
+def _gemfile(content, names, commands):
+    commands.setup_commands.append("bundle install")
+
+
+_MANIFEST_PARSERS = {
+    "package.json": _package_json,
+    "pyproject.toml": _pyproject,
+    "requirements.txt": _requirements,
+    "Cargo.toml": _cargo,
+    "go.mod": _go_mod,
+    "Makefile": _makefile,
+    "pom.xml": _maven,
+    "build.gradle": _gradle,
+    "build.gradle.kts": _gradle,
+    "Gemfile": _gemfile,
+}
@@ -0,0 +1,329 @@
+import asyncio
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+# Requests per minute and burst size per upstream. GitHub's REST limit is
+# 5000/hour per token with secondary limits on bursts; search is 30/minute.
+# The model providers' defaults match their lowest paid tiers.
+RATE_LIMITS = {
+    "github": (
+        float(os.getenv("GITHUB_RATE_PER_MINUTE", "80")),
+        int(os.getenv("GITHUB_RATE_BURST", "20")),
+    ),
+    "github_search": (
+        float(os.getenv("GITHUB_SEARCH_RATE_PER_MINUTE", "25")),
+        int(os.getenv("GITHUB_SEARCH_RATE_BURST", "5")),
+    ),
+    "anthropic": (
+        float(os.getenv("ANTHROPIC_RATE_PER_MINUTE", "50")),
+        int(os.getenv("ANTHROPIC_RATE_BURST", "10")),
+    ),
+    "gemini": (
+        float(os.getenv("GEMINI_RATE_PER_MINUTE", "150")),
+        int(os.getenv("GEMINI_RATE_BURST", "20")),
+    ),
+}
+# Share of each bucket that batch work leaves for interactive requests
+BATCH_RESERVE = float(os.getenv("RATE_LIMIT_BATCH_RESERVE", "0.25"))
+# Analyses that would wait longer than this for budget are turned away
+ADMISSION_MAX_WAIT = float(os.getenv("RATE_LIMIT_ADMISSION_MAX_WAIT", "30"))
+# Backoff after a rate limit that came without Retry-After
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 120.0
+
+# Letta model handle prefixes per upstream
+MODEL_PROVIDERS = {
+    "anthropic": "anthropic",
+    "gemini-key": "gemini",
+    "google_ai": "gemini",
+    "google_vertex": "gemini",
+}
+
+_priority = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+
+class RateLimitedError(RuntimeError):
+    """Raised when an upstream asks us to slow down, or when waiting for its
+    budget would take too long; `retry_after` is in seconds."""
+
+    def __init__(self, message, retry_after=None, upstream=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.upstream = upstream
+
+
+def model_upstream(model: str | None):
+    """Upstream serving a Letta model handle like `anthropic/claude-...`."""
+    if not model:
+        return None
+    return MODEL_PROVIDERS.get(model.split("/", 1)[0])
+
+
+def github_upstream(tool_name: str):
+    """Upstream a GitHub MCP tool call counts against."""
+    return "github_search" if tool_name.startswith("search_") else "github"
+
+
+# A bare "429" is as likely a line number or part of a SHA, so it only counts
+# next to the status it is, e.g. "Error code: 429" or "HTTP/1.1 429"
+RATE_LIMIT_RE = re.compile(
+    r"rate[ _-]?limit|too many requests|resource[ _-]?exhausted"
+    r"|\b(?:status(?:[ _]?code)?|code|http(?:/[\d.]+)?)\W{0,3}429\b",
+    re.IGNORECASE,
+)
+
+
+def is_rate_limit_message(text) -> bool:
+    """Whether an error text (a tool return, a run's metadata) reports a rate
+    limit by name or by an HTTP 429 status."""
+    return RATE_LIMIT_RE.search(str(text)) is not None
+
+
+class SharedPriority:
+    """Priority of a run several callers wait on: batch work is promoted to
+    interactive as soon as an interactive caller joins it."""
+
+    def __init__(self, priority=INTERACTIVE):
+        self.value = priority
+
+    def join(self, priority):
+        if priority == INTERACTIVE:
+            self.value = INTERACTIVE
+
+
+def current_priority():
+    priority = _priority.get()
+    return getattr(priority, "value", priority)
+
+
+class UpstreamLimiter:
+    """Token bucket for one upstream, with priorities and backoff.
+
+    Interactive callers are served before batch callers, and batch callers
+    only take tokens while a `BATCH_RESERVE` share of the bucket stays free.
+    `penalize()` pauses the upstream for its Retry-After, or an exponential
+    backoff when it gave none, until a call succeeds again.
+    """
+
+    def __init__(self, name, per_minute, burst):
+        self.name = name
+        self.rate = per_minute / 60
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._failures = 0
+        self._waiting = Counter()
+        self._cond = threading.Condition()
+        self.granted = Counter()
+        self.rejected = 0
+        self.rate_limited = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+        return now
+
+    def _delay(self, cost, priority, now):
+        """Seconds until `cost` tokens can be granted at `priority`."""
+        needed = cost
+        if priority == BATCH:
+            needed += self.capacity * BATCH_RESERVE
+        delay = max(self._blocked_until - now, 0.0)
+        if self._tokens < needed:
+            delay = max(delay, (needed - self._tokens) / self.rate)
+        return delay
+
+    def acquire(self, cost=1, priority=None, timeout=None):
+        """Take `cost` tokens, waiting for them; raises RateLimitedError if
+        they won't be available within `timeout` seconds."""
+        priority = priority or current_priority()
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = self._refill()
+                    delay = self._delay(cost, priority, now)
+                    if priority == BATCH and self._waiting[INTERACTIVE]:
+                        # Interactive callers are woken first; check again after
+                        delay = max(delay, 1.0)
+                    if delay <= 0:
+                        break
+                    if deadline is not None and now + delay > deadline:
+                        self.rejected += 1
+                        raise RateLimitedError(
+                            f"{self.name} is rate limited, retry in {delay:.0f}s",
+                            retry_after=delay,
+                            upstream=self.name,
+                        )
+                    self._cond.wait(delay)
+                self._tokens -= cost
+                self.granted[priority] += 1
+                self.waited_seconds += now - started
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def charge(self, cost=1):
+        """Count calls made on our behalf, e.g. by agents on the Letta server,
+        without waiting; the debt delays later callers."""
+        with self._cond:
+            self._refill()
+            self._tokens = max(self._tokens - cost, -float(self.capacity))
+
+    def penalize(self, retry_after=None):
+        """Pause the upstream after it rate-limited us; returns the pause."""
+        with self._cond:
+            now = self._refill()
+            self._failures += 1
+            self.rate_limited += 1
+            if retry_after is None:
+                retry_after = min(
+                    BACKOFF_BASE * 2 ** (self._failures - 1), BACKOFF_MAX
+                ) * random.uniform(0.8, 1.2)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+            return retry_after
+
+    def succeeded(self):
+        if self._failures:
+            with self._cond:
+                self._failures = 0
+
+    def admission_delay(self, priority=None):
+        """Seconds until a new analysis at `priority` would get its first call."""
+        with self._cond:
+            now = self._refill()
+            return self._delay(1, priority or current_priority(), now)
+
+    def stats(self):
+        with self._cond:
+            now = self._refill()
+            return {
+                "tokens": round(self._tokens, 2),
+                "capacity": self.capacity,
+                "per_minute": round(self.rate * 60, 2),
+                "blocked_for": round(max(self._blocked_until - now, 0.0), 1),
+                "waiting": dict(+self._waiting),
+                "granted": dict(self.granted),
+                "rejected": self.rejected,
+                "rate_limited": self.rate_limited,
+                "waited_seconds": round(self.waited_seconds, 2),
+            }
+
+
+class UpstreamScheduler:
+    """Shared rate limits for every upstream the analyses call: GitHub REST
+    and search, and the model providers behind Letta.
+
+    Calls take tokens from their upstream's bucket before they go out, at the
+    priority of the work they belong to (interactive unless marked as batch),
+    and rate-limit responses pause the upstream for everyone. New analyses are
+    admitted only when their upstreams have budget within `ADMISSION_MAX_WAIT`,
+    so overload turns into fast 429s with Retry-After instead of failed runs.
+    Runs take one model token when they start and are charged for their other
+    steps as they finish, since Letta makes those calls for us.
+
+    Example usage:
+    ```with upstreams.priority(BATCH):
+        upstreams.admit(["anthropic", "github"])
+        upstreams.acquire("github")
+        ...  # call GitHub
+    ```
+    """
+
+    def __init__(self, limits=RATE_LIMITS, admission_max_wait=ADMISSION_MAX_WAIT):
+        self.admission_max_wait = admission_max_wait
+        self.limiters = {
+            name: UpstreamLimiter(name, per_minute, burst)
+            for name, (per_minute, burst) in limits.items()
+        }
+        self.admitted = Counter()
+        self.turned_away = Counter()
+
+    @contextmanager
+    def priority(self, priority: str):
+        """Mark calls made in this block, and threads bound from it, as
+        `priority` work."""
+        token = _priority.set(priority)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def acquire(self, upstream, cost=1, timeout=None):
+        limiter = self.limiters.get(upstream)
+        if limiter is not None:
+            limiter.acquire(cost, timeout=timeout)
+
+    async def acquire_async(self, upstream, cost=1, timeout=None):
+        if upstream in self.limiters:
+            # to_thread carries the caller's priority along
+            await asyncio.to_thread(self.acquire, upstream, cost, timeout)
+
+    def charge(self, upstream, cost=1):
+        limiter = self.limiters.get(upstream)
+        if limiter is not None:
+            limiter.charge(cost)
+
+    def penalize(self, upstream, retry_after=None):
+        limiter = self.limiters.get(upstream)
+        if limiter is None:
+            return retry_after
+        pause = limiter.penalize(retry_after)
+        print(f"Rate limited by {upstream}, pausing it for {pause:.1f}s")
+        return pause
+
+    def succeeded(self, upstream):
+        limiter = self.limiters.get(upstream)
+        if limiter is not None:
+            limiter.succeeded()
+
+    def admit(self, upstreams):
+        """Raise RateLimitedError unless every upstream in `upstreams` has
+        budget for a new analysis within `admission_max_wait`. Admission doesn't
+        wait; the analysis's first `acquire` of each upstream does."""
+        priority = current_priority()
+        delays = {
+            name: self.limiters[name].admission_delay(priority)
+            for name in set(upstreams)
+            if name in self.limiters
+        }
+        upstream, delay = max(
+            delays.items(), key=lambda item: item[1], default=(None, 0.0)
+        )
+        if delay > self.admission_max_wait:
+            self.turned_away[priority] += 1
+            raise RateLimitedError(
+                f"{upstream} has no budget for new analyses, retry in {delay:.0f}s",
+                retry_after=delay,
+                upstream=upstream,
+            )
+        self.admitted[priority] += 1
+
+    def stats(self):
+        return {
+            "upstreams": {
+                name: limiter.stats() for name, limiter in self.limiters.items()
+            },
+            "admitted": dict(self.admitted),
+            "turned_away": dict(self.turned_away),
+        }
+
+
+upstreams = UpstreamScheduler()
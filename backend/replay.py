@@ -0,0 +1,831 @@
+import asyncio
+import itertools
+import json
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from letta_client import (
+    Block,
+    LettaMessageUnion,
+    LlmConfig,
+    Run,
+    Step,
+    Tool,
+    UsageStatistics,
+)
+from mcp import Tool as MCPTool
+from mcp.types import CallToolResult
+from pydantic import TypeAdapter
+
+from github import IssueState, parse_issue_url
+from mcp_client import MCPClient
+from schema import create_mock_analysis
+
+ISSUE_URL_RE = re.compile(r"https://github\.com/[\w.-]+/[\w.-]+/issues/\d+")
+SECTION_RE = re.compile(r"one section of a larger analysis: `(\w+)`")
+
+_messages = TypeAdapter(LettaMessageUnion)
+
+
+def run_key(role: str, prompt: str):
+    """Which recorded runs answer a prompt: the agent's role, or the section a
+    worker was asked for in sectioned mode."""
+    match = SECTION_RE.search(prompt)
+    return f"section:{match.group(1)}" if match else role
+
+
+def _role(agent_name: str | None):
+    return "supervisor" if agent_name == "github-issue-supervisor" else "worker"
+
+
+def _seconds(start: datetime, end: datetime):
+    # Letta returns naive UTC timestamps for some fields and aware ones for others
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    return max((end - start).total_seconds(), 0.0)
+
+
+def load_sessions(paths):
+    sessions = []
+    for path in paths:
+        with open(path) as f:
+            sessions.append(json.load(f))
+    return sessions
+
+
+def save_session(session: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(session, f, indent=2)
+
+
+class Recorder:
+    """Captures what one analysis asked of Letta and the GitHub MCP server.
+
+    `RecordingLetta` and `record_mcp()` feed it while analyses run against the
+    real services; `session()` then fetches each run's messages, timing and
+    usage from Letta and returns a session for `ReplaySessions`. Record one
+    issue at a time so MCP calls are attributed to the right session.
+
+    Example usage:
+    ```recorder = Recorder()
+    agent._letta_client = RecordingLetta(Letta(token=LETTA_API_KEY), recorder)
+    with record_mcp(recorder):
+        run_analysis(issue_url, refresh=True)
+    save_session(recorder.session(letta_client, issue_url, issue_state), path)
+    ```
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.letta_tools = []
+        self._roles = {}
+        self._agent_issues = {}
+        self._runs = []
+        self._steps = {}
+        self.mcp_tools = []
+        self.mcp_calls = []
+
+    def observe(self, path: str, seconds: float, kwargs: dict, result):
+        with self._lock:
+            self.latencies[path].append(seconds)
+            if path == "agents.create":
+                self._roles[result.id] = _role(kwargs.get("name"))
+            elif path == "tools.list_mcp_tools_by_server":
+                self.letta_tools = sorted({tool.name for tool in result})
+            elif path == "agents.messages.create_async":
+                agent_id = kwargs["agent_id"]
+                prompt = str(kwargs["messages"][0].content)
+                match = ISSUE_URL_RE.search(prompt)
+                if match:
+                    self._agent_issues[agent_id] = match.group(0)
+                role = self._roles.get(agent_id, "worker")
+                self._runs.append(
+                    (self._agent_issues.get(agent_id), run_key(role, prompt), result.id)
+                )
+            elif path == "steps.list":
+                self._steps[self._issue_of(kwargs.get("agent_id"))] = [
+                    {
+                        "prompt_tokens": step.prompt_tokens or 0,
+                        "completion_tokens": step.completion_tokens or 0,
+                    }
+                    for step in result
+                ]
+
+    def _issue_of(self, agent_id):
+        # A supervisor-mode worker is never prompted directly, so its steps
+        # belong to the issue its supervisor was most recently asked about
+        if agent_id in self._agent_issues:
+            return self._agent_issues[agent_id]
+        return self._runs[-1][0] if self._runs else None
+
+    def observe_mcp(self, name: str, args: dict, seconds: float, result):
+        with self._lock:
+            self.mcp_calls.append(
+                {
+                    "name": name,
+                    "args": args,
+                    "latency": seconds,
+                    "result": result.model_dump(mode="json"),
+                }
+            )
+
+    def session(self, letta_client, issue_url: str, issue_state=None):
+        """The recorded session for `issue_url`, with run messages and usage
+        fetched from Letta. MCP calls recorded so far are moved into it."""
+        runs = defaultdict(list)
+        for run_issue, key, run_id in self._runs:
+            if run_issue != issue_url:
+                continue
+            run = letta_client.runs.retrieve(run_id)
+            usage = letta_client.runs.usage.retrieve(run_id)
+            steps = letta_client.runs.steps.list(run_id, limit=1000)
+            messages = letta_client.runs.messages.list(run_id, limit=1000)
+            started = run.created_at
+            runs[key].append(
+                {
+                    "duration": _seconds(started, run.completed_at or run.created_at),
+                    "messages": [
+                        {
+                            "offset": _seconds(started, message.date),
+                            "message": message.model_dump(mode="json"),
+                        }
+                        for message in messages
+                    ],
+                    "usage": usage.model_dump(mode="json", exclude_none=True),
+                    "steps": len(steps),
+                }
+            )
+        with self._lock:
+            mcp_calls, self.mcp_calls = self.mcp_calls, []
+            return {
+                "issue_url": issue_url,
+                "issue_state": (
+                    {
+                        "issue_updated_at": issue_state.issue_updated_at,
+                        "head_sha": issue_state.head_sha,
+                    }
+                    if issue_state
+                    else None
+                ),
+                "latencies": {
+                    path: statistics.median(values)
+                    for path, values in self.latencies.items()
+                },
+                "letta_tools": self.letta_tools,
+                "runs": dict(runs),
+                "worker_steps": self._steps.get(issue_url, []),
+                "mcp": {"tools": self.mcp_tools, "calls": mcp_calls},
+            }
+
+
+class RecordingLetta:
+    """Proxy over a `letta_client.Letta` that times every API call and tells
+    `recorder` about the agents, runs and steps it sees."""
+
+    def __init__(self, client, recorder: Recorder, path=()):
+        self._client = client
+        self._recorder = recorder
+        self._path = path
+
+    def __getattr__(self, name):
+        value = getattr(self._client, name)
+        path = (*self._path, name)
+        if not callable(value):
+            return RecordingLetta(value, self._recorder, path)
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            result = value(*args, **kwargs)
+            self._recorder.observe(
+                ".".join(path), time.perf_counter() - start, kwargs, result
+            )
+            return result
+
+        return call
+
+
+@contextmanager
+def record_mcp(recorder: Recorder):
+    """Record every MCP tool list and uncached tool call made meanwhile."""
+    call_once, list_tools = MCPClient._call_once, MCPClient.list_tools
+
+    async def recording_call_once(client, name, args, session):
+        start = time.perf_counter()
+        result = await call_once(client, name, args, session)
+        recorder.observe_mcp(name, args, time.perf_counter() - start, result)
+        return result
+
+    async def recording_list_tools(client, refresh=False):
+        tools = await list_tools(client, refresh)
+        recorder.mcp_tools = [tool.model_dump(mode="json") for tool in tools]
+        return tools
+
+    MCPClient._call_once = recording_call_once
+    MCPClient.list_tools = recording_list_tools
+    try:
+        yield recorder
+    finally:
+        MCPClient._call_once = call_once
+        MCPClient.list_tools = list_tools
+
+
+class ReplaySessions:
+    """Recorded sessions by issue URL, shared by the Letta and MCP fakes.
+
+    `scale` multiplies every recorded latency and run duration: 1.0 replays
+    at the original pace, 0.01 a hundred times faster. Issue URLs that
+    weren't recorded replay the first session, so one recording can stand in
+    for many distinct issues.
+    """
+
+    def __init__(self, sessions: list[dict], scale=1.0):
+        if not sessions:
+            raise ValueError("At least one session is required")
+        self.scale = scale
+        self.default = sessions[0]
+        self._sessions = {session["issue_url"]: session for session in sessions}
+        latencies = defaultdict(list)
+        for session in sessions:
+            for path, seconds in session.get("latencies", {}).items():
+                latencies[path].append(seconds)
+        self.latencies = {
+            path: statistics.median(values) for path, values in latencies.items()
+        }
+
+    def get(self, issue_url: str | None):
+        return self._sessions.get(issue_url, self.default)
+
+    def delay(self, path: str):
+        return self.latencies.get(path, 0.0) * self.scale
+
+    def issue_state(self, issue_url: str, timeout=10.0):
+        """Stand-in for `github.fetch_issue_state`."""
+        state = self.get(issue_url).get("issue_state")
+        return IssueState(**state) if state else None
+
+    def repo_size(self, owner: str, repo: str, timeout=10.0):
+        """Stand-in for `github.fetch_repo_size`."""
+        prefix = f"https://github.com/{owner}/{repo}/".lower()
+        session = next(
+            (s for url, s in self._sessions.items() if url.startswith(prefix)),
+            self.default,
+        )
+        return session.get("repo_size_kb")
+
+    @property
+    def letta_tools(self):
+        return self.default.get("letta_tools", [])
+
+    @property
+    def mcp_tools(self):
+        return self.default["mcp"]["tools"]
+
+    def mcp_call(self, name: str, args: dict):
+        """The recorded call to `name` whose arguments match `args` best."""
+        args = args or {}
+        best, best_score = None, -1
+        for session in self._sessions.values():
+            for call in session["mcp"]["calls"]:
+                if call["name"] != name:
+                    continue
+                score = sum(
+                    call["args"].get(key) == value for key, value in args.items()
+                )
+                if score > best_score:
+                    best, best_score = call, score
+        if best is None:
+            raise KeyError(f"No recorded call to MCP tool {name}")
+        return best
+
+
+class ReplayLetta:
+    """Stands in for `letta_client.Letta`, replaying recorded sessions.
+
+    Covers the calls the analysis pipeline makes: agents, blocks, tools,
+    runs and steps. Each call sleeps for its recorded median latency. A
+    prompt naming an issue URL starts that session's runs for the agent's
+    role (or section) from the top; later prompts, e.g. repairs, take the
+    next recorded run. A run reports `running` until its recorded duration
+    has passed and reveals its messages at their recorded offsets.
+    """
+
+    def __init__(self, sessions: ReplaySessions):
+        self.sessions = sessions
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._agents = {}
+        self._blocks = {}
+        self._tools = {}
+        self._runs = {}
+
+        api = self._api
+        self.agents = SimpleNamespace(
+            create=api("agents.create", self._create_agent),
+            modify=api("agents.modify", self._modify_agent),
+            delete=api("agents.delete", self._delete_agent),
+            list=api("agents.list", self._list_agents),
+            retrieve=api("agents.retrieve", self._retrieve_agent),
+            messages=SimpleNamespace(
+                create_async=api("agents.messages.create_async", self._create_run),
+                reset=api("agents.messages.reset", lambda agent_id: None),
+            ),
+        )
+        self.blocks = SimpleNamespace(
+            create=api("blocks.create", self._create_block),
+            modify=api("blocks.modify", self._modify_block),
+            retrieve=api("blocks.retrieve", lambda block_id: self._blocks[block_id]),
+            delete=api("blocks.delete", lambda block_id: self._blocks.pop(block_id)),
+            list=api("blocks.list", self._list_blocks),
+        )
+        self.tools = SimpleNamespace(
+            list_mcp_tools_by_server=api(
+                "tools.list_mcp_tools_by_server", self._list_mcp_tools
+            ),
+            add_mcp_tool=api("tools.add_mcp_tool", self._add_mcp_tool),
+            modify=api("tools.modify", self._modify_tool),
+            upsert_from_function=api("tools.upsert_from_function", self._upsert_tool),
+        )
+        self.runs = SimpleNamespace(
+            retrieve=api("runs.retrieve", self._retrieve_run),
+            list_active=api("runs.list_active", self._list_active_runs),
+            messages=SimpleNamespace(
+                list=api("runs.messages.list", self._run_messages)
+            ),
+            usage=SimpleNamespace(retrieve=api("runs.usage.retrieve", self._run_usage)),
+            steps=SimpleNamespace(list=api("runs.steps.list", self._run_steps)),
+        )
+        self.steps = SimpleNamespace(list=api("steps.list", self._list_steps))
+
+    def _api(self, path, fn):
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls[path] += 1
+            delay = self.sessions.delay(path)
+            if delay:
+                time.sleep(delay)
+            return fn(*args, **kwargs)
+
+        return call
+
+    def _id(self, prefix):
+        return f"{prefix}-replay-{next(self._ids)}"
+
+    def _issue(self, agent):
+        """The issue an agent works on: the last one it was prompted with, or
+        the target in its session block."""
+        if agent["issue"]:
+            return agent["issue"]
+        for block_id in agent["block_ids"]:
+            block = self._blocks.get(block_id)
+            match = block and ISSUE_URL_RE.search(block.value)
+            if match:
+                return match.group(0)
+        return None
+
+    def _create_agent(self, name=None, model=None, context_window_limit=None, **kwargs):
+        agent_id = self._id("agent")
+        llm_config = LlmConfig(
+            model=model or "replay",
+            model_endpoint_type="openai",
+            context_window=context_window_limit or 128000,
+        )
+        with self._lock:
+            self._agents[agent_id] = {
+                "name": name,
+                "role": _role(name),
+                "llm_config": llm_config,
+                "block_ids": list(kwargs.get("block_ids") or []),
+                "tags": list(kwargs.get("tags") or []),
+                "metadata": kwargs.get("metadata"),
+                "issue": None,
+                "cursor": Counter(),
+            }
+        return SimpleNamespace(id=agent_id, name=name, llm_config=llm_config)
+
+    def _modify_agent(self, agent_id, model=None, llm_config=None, **kwargs):
+        agent = self._agents[agent_id]
+        if llm_config is not None:
+            agent["llm_config"] = llm_config
+        if model is not None:
+            agent["llm_config"] = agent["llm_config"].model_copy(
+                update={"model": model}
+            )
+        return SimpleNamespace(
+            id=agent_id, name=agent["name"], llm_config=agent["llm_config"]
+        )
+
+    def _delete_agent(self, agent_id):
+        with self._lock:
+            self._agents.pop(agent_id, None)
+
+    def _agent_state(self, agent_id, agent):
+        return SimpleNamespace(
+            id=agent_id,
+            name=agent["name"],
+            tags=agent["tags"],
+            metadata=agent["metadata"],
+            memory=SimpleNamespace(
+                blocks=[SimpleNamespace(id=block_id) for block_id in agent["block_ids"]]
+            ),
+        )
+
+    def _retrieve_agent(self, agent_id):
+        return self._agent_state(agent_id, self._agents[agent_id])
+
+    def _list_agents(self, tags=None, after=None, limit=None, **kwargs):
+        agents = [
+            self._agent_state(agent_id, agent)
+            for agent_id, agent in list(self._agents.items())
+            if not tags or set(tags) & set(agent["tags"])
+        ]
+        if after is not None:
+            ids = [agent.id for agent in agents]
+            agents = agents[ids.index(after) + 1 :] if after in ids else []
+        return agents[:limit]
+
+    def _list_blocks(self, label=None, limit=None, request_options=None, **kwargs):
+        blocks = [
+            block
+            for block in list(self._blocks.values())
+            if label is None or block.label == label
+        ]
+        query = (request_options or {}).get("additional_query_parameters") or {}
+        if query.get("after") is not None:
+            ids = [block.id for block in blocks]
+            after = query["after"]
+            blocks = blocks[ids.index(after) + 1 :] if after in ids else []
+        return blocks[:limit]
+
+    def _create_block(self, label=None, value="", limit=None, **kwargs):
+        block = Block(
+            id=self._id("block"),
+            label=label,
+            value=value,
+            limit=limit,
+            metadata=kwargs.get("metadata"),
+        )
+        with self._lock:
+            self._blocks[block.id] = block
+        return block
+
+    def _modify_block(self, block_id, value=None, **kwargs):
+        block = self._blocks[block_id].model_copy(update={"value": value})
+        with self._lock:
+            self._blocks[block_id] = block
+        return block
+
+    def _list_mcp_tools(self, server_name):
+        return [SimpleNamespace(name=name) for name in self.sessions.letta_tools]
+
+    def _save_tool(self, name, return_char_limit):
+        tool = Tool(id=f"tool-{name}", name=name, return_char_limit=return_char_limit)
+        with self._lock:
+            self._tools[tool.id] = tool
+        return tool
+
+    def _add_mcp_tool(self, server_name, name):
+        existing = self._tools.get(f"tool-{name}")
+        return existing or self._save_tool(name, 6000)
+
+    def _modify_tool(self, tool_id, return_char_limit=None, **kwargs):
+        return self._save_tool(self._tools[tool_id].name, return_char_limit)
+
+    def _upsert_tool(self, func=None, return_char_limit=None, **kwargs):
+        return self._save_tool(func.__name__, return_char_limit)
+
+    def _create_run(self, agent_id, messages, **kwargs):
+        agent = self._agents[agent_id]
+        prompt = str(messages[0].content)
+        match = ISSUE_URL_RE.search(prompt)
+        key = run_key(agent["role"], prompt)
+        with self._lock:
+            if match:
+                agent["issue"] = match.group(0)
+                agent["cursor"].clear()
+            recorded_runs = self.sessions.get(self._issue(agent))["runs"].get(key, [])
+            index = agent["cursor"][key]
+            agent["cursor"][key] += 1
+        recorded = (
+            recorded_runs[min(index, len(recorded_runs) - 1)]
+            if recorded_runs
+            else {"duration": 0.0, "messages": [], "usage": {}, "steps": 0}
+        )
+        run_id = self._id("run")
+        created = datetime.now(timezone.utc)
+        scale = self.sessions.scale
+        replayed = []
+        for item in recorded["messages"]:
+            message = dict(item["message"])
+            # Message IDs repeat when a recorded run is replayed again
+            message["id"] = f"{message['id']}-{run_id}"
+            message["date"] = (
+                created + timedelta(seconds=item["offset"] * scale)
+            ).isoformat()
+            replayed.append(
+                (item["offset"] * scale, _messages.validate_python(message))
+            )
+        with self._lock:
+            self._runs[run_id] = {
+                "agent_id": agent_id,
+                "created": created,
+                "started": time.monotonic(),
+                "duration": recorded["duration"] * scale,
+                "messages": replayed,
+                "usage": recorded["usage"],
+                "steps": recorded.get("steps", 0),
+            }
+        return Run(id=run_id, status="created", created_at=created)
+
+    def _elapsed(self, run):
+        return time.monotonic() - run["started"]
+
+    def _retrieve_run(self, run_id):
+        run = self._runs[run_id]
+        done = self._elapsed(run) >= run["duration"]
+        return Run(
+            id=run_id,
+            status="completed" if done else "running",
+            created_at=run["created"],
+            completed_at=datetime.now(timezone.utc) if done else None,
+        )
+
+    def _list_active_runs(self, agent_ids=None, **kwargs):
+        return [
+            self._retrieve_run(run_id)
+            for run_id, run in list(self._runs.items())
+            if (agent_ids is None or run["agent_id"] in agent_ids)
+            and self._elapsed(run) < run["duration"]
+        ]
+
+    def _run_messages(self, run_id, after=None, limit=None, **kwargs):
+        run = self._runs[run_id]
+        elapsed = self._elapsed(run)
+        messages = [message for offset, message in run["messages"] if offset <= elapsed]
+        if after is not None:
+            ids = [message.id for message in messages]
+            if after in ids:
+                messages = messages[ids.index(after) + 1 :]
+        return messages[:limit] if limit else messages
+
+    def _run_usage(self, run_id):
+        return UsageStatistics(**self._runs[run_id]["usage"])
+
+    def _run_steps(self, run_id, limit=None, **kwargs):
+        steps = self._runs[run_id]["steps"]
+        return [Step(id=self._id("step")) for _ in range(min(steps, limit or steps))]
+
+    def _list_steps(self, agent_id=None, start_date=None, limit=None, **kwargs):
+        agent = self._agents.get(agent_id)
+        if agent is None:
+            return []
+        steps = self.sessions.get(self._issue(agent)).get("worker_steps", [])
+        return [Step(id=self._id("step"), **step) for step in steps[:limit]]
+
+
+class ReplayMCPClient(MCPClient):
+    """An `MCPClient` answering from recorded sessions instead of a server.
+
+    Only the transport is replaced: concurrency limits, the tool result cache,
+    spans and latency metrics behave as they do against a real server.
+    """
+
+    def __init__(self, sessions: ReplaySessions, server_url, **kwargs):
+        super().__init__(server_url, **kwargs)
+        self.sessions = sessions
+
+    @property
+    def connected(self):
+        return True
+
+    async def _connect(self):
+        return None
+
+    async def _disconnect(self):
+        return None
+
+    async def list_tools(self, refresh=False):
+        return [MCPTool.model_validate(tool) for tool in self.sessions.mcp_tools]
+
+    async def _call_once(self, name, args, session):
+        call = self.sessions.mcp_call(name, args)
+        await asyncio.sleep(call["latency"] * self.sessions.scale)
+        return CallToolResult.model_validate(call["result"])
+
+
+def _message(message_id, offset, step_id, message_type, **fields):
+    return {
+        "offset": offset,
+        "message": {
+            "id": message_id,
+            "date": "1970-01-01T00:00:00+00:00",
+            "message_type": message_type,
+            "step_id": step_id,
+            **fields,
+        },
+    }
+
+
+def _tool_exchange(prefix, offset, seconds, step_id, tool, arguments, result):
+    call_id = f"{prefix}-call"
+    return [
+        _message(
+            f"{prefix}-tool-call",
+            offset,
+            step_id,
+            "tool_call_message",
+            tool_call={
+                "name": tool,
+                "arguments": json.dumps(arguments),
+                "tool_call_id": call_id,
+            },
+        ),
+        _message(
+            f"{prefix}-tool-return",
+            offset + seconds,
+            step_id,
+            "tool_return_message",
+            name=tool,
+            tool_return=result,
+            status="success",
+            tool_call_id=call_id,
+        ),
+    ]
+
+
+def _text_result(text):
+    return {"content": [{"type": "text", "text": text}], "isError": False}
+
+
+# Letta API latencies (seconds) typical of the hosted service
+SYNTHETIC_LATENCIES = {
+    "agents.create": 0.6,
+    "agents.modify": 0.25,
+    "agents.delete": 0.2,
+    "agents.list": 0.3,
+    "agents.messages.create_async": 0.3,
+    "agents.messages.reset": 0.2,
+    "blocks.create": 0.15,
+    "blocks.modify": 0.15,
+    "blocks.retrieve": 0.1,
+    "blocks.delete": 0.1,
+    "runs.retrieve": 0.1,
+    "runs.list_active": 0.1,
+    "runs.messages.list": 0.2,
+    "runs.usage.retrieve": 0.1,
+    "runs.steps.list": 0.1,
+    "steps.list": 0.2,
+    "tools.list_mcp_tools_by_server": 0.4,
+    "tools.add_mcp_tool": 0.3,
+    "tools.modify": 0.2,
+    "tools.upsert_from_function": 0.4,
+}
+
+# Recorded-looking section durations (seconds) for sectioned mode
+SYNTHETIC_SECTION_SECONDS = {
+    "issue_summary": 15.0,
+    "project_context": 35.0,
+    "relevant_files": 60.0,
+    "build_and_test": 30.0,
+    "analysis": 50.0,
+}
+
+
+def synthetic_session(issue_url="https://github.com/example/project/issues/1"):
+    """A plausible session built from `create_mock_analysis()`, so the harness
+    runs without any recording. Runs cover supervisor and sectioned mode."""
+    ref = parse_issue_url(issue_url)
+    analysis = create_mock_analysis()
+    summary = analysis.issue_summary
+    repo_args = {"owner": ref.owner, "repo": ref.repo}
+
+    supervisor = [
+        *_tool_exchange(
+            "supervisor-1",
+            2.0,
+            70.0,
+            "step-1",
+            "send_message_to_agents_matching_tags",
+            {"message": f"Investigate the code behind {issue_url}"},
+            "Worker findings recorded in analysis_session",
+        ),
+        _message(
+            "supervisor-2",
+            88.0,
+            "step-2",
+            "assistant_message",
+            content=analysis.model_dump_json(),
+        ),
+    ]
+    runs = {
+        "supervisor": [
+            {
+                "duration": 90.0,
+                "messages": supervisor,
+                "usage": {
+                    "prompt_tokens": 42000,
+                    "completion_tokens": 3500,
+                    "total_tokens": 45500,
+                },
+                "steps": 2,
+            }
+        ]
+    }
+    for name, seconds in SYNTHETIC_SECTION_SECONDS.items():
+        value = analysis.model_dump(mode="json")[name]
+        runs[f"section:{name}"] = [
+            {
+                "duration": seconds,
+                "messages": [
+                    *_tool_exchange(
+                        f"{name}-1",
+                        3.0,
+                        1.0,
+                        f"{name}-step-1",
+                        "get_file_contents",
+                        {**repo_args, "path": "/"},
+                        "[...]",
+                    ),
+                    _message(
+                        f"{name}-2",
+                        seconds - 2.0,
+                        f"{name}-step-2",
+                        "assistant_message",
+                        content=json.dumps({name: value}),
+                    ),
+                ],
+                "usage": {
+                    "prompt_tokens": 18000,
+                    "completion_tokens": 1200,
+                    "total_tokens": 19200,
+                },
+                "steps": 2,
+            }
+        ]
+
+    issue = {
+        "number": ref.number,
+        "title": summary.title,
+        "body": summary.description,
+        "labels": [{"name": label} for label in summary.labels],
+        "state": summary.status,
+    }
+    tree = [
+        {"name": "src", "type": "dir", "path": "src"},
+        {"name": "tests", "type": "dir", "path": "tests"},
+        {"name": "pyproject.toml", "type": "file", "path": "pyproject.toml"},
+        {"name": "README.md", "type": "file", "path": "README.md"},
+    ]
+    pyproject = '[project]\nname = "project"\ndependencies = ["fastapi"]\n'
+    return {
+        "issue_url": issue_url,
+        "issue_state": {
+            "issue_updated_at": "2026-01-01T00:00:00Z",
+            "head_sha": "0" * 40,
+        },
+        "repo_size_kb": 1200,
+        "latencies": SYNTHETIC_LATENCIES,
+        "letta_tools": [
+            "get_file_contents",
+            "get_issue",
+            "list_commits",
+            "search_code",
+        ],
+        "runs": runs,
+        "worker_steps": [{"prompt_tokens": 6000, "completion_tokens": 400}] * 8,
+        "mcp": {
+            "tools": [
+                {"name": name, "inputSchema": {"type": "object"}}
+                for name in ("get_issue", "get_file_contents")
+            ],
+            "calls": [
+                {
+                    "name": "get_issue",
+                    "args": {**repo_args, "issue_number": ref.number},
+                    "latency": 0.4,
+                    "result": _text_result(json.dumps(issue)),
+                },
+                {
+                    "name": "get_file_contents",
+                    "args": {**repo_args, "path": "/"},
+                    "latency": 0.3,
+                    "result": _text_result(json.dumps(tree)),
+                },
+                {
+                    "name": "get_file_contents",
+                    "args": {**repo_args, "path": "pyproject.toml"},
+                    "latency": 0.3,
+                    "result": _text_result(pyproject),
+                },
+            ],
+        },
+    }
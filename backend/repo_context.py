@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from analysis_cache import CACHE_DIR
+from sections import REPO_SECTIONS
+from structured_output import SECTION_ADAPTERS
+from tracing import bind
+
+REPO_CONTEXT_MAX_ENTRIES = int(os.getenv("REPO_CONTEXT_MAX_ENTRIES", "1000"))
+
+
+def fingerprint(context):
+    """Hash of what repository-level sections are derived from: the top-level
+    tree and the build manifests of a `PrefetchResult`."""
+    payload = json.dumps(
+        {
+            "tree": sorted((item["name"], item.get("type")) for item in context.tree),
+            "manifests": sorted(context.manifests.items()),
+        }
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class RepoContextStore:
+    """Validated `project_context` and `build_and_test` per repository commit.
+
+    These sections depend only on the repository, so the first analysis of a
+    repository stores them and later analyses take them as given. An entry is
+    keyed by owner/repo and default-branch SHA, and also serves later SHAs as
+    long as the top-level tree and build manifests fingerprint the same, so
+    ordinary commits don't invalidate it.
+
+    Example usage:
+    ```known = repo_contexts.get("owner/repo", head_sha, context)  # {} on a miss
+    repo_contexts.put("owner/repo", head_sha, context, sections)
+    ```
+    """
+
+    def __init__(
+        self,
+        path=os.path.join(CACHE_DIR, "repo_context.sqlite3"),
+        max_entries=REPO_CONTEXT_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS repo_contexts (
+                repo TEXT NOT NULL,
+                head_sha TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (repo, head_sha)
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS repo_contexts_fingerprint "
+            "ON repo_contexts (repo, fingerprint)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.carried = 0
+        self.misses = 0
+
+    def get(self, repo: str, head_sha: str, context):
+        """Known sections for `repo` at `head_sha`, or {} when they must be
+        investigated. `context` is the commit's `PrefetchResult`."""
+        digest = fingerprint(context)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT head_sha, payload FROM repo_contexts "
+                "WHERE repo = ? AND fingerprint = ? "
+                "ORDER BY head_sha = ? DESC, created_at DESC LIMIT 1",
+                (repo, digest, head_sha),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return {}
+            stored_sha, payload = row
+            if stored_sha == head_sha:
+                self.hits += 1
+            else:
+                # Same structure and manifests at a new commit: carry it over
+                self.carried += 1
+                self._insert(repo, head_sha, digest, payload)
+        sections = json.loads(payload)
+        return {
+            name: SECTION_ADAPTERS[name].validate_python(sections[name])
+            for name in REPO_SECTIONS
+            if name in sections
+        }
+
+    def put(self, repo: str, head_sha: str, context, sections: dict):
+        """Store validated repository-level sections, e.g. of a finished
+        analysis."""
+        payload = json.dumps(
+            {name: sections[name].model_dump(mode="json") for name in REPO_SECTIONS}
+        )
+        with self._lock:
+            self._insert(repo, head_sha, fingerprint(context), payload)
+
+    def latest(self, repo: str):
+        """The newest entry for `repo` as a dict, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT head_sha, created_at, payload FROM repo_contexts "
+                "WHERE repo = ? ORDER BY created_at DESC LIMIT 1",
+                (repo,),
+            ).fetchone()
+        if row is None:
+            return None
+        head_sha, created_at, payload = row
+        return {
+            "repo": repo,
+            "head_sha": head_sha,
+            "created_at": created_at,
+            **json.loads(payload),
+        }
+
+    def _insert(self, repo, head_sha, digest, payload):
+        self._db.execute(
+            "INSERT OR REPLACE INTO repo_contexts "
+            "(repo, head_sha, fingerprint, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+            (repo, head_sha, digest, time.time(), payload),
+        )
+        self._db.execute(
+            "DELETE FROM repo_contexts WHERE rowid NOT IN "
+            "(SELECT rowid FROM repo_contexts ORDER BY created_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            (entries,) = self._db.execute(
+                "SELECT COUNT(*) FROM repo_contexts"
+            ).fetchone()
+            lookups = self.hits + self.carried + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "carried_over": self.carried,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.carried) / lookups, 3)
+                if lookups
+                else 0.0,
+            }
+
+
+class RepoContextWarmer:
+    """Builds repository contexts ahead of time on background threads.
+
+    `warm_fn(issue_url, head_sha)` investigates and stores the sections for
+    the repository of `issue_url`; each repository is warmed at most once at
+    a time.
+    """
+
+    def __init__(self, warm_fn):
+        self._warm_fn = warm_fn
+        self._lock = threading.Lock()
+        self._running = set()
+        self.warmed = 0
+        self.failed = 0
+
+    def start(self, repo: str, issue_url: str, head_sha: str):
+        """Start warming `repo`; False if it is already being warmed."""
+        with self._lock:
+            if repo in self._running:
+                return False
+            self._running.add(repo)
+        threading.Thread(
+            target=bind(self._run),
+            args=(repo, issue_url, head_sha),
+            name=f"repo-context-{repo}",
+            daemon=True,
+        ).start()
+        return True
+
+    def running(self, repo: str):
+        with self._lock:
+            return repo in self._running
+
+    def _run(self, repo, issue_url, head_sha):
+        try:
+            self._warm_fn(issue_url, head_sha)
+            with self._lock:
+                self.warmed += 1
+        except Exception as e:
+            print(f"Error warming repository context for {repo}: {e}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._running.discard(repo)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running": sorted(self._running),
+                "warmed": self.warmed,
+                "failed": self.failed,
+            }
+
+
+repo_contexts = RepoContextStore()
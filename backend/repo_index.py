@@ -0,0 +1,827 @@
+import ast
+import base64
+import fcntl
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from glob import escape as glob_escape
+from glob import glob
+
+from analysis_cache import CACHE_DIR
+from github import GITHUB_TOKEN
+
+REPO_WORKSPACE = os.getenv("REPO_WORKSPACE", os.path.join(CACHE_DIR, "repos"))
+REPO_INDEX_MAX_FILE_BYTES = int(os.getenv("REPO_INDEX_MAX_FILE_BYTES", "524288"))
+REPO_CLONE_TIMEOUT = float(os.getenv("REPO_CLONE_TIMEOUT", "300"))
+# Indexed commits kept per repository, most recently used first
+REPO_INDEX_KEEP_SHAS = int(os.getenv("REPO_INDEX_KEEP_SHAS", "3"))
+CHUNK_LINES = 40
+REPO_NAME_RE = re.compile(r"^(?!\.{1,2}$)[\w.-]+$")
+
+SKIP_DIRS = {"node_modules", "vendor", "third_party", "dist", ".git"}
+SKIP_FILES = {
+    "package-lock.json",
+    "yarn.lock",
+    "pnpm-lock.yaml",
+    "Cargo.lock",
+    "poetry.lock",
+    "uv.lock",
+    "go.sum",
+    "Gemfile.lock",
+}
+SKIP_SUFFIXES = (".min.js", ".min.css", ".map", ".svg", ".ipynb")
+
+# Chunk rowids are `file_id << CHUNK_ID_BITS | chunk_number`, so a file's chunks
+# can be deleted with a rowid range instead of a scan of the FTS table
+CHUNK_ID_BITS = 16
+
+
+def _brace_end(lines, start):
+    """Last line of a `{ ... }` block opening at or just after `start` (0-based)."""
+    depth = 0
+    opened = False
+    for i in range(start, len(lines)):
+        for char in lines[i]:
+            if char == "{":
+                depth += 1
+                opened = True
+            elif char == "}":
+                depth -= 1
+        if opened and depth <= 0:
+            return i
+        if not opened and i - start >= 3:
+            break  # Declaration without a body, e.g. a type alias
+    return start
+
+
+def _indent_end(lines, start):
+    """Last line of an indentation block (Ruby `def ... end` style)."""
+    indent = len(lines[start]) - len(lines[start].lstrip())
+    for i in range(start + 1, len(lines)):
+        stripped = lines[i].strip()
+        if not stripped:
+            continue
+        if len(lines[i]) - len(lines[i].lstrip()) <= indent:
+            return i if stripped == "end" else i - 1
+    return len(lines) - 1
+
+
+_JS = [
+    (
+        r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(\w+)",
+        "function",
+    ),
+    (r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(\w+)", "class"),
+    (
+        r"^\s*(?:export\s+)?(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?"
+        r"(?:\([^)]*\)|\w+)\s*(?::\s*[^=]+)?=>",
+        "function",
+    ),
+    (r"^\s*(?:export\s+)?(?:declare\s+)?(?:interface|enum)\s+(\w+)", "type"),
+    (r"^\s*(?:export\s+)?type\s+(\w+)\s*(?:<[^>]*>)?\s*=", "type"),
+]
+_JVM = [
+    (
+        r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|sealed|"
+        r"data|open|partial)\s+)*(?:class|interface|enum|record|object)\s+(\w+)",
+        "class",
+    ),
+    (
+        r"^\s*(?:(?:public|private|protected|internal|static|final|abstract|"
+        r"synchronized|override|async|virtual|suspend)\s+)+[\w<>\[\],.?\s]*?\b(\w+)"
+        r"\s*\([^;]*$",
+        "function",
+    ),
+    (
+        r"^\s*(?:(?:private|override|suspend|inline)\s+)*fun\s+(?:<[^>]*>\s*)?(\w+)",
+        "function",
+    ),
+]
+_C = [
+    (r"^\s*(?:typedef\s+)?(?:struct|class|union|enum)\s+(\w+)\s*[:{]?[^;]*$", "class"),
+    (
+        r"^[A-Za-z_][\w\s\*&:<>,]*?\b(\w+)\s*\([^;]*\)\s*(?:const\s*)?\{?\s*$",
+        "function",
+    ),
+]
+
+# Extension -> ([(pattern, kind)], block end finder)
+SYMBOL_RULES = {
+    **dict.fromkeys((".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"), (_JS, _brace_end)),
+    **dict.fromkeys((".java", ".kt", ".kts", ".cs", ".scala"), (_JVM, _brace_end)),
+    **dict.fromkeys((".c", ".h", ".cc", ".cpp", ".hpp", ".cxx"), (_C, _brace_end)),
+    ".go": (
+        [
+            (r"^func\s+(?:\([^)]*\)\s*)?(\w+)", "function"),
+            (r"^type\s+(\w+)\s+(?:struct|interface)", "class"),
+        ],
+        _brace_end,
+    ),
+    ".rs": (
+        [
+            (
+                r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+(\w+)",
+                "function",
+            ),
+            (
+                r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union)\s+(\w+)",
+                "class",
+            ),
+            (r"^\s*impl(?:<[^>]*>)?\s+(?:[\w:<>]+\s+for\s+)?(\w+)", "impl"),
+        ],
+        _brace_end,
+    ),
+    ".php": (
+        [
+            (
+                r"^\s*(?:abstract\s+|final\s+)?(?:class|interface|trait)\s+(\w+)",
+                "class",
+            ),
+            (
+                r"^\s*(?:(?:public|private|protected|static)\s+)*function\s+(\w+)",
+                "function",
+            ),
+        ],
+        _brace_end,
+    ),
+    ".rb": (
+        [
+            (r"^\s*def\s+(?:self\.)?(\w+[?!=]?)", "function"),
+            (r"^\s*(?:class|module)\s+([\w:]+)", "class"),
+        ],
+        _indent_end,
+    ),
+}
+SYMBOL_RULES = {
+    ext: ([(re.compile(pattern), kind) for pattern, kind in patterns], end)
+    for ext, (patterns, end) in SYMBOL_RULES.items()
+}
+
+
+def _python_symbols(text):
+    symbols = []
+
+    def visit(node, prefix):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{prefix}{child.name}"
+                kind = "class" if isinstance(child, ast.ClassDef) else "function"
+                if kind == "function" and prefix:
+                    kind = "method"
+                start = min(
+                    [child.lineno] + [d.lineno for d in child.decorator_list]
+                )
+                symbols.append((child.name, qualname, kind, start, child.end_lineno))
+                visit(child, f"{qualname}.")
+
+    try:
+        visit(ast.parse(text), "")
+    except (SyntaxError, ValueError):
+        pass
+    return symbols
+
+
+# Control-flow statements that the looser function patterns can mistake for calls
+KEYWORDS = {"if", "for", "while", "switch", "return", "catch", "else"}
+
+
+def extract_symbols(path: str, text: str):
+    """`(name, qualname, kind, start_line, end_line)` for each definition in a file.
+
+    Python is parsed with `ast`; other languages use per-language patterns with
+    brace or indentation matching for the end line.
+    """
+    if path.endswith(".py"):
+        return _python_symbols(text)
+    ext = os.path.splitext(path)[1]
+    rules = SYMBOL_RULES.get(ext)
+    if rules is None:
+        return []
+    patterns, block_end = rules
+    lines = text.splitlines()
+    symbols = []
+    for i, line in enumerate(lines):
+        for pattern, kind in patterns:
+            match = pattern.match(line)
+            if match and match.group(1) not in KEYWORDS:
+                name = match.group(1)
+                symbols.append((name, name, kind, i + 1, block_end(lines, i) + 1))
+                break
+    return symbols
+
+
+def _indexable(path: str, size: int):
+    parts = path.split("/")
+    return (
+        size <= REPO_INDEX_MAX_FILE_BYTES
+        and not SKIP_DIRS.intersection(parts[:-1])
+        and parts[-1] not in SKIP_FILES
+        and not parts[-1].endswith(SKIP_SUFFIXES)
+    )
+
+
+def _query_terms(query: str):
+    # The trigram tokenizer can't match terms shorter than three characters
+    return [term for term in re.findall(r"[^\s\"]+", query) if len(term) >= 3]
+
+
+class RepoIndex:
+    """Shallow checkout of one repository at one commit plus a search index.
+
+    The checkout lives in `<workspace>/<owner>/<repo>@<sha>` and the index in
+    a SQLite database next to it: an FTS5 trigram table over fixed-size line
+    chunks (ranked with BM25) and a symbol table of functions and classes
+    with line ranges. Commits never change once synced, so analyses at
+    different commits don't see each other's files. `sync(seed)` checks the
+    commit out and, starting from the index of `seed` (an earlier commit),
+    re-indexes only files whose blob SHA changed. Reads hold a shared lock on
+    the commit that its sync and eviction take exclusively.
+
+    Example usage:
+    ```index = repo_indexes.sync("fastapi", "fastapi", head_sha)
+    index.search("dependency overrides")
+    index.find_symbol("solve_dependencies")
+    ```
+    """
+
+    def __init__(self, owner: str, repo: str, sha: str, workspace=REPO_WORKSPACE):
+        self.owner = owner
+        self.repo = repo
+        self.sha = sha
+        self.full_name = f"{owner}/{repo}"
+        base = os.path.join(workspace, owner, repo)
+        self.checkout = f"{base}@{sha}"
+        self.db_path = f"{self.checkout}.sqlite3"
+        # Shared by the repository's commits, so vectors can be carried over
+        self.vectors_dir = f"{base}.vectors"
+        os.makedirs(os.path.dirname(self.checkout), exist_ok=True)
+        self.lock_path = f"{self.checkout}.lock"
+
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                blob_sha TEXT NOT NULL,
+                lines INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                path UNINDEXED, start_line UNINDEXED, content, tokenize='trigram'
+            );
+            CREATE TABLE IF NOT EXISTS symbols (
+                file_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                qualname TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                path TEXT NOT NULL,
+                start_line INTEGER NOT NULL,
+                end_line INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS symbols_file ON symbols (file_id);"""
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    @property
+    def head_sha(self):
+        """The commit, once it has been checked out and indexed; else None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE key = 'head_sha'"
+            ).fetchone()
+        return row[0] if row else None
+
+    @contextmanager
+    def reading(self, exclusive=False, blocking=True):
+        """Hold the commit's file lock, which other uvicorn workers share."""
+        with open(self.lock_path, "a") as lock_file:
+            operation = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            fcntl.flock(lock_file, operation | (0 if blocking else fcntl.LOCK_NB))
+            yield
+
+    def sync(self, seed=None):
+        """Check out the commit and index it, starting from the index of `seed`."""
+        start = time.monotonic()
+        with self.reading(exclusive=True):
+            if self.head_sha == self.sha:
+                return {
+                    "head_sha": self.sha,
+                    "changed": 0,
+                    "removed": 0,
+                    "seconds": 0.0,
+                }
+            if seed is not None:
+                with seed.reading(), seed._lock, self._lock:
+                    seed._db.backup(self._db)
+                    self._db.execute("DELETE FROM meta WHERE key = 'head_sha'")
+                    self._db.commit()
+            self._checkout()
+            tree = self._ls_tree()
+            changed, removed = self._update(tree)
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('head_sha', ?)", (self.sha,)
+                )
+                self._db.commit()
+        seconds = round(time.monotonic() - start, 3)
+        print(
+            f"Indexed {self.full_name}@{self.sha[:12]}: {changed} changed, "
+            f"{removed} removed in {seconds}s"
+        )
+        return {
+            "head_sha": self.sha,
+            "changed": changed,
+            "removed": removed,
+            "seconds": seconds,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def remove(self):
+        """Delete the checkout and index unless someone is reading them; returns
+        whether they were deleted."""
+        try:
+            with self.reading(exclusive=True, blocking=False):
+                self.close()
+                shutil.rmtree(self.checkout, ignore_errors=True)
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.remove(f"{self.db_path}{suffix}")
+                    except FileNotFoundError:
+                        pass
+        except BlockingIOError:
+            return False
+        return True
+
+    def search(self, query: str, limit=10, path_prefix=None):
+        """Ranked chunks matching all query terms (any term if none match all),
+        with the exact lines that matched."""
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        quoted = [f'"{term}"' for term in terms]
+        with self.reading(), self._lock:
+            rows = []
+            for match in (" AND ".join(quoted), " OR ".join(quoted)):
+                rows = self._db.execute(
+                    "SELECT path, start_line, content, bm25(chunks) FROM chunks "
+                    "WHERE chunks MATCH ? AND (? IS NULL OR path LIKE ? || '%') "
+                    "ORDER BY bm25(chunks) LIMIT ?",
+                    (match, path_prefix, path_prefix, limit),
+                ).fetchall()
+                if rows or len(terms) == 1:
+                    break
+
+        lowered = [term.lower() for term in terms]
+        results = []
+        for path, start_line, content, score in rows:
+            lines = content.split("\n")
+            matched = [
+                (start_line + i, line)
+                for i, line in enumerate(lines)
+                if any(term in line.lower() for term in lowered)
+            ]
+            results.append(
+                {
+                    "path": path,
+                    "start_line": start_line,
+                    "end_line": start_line + len(lines) - 1,
+                    "matched_lines": [number for number, _ in matched],
+                    "snippet": "\n".join(
+                        f"{number}: {line}" for number, line in matched[:5]
+                    ),
+                    "score": round(-score, 3),
+                }
+            )
+        return results
+
+    def find_symbol(self, name: str, limit=20):
+        """Definitions whose name or qualified name matches, exact matches first."""
+        with self.reading(), self._lock:
+            rows = self._db.execute(
+                "SELECT name, qualname, kind, path, start_line, end_line FROM symbols "
+                "WHERE name = ? COLLATE NOCASE OR qualname LIKE ? "
+                "ORDER BY name = ? DESC, length(qualname) LIMIT ?",
+                (name, f"%{name}%", name, limit),
+            ).fetchall()
+        fields = ("name", "qualname", "kind", "path", "start_line", "end_line")
+        return [dict(zip(fields, row)) for row in rows]
+
+    def read_lines(self, path: str, start_line=1, end_line=None, numbered=True):
+        """Lines of a file at the indexed commit, prefixed with their numbers."""
+        full_path = os.path.realpath(os.path.join(self.checkout, path))
+        if not full_path.startswith(os.path.realpath(self.checkout) + os.sep):
+            raise ValueError(f"Path outside repository: {path}")
+        with self.reading(), open(full_path, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+        start_line = max(start_line, 1)
+        end_line = min(end_line or len(lines), len(lines))
+        if not numbered:
+            return "\n".join(lines[start_line - 1 : end_line])
+        return "\n".join(
+            f"{number}: {lines[number - 1]}"
+            for number in range(start_line, end_line + 1)
+        )
+
+    def iter_chunks(self, page_size=1000):
+        """Yield every indexed chunk as `(path, blob_sha, start_line, content)`."""
+        last_rowid = -1
+        while True:
+            with self.reading(), self._lock:
+                rows = self._db.execute(
+                    "SELECT chunks.rowid, chunks.path, files.blob_sha, "
+                    "chunks.start_line, chunks.content FROM chunks "
+                    "JOIN files ON files.id = chunks.rowid >> ? "
+                    "WHERE chunks.rowid > ? ORDER BY chunks.rowid LIMIT ?",
+                    (CHUNK_ID_BITS, last_rowid, page_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield row[1:]
+            last_rowid = rows[-1][0]
+
+    def stats(self):
+        with self._lock:
+            (files,) = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+            (symbols,) = self._db.execute("SELECT COUNT(*) FROM symbols").fetchone()
+            (chunks,) = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+        return {
+            "head_sha": self.head_sha,
+            "files": files,
+            "chunks": chunks,
+            "symbols": symbols,
+        }
+
+    def _git(self, *args, auth=False):
+        command = ["git"]
+        if auth and GITHUB_TOKEN:
+            credentials = base64.b64encode(
+                f"x-access-token:{GITHUB_TOKEN}".encode()
+            ).decode()
+            # Passed per command so the token is never written to .git/config
+            command += ["-c", f"http.extraHeader=Authorization: Basic {credentials}"]
+        result = subprocess.run(
+            command + list(args),
+            cwd=self.checkout,
+            capture_output=True,
+            text=True,
+            timeout=REPO_CLONE_TIMEOUT,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"git {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    def _checkout(self):
+        if not os.path.isdir(os.path.join(self.checkout, ".git")):
+            os.makedirs(self.checkout, exist_ok=True)
+            self._git("init", "-q")
+            self._git(
+                "remote", "add", "origin", f"https://github.com/{self.full_name}.git"
+            )
+        # GitHub serves any reachable commit by SHA, so fetch just that one
+        self._git("fetch", "-q", "--depth", "1", "origin", self.sha, auth=True)
+        self._git("checkout", "-q", "--force", "--detach", self.sha)
+
+    def _ls_tree(self):
+        tree = {}
+        output = self._git("ls-tree", "-r", "-z", "-l", "--full-tree", "HEAD")
+        for entry in output.split("\0"):
+            if not entry:
+                continue
+            info, path = entry.split("\t", 1)
+            mode, kind, blob_sha, size = info.split()
+            if kind == "blob" and mode != "120000" and _indexable(path, int(size)):
+                tree[path] = blob_sha
+        return tree
+
+    def _update(self, tree):
+        with self._lock:
+            indexed = dict(
+                self._db.execute("SELECT path, blob_sha FROM files").fetchall()
+            )
+        changed = [path for path, sha in tree.items() if indexed.get(path) != sha]
+        removed = [path for path in indexed if path not in tree]
+
+        for path in removed:
+            with self._lock:
+                self._remove(path)
+                self._db.commit()
+        for path in changed:
+            try:
+                with open(os.path.join(self.checkout, path), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if b"\0" in data[:8192]:
+                text = None  # Binary: remember the blob so it isn't re-read
+            else:
+                text = data.decode("utf-8", errors="replace")
+            with self._lock:
+                self._remove(path)
+                self._add(path, tree[path], text)
+                self._db.commit()
+        return len(changed), len(removed)
+
+    def _remove(self, path):
+        row = self._db.execute(
+            "SELECT id FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None:
+            return
+        (file_id,) = row
+        self._db.execute(
+            "DELETE FROM chunks WHERE rowid BETWEEN ? AND ?",
+            (file_id << CHUNK_ID_BITS, ((file_id + 1) << CHUNK_ID_BITS) - 1),
+        )
+        self._db.execute("DELETE FROM symbols WHERE file_id = ?", (file_id,))
+        self._db.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _add(self, path, blob_sha, text):
+        lines = text.split("\n") if text is not None else []
+        file_id = self._db.execute(
+            "INSERT INTO files (path, blob_sha, lines) VALUES (?, ?, ?)",
+            (path, blob_sha, len(lines)),
+        ).lastrowid
+        if text is None:
+            return
+        chunk_lines = max(CHUNK_LINES, -(-len(lines) // (1 << CHUNK_ID_BITS)))
+        self._db.executemany(
+            "INSERT INTO chunks (rowid, path, start_line, content) VALUES (?, ?, ?, ?)",
+            [
+                (
+                    (file_id << CHUNK_ID_BITS) | number,
+                    path,
+                    offset + 1,
+                    "\n".join(lines[offset : offset + chunk_lines]),
+                )
+                for number, offset in enumerate(range(0, len(lines), chunk_lines))
+            ],
+        )
+        self._db.executemany(
+            "INSERT INTO symbols VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (file_id, name, qualname, kind, path, start, end)
+                for name, qualname, kind, start, end in extract_symbols(path, text)
+            ],
+        )
+
+
+class RepoIndexManager:
+    """Open repository indexes, with syncs running on a small background pool.
+
+    Each repository keeps its `keep_shas` most recently used commits; the
+    latest synced one answers requests that don't name a commit.
+
+    Example usage:
+    ```repo_indexes.prepare("fastapi", "fastapi", head_sha)  # Start indexing early
+    index = repo_indexes.get("fastapi", "fastapi", head_sha)  # Waits for its sync
+    ```
+    """
+
+    def __init__(
+        self, workspace=REPO_WORKSPACE, max_workers=2, keep_shas=REPO_INDEX_KEEP_SHAS
+    ):
+        self.workspace = workspace
+        self.keep_shas = keep_shas
+        self._lock = threading.Lock()
+        self._indexes: dict[tuple[str, str], RepoIndex] = {}
+        self._syncs: dict[tuple[str, str], object] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="repo-index"
+        )
+
+    def sync(self, owner: str, repo: str, sha: str, timeout=None):
+        """Bring the index to `sha` and return it; blocks while indexing, for
+        at most `timeout` seconds."""
+        return self.prepare(owner, repo, sha).result(timeout)
+
+    def prepare(self, owner: str, repo: str, sha: str):
+        """Start syncing `owner/repo` to `sha` in the background; returns a future."""
+        key = (f"{owner}/{repo}".lower(), sha)
+        with self._lock:
+            running = self._syncs.get(key)
+            if running is not None and not running.done():
+                return running
+            if (
+                running is not None
+                and not running.exception()
+                and os.path.exists(running.result().db_path)
+            ):
+                return running
+            future = self._executor.submit(self._sync, owner, repo, sha)
+            self._syncs[key] = future
+            return future
+
+    def get(self, owner: str, repo: str, sha=None, timeout=REPO_CLONE_TIMEOUT):
+        """The index of `owner/repo` at `sha`, or at its latest synced commit,
+        waiting up to `timeout` seconds for a sync in progress; None when that
+        commit hasn't been indexed."""
+        if not REPO_NAME_RE.match(owner) or not REPO_NAME_RE.match(repo):
+            return None
+        sha = sha or self._latest(owner, repo)
+        if sha is None:
+            return None
+        key = (f"{owner}/{repo}".lower(), sha)
+        with self._lock:
+            running = self._syncs.get(key)
+        if running is not None:
+            try:
+                running.result(timeout)
+            except FutureTimeoutError:
+                return None
+            except Exception as e:
+                print(f"Error indexing {key[0]}@{sha}: {e}")
+        if not os.path.exists(f"{self._base(owner, repo)}@{sha}.sqlite3"):
+            return None
+        index = self._open(owner, repo, sha)
+        if index.head_sha != sha:
+            return None
+        os.utime(index.lock_path)  # Most recently used
+        return index
+
+    def stats(self):
+        with self._lock:
+            indexes = list(self._indexes.values())
+            syncing = [
+                f"{name}@{sha}"
+                for (name, sha), future in self._syncs.items()
+                if not future.done()
+            ]
+        return {
+            "repos": {
+                f"{index.full_name}@{index.sha}": index.stats() for index in indexes
+            },
+            "syncing": syncing,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _base(self, owner, repo):
+        return os.path.join(self.workspace, owner.lower(), repo.lower())
+
+    def _latest(self, owner, repo):
+        try:
+            with open(f"{self._base(owner, repo)}.head") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _open(self, owner, repo, sha):
+        if not REPO_NAME_RE.match(owner) or not REPO_NAME_RE.match(repo):
+            raise ValueError(f"Invalid repository name: {owner}/{repo}")
+        key = (f"{owner}/{repo}".lower(), sha)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None and not os.path.exists(index.db_path):
+                index.close()  # Evicted, possibly by another worker
+                index = None
+            if index is None:
+                index = self._indexes[key] = RepoIndex(
+                    owner.lower(), repo.lower(), sha, self.workspace
+                )
+            return index
+
+    def _sync(self, owner, repo, sha):
+        index = self._open(owner, repo, sha)
+        # Start from the latest commit's index; most files will be unchanged
+        latest, seed = self._latest(owner, repo), None
+        if latest not in (None, sha) and os.path.exists(
+            f"{self._base(owner, repo)}@{latest}.sqlite3"
+        ):
+            seed = self._open(owner, repo, latest)
+            if seed.head_sha != latest:
+                seed = None  # Its sync never finished
+        index.sync(seed)
+        os.utime(index.lock_path)
+        head = f"{self._base(owner, repo)}.head"
+        with open(f"{head}.{os.getpid()}.tmp", "w") as f:
+            f.write(sha)
+        os.replace(f"{head}.{os.getpid()}.tmp", head)
+        self._evict(owner, repo)
+        return index
+
+    def _evict(self, owner, repo):
+        """Delete the least recently used commits beyond `keep_shas`."""
+        base = self._base(owner, repo)
+        paths = glob(f"{glob_escape(base)}@*.sqlite3")
+        shas = [path[len(base) + 1 : -len(".sqlite3")] for path in paths]
+
+        def last_used(sha):
+            try:
+                return os.path.getmtime(f"{base}@{sha}.lock")
+            except FileNotFoundError:
+                return 0.0
+
+        keep = {self._latest(owner, repo)}
+        with self._lock:
+            keep |= {
+                sha
+                for (name, sha), future in self._syncs.items()
+                if name == f"{owner}/{repo}".lower() and not future.done()
+            }
+        for sha in sorted(shas, key=last_used, reverse=True)[self.keep_shas :]:
+            if sha in keep:
+                continue
+            index = self._open(owner, repo, sha)
+            if index.remove():
+                with self._lock:
+                    self._indexes.pop((f"{owner}/{repo}".lower(), sha), None)
+                    self._syncs.pop((f"{owner}/{repo}".lower(), sha), None)
+                print(f"Removed index of {owner}/{repo}@{sha[:12]}")
+
+
+repo_indexes = RepoIndexManager()
+
+
+# Letta tools. Their source runs in Letta's tool sandbox, so they are
+# self-contained and reach this API through REPO_INDEX_URL.
+
+
+def search_repository(repo: str, query: str, limit: int = 10, sha: str = "") -> str:
+    """Full-text search over a local checkout of the repository at the commit being analysed. Faster than search_code, and the line numbers are exact.
+
+    Args:
+        repo (str): Repository as "owner/name".
+        query (str): Identifiers or words to search for; each term needs at least 3 characters.
+        limit (int): Maximum number of matching chunks to return.
+        sha (str): Commit being analysed, as named in the analysis_session block; empty for the latest indexed one.
+
+    Returns:
+        str: JSON list of matches with path, matched line numbers and a numbered snippet.
+    """
+    import os
+    import urllib.parse
+    import urllib.request
+
+    base_url = os.environ["REPO_INDEX_URL"].rstrip("/")
+    params = urllib.parse.urlencode({"q": query, "limit": limit, "sha": sha})
+    url = f"{base_url}/repos/{repo}/search?{params}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read().decode()
+
+
+def find_symbol(repo: str, name: str, sha: str = "") -> str:
+    """Find where a function, method or class is defined in the repository, with its exact line range.
+
+    Args:
+        repo (str): Repository as "owner/name".
+        name (str): Symbol name, e.g. "parse_args" or "Router.add_route".
+        sha (str): Commit being analysed, as named in the analysis_session block; empty for the latest indexed one.
+
+    Returns:
+        str: JSON list of definitions with kind, path, start_line and end_line.
+    """
+    import os
+    import urllib.parse
+    import urllib.request
+
+    base_url = os.environ["REPO_INDEX_URL"].rstrip("/")
+    params = urllib.parse.urlencode({"name": name, "sha": sha})
+    url = f"{base_url}/repos/{repo}/symbols?{params}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read().decode()
+
+
+def read_repository_lines(
+    repo: str, path: str, start_line: int = 1, end_line: int = 200, sha: str = ""
+) -> str:
+    """Read numbered lines of a file from the local checkout at the commit being analysed.
+
+    Args:
+        repo (str): Repository as "owner/name".
+        path (str): File path relative to the repository root.
+        start_line (int): First line to return (1-based).
+        end_line (int): Last line to return (inclusive).
+        sha (str): Commit being analysed, as named in the analysis_session block; empty for the latest indexed one.
+
+    Returns:
+        str: The requested lines, each prefixed with its line number.
+    """
+    import os
+    import urllib.parse
+    import urllib.request
+
+    base_url = os.environ["REPO_INDEX_URL"].rstrip("/")
+    params = urllib.parse.urlencode(
+        {"path": path, "start": start_line, "end": end_line, "sha": sha}
+    )
+    url = f"{base_url}/repos/{repo}/lines?{params}"
+    with urllib.request.urlopen(url, timeout=60) as response:
+        return response.read().decode()
+
+
+REPO_INDEX_TOOLS = [search_repository, find_symbol, read_repository_lines]
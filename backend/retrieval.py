@@ -0,0 +1,345 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+# Analyses go on without candidates rather than wait longer for a clone
+RETRIEVAL_INDEX_WAIT = float(os.getenv("RETRIEVAL_INDEX_WAIT", "20"))
+RETRIEVAL_DIM = int(os.getenv("RETRIEVAL_DIM", "2048"))
+# sentence-transformers model name; the hashed TF-IDF vectorizer is used when
+# unset or when sentence-transformers isn't installed
+RETRIEVAL_MODEL = os.getenv("RETRIEVAL_MODEL")
+RETRIEVAL_BATCH_SIZE = 256
+RETRIEVAL_KEEP_SHAS = 2
+RETRIEVAL_SNIPPET_LINES = 12
+
+# Splits snake_case, camelCase and PascalCase identifiers into words
+TOKEN_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+STOPWORDS = set(
+    """the and for that this with from are was but not you can have has when what
+    how will use self return import def class const let var function none true
+    false null new int str""".split()
+)
+
+
+def _tokens(text: str):
+    for token in TOKEN_RE.findall(text):
+        token = token.lower()
+        if len(token) > 2 and token not in STOPWORDS:
+            yield token
+
+
+class HashingVectorizer:
+    """Offline TF-IDF over hashed word tokens; needs no model download.
+
+    Rows are sublinear term frequencies in `dim` hashed buckets. The caller
+    learns IDF weights over the whole corpus (`uses_idf`) and normalizes.
+    """
+
+    uses_idf = True
+
+    def __init__(self, dim=RETRIEVAL_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for token in _tokens(text):
+                bucket = zlib.crc32(token.encode()) % self.dim
+                counts[bucket] = counts.get(bucket, 0) + 1
+            if counts:
+                buckets = np.fromiter(counts.keys(), dtype=np.int64)
+                values = np.fromiter(counts.values(), dtype=np.float32)
+                matrix[row, buckets] = 1 + np.log(values)
+        return matrix
+
+
+class SentenceTransformerVectorizer:
+    """Dense embeddings from a local sentence-transformers model on CPU."""
+
+    uses_idf = False
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = re.sub(r"[^\w.-]", "_", model_name)
+
+    def embed(self, texts):
+        return self.model.encode(
+            texts,
+            batch_size=32,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        ).astype(np.float32)
+
+
+def default_vectorizer():
+    if RETRIEVAL_MODEL:
+        try:
+            return SentenceTransformerVectorizer(RETRIEVAL_MODEL)
+        except ImportError:
+            print("sentence-transformers not installed, using hashed TF-IDF")
+    return HashingVectorizer()
+
+
+class VectorStore:
+    """Chunk embeddings for one repo@SHA, memory-mapped from an `.npy` file."""
+
+    def __init__(self, path: str, vectorizer):
+        self.path = path
+        self.vectorizer = vectorizer
+        self.matrix = np.load(f"{path}.npy", mmap_mode="r")
+        self.idf = np.load(f"{path}.idf.npy") if vectorizer.uses_idf else None
+        with open(f"{path}.json") as f:
+            # [path, blob_sha, start_line, end_line] per matrix row
+            self.chunks = json.load(f)
+
+    def search(self, text: str, k=RETRIEVAL_TOP_K):
+        """Top-`k` chunks by cosine similarity to `text`."""
+        if not len(self.chunks):
+            return []
+        query = self.vectorizer.embed([text])[0]
+        if self.idf is not None:
+            query = query * self.idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = self.matrix @ (query / norm)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {
+                "path": self.chunks[i][0],
+                "start_line": self.chunks[i][2],
+                "end_line": self.chunks[i][3],
+                "score": round(float(scores[i]), 4),
+            }
+            for i in top
+            if scores[i] > 0
+        ]
+
+
+class Retriever:
+    """Embeds a repository's indexed chunks and ranks them against issue text.
+
+    Vectors are built from a `RepoIndex` the first time a repo@SHA is searched
+    and stored next to the index as a memory-mapped NumPy matrix, so later
+    analyses of the same commit only pay for the query embedding. Dense model
+    embeddings of chunks whose file didn't change are copied from the previous
+    commit's matrix instead of being recomputed.
+
+    Example usage:
+    ```index = repo_indexes.sync(owner, repo, head_sha)
+    candidates = retriever.search(index, issue_title + "\\n" + issue_body)
+    ```
+    """
+
+    def __init__(self, vectorizer=None, max_open=8):
+        self.vectorizer = vectorizer
+        self.max_open = max_open
+        self._lock = threading.Lock()
+        self._build_locks: dict[str, threading.Lock] = {}
+        self._stores = OrderedDict()
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.searches = 0
+
+    def search(self, index, text: str, k=RETRIEVAL_TOP_K):
+        """Top-`k` chunks of `index` for `text`, each with its code."""
+        store = self.store(index)
+        results = store.search(text, k)
+        for result in results:
+            try:
+                result["code"] = index.read_lines(
+                    result["path"],
+                    result["start_line"],
+                    min(
+                        result["end_line"],
+                        result["start_line"] + RETRIEVAL_SNIPPET_LINES - 1,
+                    ),
+                    numbered=False,
+                )
+            except (OSError, ValueError):
+                result["code"] = ""
+        with self._lock:
+            self.searches += 1
+        return results
+
+    def store(self, index):
+        sha = index.head_sha
+        if sha is None:
+            raise ValueError(f"{index.full_name} has not been indexed")
+        with self._lock:
+            if self.vectorizer is None:
+                self.vectorizer = default_vectorizer()
+        path = os.path.join(index.vectors_dir, f"{sha}-{self.vectorizer.name}")
+        with self._lock:
+            store = self._stores.get(path)
+            if store is not None:
+                self._stores.move_to_end(path)
+                return store
+            build_lock = self._build_locks.setdefault(path, threading.Lock())
+        with build_lock:
+            if not os.path.exists(f"{path}.json"):
+                self._build(index, path)
+            store = VectorStore(path, self.vectorizer)
+        with self._lock:
+            self._stores[path] = store
+            while len(self._stores) > self.max_open:
+                self._stores.popitem(last=False)
+            self._build_locks.pop(path, None)
+        return store
+
+    def stats(self):
+        with self._lock:
+            return {
+                "vectorizer": self.vectorizer.name if self.vectorizer else None,
+                "open_stores": len(self._stores),
+                "builds": self.builds,
+                "avg_build_seconds": round(self.build_seconds / self.builds, 3)
+                if self.builds
+                else 0.0,
+                "searches": self.searches,
+            }
+
+    def _build(self, index, path):
+        start = time.monotonic()
+        vectorizer = self.vectorizer
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        reusable = {} if vectorizer.uses_idf else self._previous_rows(path)
+
+        total = index.stats()["chunks"]
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        matrix = np.lib.format.open_memmap(
+            f"{tmp}.npy", mode="w+", dtype=np.float32, shape=(total, vectorizer.dim)
+        )
+        document_frequency = np.zeros(vectorizer.dim, dtype=np.float64)
+        chunks = []
+        batch, batch_rows = [], []
+
+        def flush():
+            vectors = vectorizer.embed(batch)
+            matrix[batch_rows[0] : batch_rows[-1] + 1] = vectors
+            if vectorizer.uses_idf:
+                document_frequency[:] += (vectors > 0).sum(axis=0)
+            batch.clear()
+            batch_rows.clear()
+
+        for row, (chunk_path, blob_sha, start_line, content) in enumerate(
+            index.iter_chunks()
+        ):
+            if row >= total:
+                break  # The index changed underneath us; keep what was counted
+            chunks.append(
+                [chunk_path, blob_sha, start_line, start_line + content.count("\n")]
+            )
+            previous = reusable.get((chunk_path, blob_sha, start_line))
+            if previous is not None:
+                matrix[row] = previous
+                continue
+            if batch_rows and batch_rows[-1] != row - 1:
+                flush()  # Keep batches contiguous around reused rows
+            # The path carries signal too, e.g. "auth/oauth.py" for a login issue
+            batch.append(f"{chunk_path}\n{content}")
+            batch_rows.append(row)
+            if len(batch) >= RETRIEVAL_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+
+        if vectorizer.uses_idf:
+            idf = np.log((1 + len(chunks)) / (1 + document_frequency)) + 1
+            np.save(f"{tmp}.idf.npy", idf.astype(np.float32))
+            for offset in range(0, len(chunks), RETRIEVAL_BATCH_SIZE):
+                rows = matrix[offset : offset + RETRIEVAL_BATCH_SIZE] * idf
+                norms = np.linalg.norm(rows, axis=1, keepdims=True)
+                matrix[offset : offset + RETRIEVAL_BATCH_SIZE] = rows / np.maximum(
+                    norms, 1e-12
+                )
+            os.replace(f"{tmp}.idf.npy", f"{path}.idf.npy")
+        matrix.flush()
+        del matrix
+        if len(chunks) < total:
+            np.save(f"{tmp}.npy", np.load(f"{tmp}.npy")[: len(chunks)])
+        os.replace(f"{tmp}.npy", f"{path}.npy")
+        # The metadata file marks the store complete, so it is written last
+        with open(f"{tmp}.json", "w") as f:
+            json.dump(chunks, f)
+        os.replace(f"{tmp}.json", f"{path}.json")
+        self._prune(path)
+
+        seconds = time.monotonic() - start
+        with self._lock:
+            self.builds += 1
+            self.build_seconds += seconds
+        print(
+            f"Embedded {len(chunks)} chunks of {index.full_name} with "
+            f"{vectorizer.name} in {seconds:.2f}s ({len(reusable)} reusable)"
+        )
+
+    def _stores_for(self, path):
+        """Completed stores for the same repo and vectorizer, newest first."""
+        directory, name = os.path.split(path)
+        suffix = name.split("-", 1)[1] + ".json"
+        paths = [
+            os.path.join(directory, entry[: -len(".json")])
+            for entry in os.listdir(directory)
+            if entry.endswith(suffix) and ".tmp" not in entry
+        ]
+        return sorted(paths, key=lambda p: os.path.getmtime(f"{p}.json"), reverse=True)
+
+    def _previous_rows(self, path):
+        previous = [p for p in self._stores_for(path) if p != path]
+        if not previous:
+            return {}
+        store = VectorStore(previous[0], self.vectorizer)
+        return {
+            (chunk_path, blob_sha, start_line): store.matrix[row]
+            for row, (chunk_path, blob_sha, start_line, _) in enumerate(store.chunks)
+        }
+
+    def _prune(self, path):
+        for old in self._stores_for(path)[RETRIEVAL_KEEP_SHAS:]:
+            for suffix in (".json", ".npy", ".idf.npy"):
+                try:
+                    os.remove(f"{old}{suffix}")
+                except FileNotFoundError:
+                    pass
+            with self._lock:
+                self._stores.pop(old, None)
+
+
+retriever = Retriever()
+
+
+def candidate_notes(candidates):
+    """Render retrieved chunks for the shared `analysis_session` block."""
+    notes = ["## Candidate code (retrieved by similarity to the issue)"]
+    for candidate in candidates:
+        notes += [
+            f"### {candidate['path']}:{candidate['start_line']}-"
+            f"{candidate['end_line']} (score {candidate['score']})",
+            candidate["code"],
+        ]
+    return "\n".join(notes)
+
+
+def issue_query(issue: dict):
+    """Retrieval query for an issue: its title, labels and body."""
+    labels = " ".join(
+        label["name"] if isinstance(label, dict) else label
+        for label in issue.get("labels", [])
+    )
+    return f"{issue.get('title', '')}\n{labels}\n{issue.get('body') or ''}"
+
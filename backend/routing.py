@@ -0,0 +1,213 @@
+import json
+import os
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, fields, replace
+
+from metrics import Histogram
+
+# "supervisor": one worker investigates and the supervisor writes the JSON.
+# "sectioned": one worker per schema section, run concurrently and merged.
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "supervisor")
+ANALYSIS_SECTION_WORKERS = int(os.getenv("ANALYSIS_SECTION_WORKERS", "4"))
+# Optional JSON file overriding route fields, e.g. {"light": {"worker_model": ...}}
+MODEL_ROUTES_FILE = os.getenv("MODEL_ROUTES_FILE")
+
+SONNET = "anthropic/claude-sonnet-4-20250514"
+GEMINI_FLASH = "gemini-key/gemini-2.5-flash-preview-05-20"
+
+# USD per million input/output tokens, used to estimate what each route costs
+MODEL_PRICES = {
+    SONNET: (3.0, 15.0),
+    GEMINI_FLASH: (0.15, 0.6),
+}
+
+# Issues labelled like this rarely need deep investigation, or always do
+LIGHT_LABELS = {"good first issue", "documentation", "docs", "typo", "chore"}
+HEAVY_LABELS = {"performance", "security", "refactor", "architecture", "regression"}
+# Indexed file counts and issue lengths (title + body) separating the tiers;
+# GitHub's repository sizes stand in for file counts until a repo is indexed
+SMALL_REPO_FILES = 300
+LARGE_REPO_FILES = 5000
+SMALL_REPO_KB = 5_000
+LARGE_REPO_KB = 200_000
+SHORT_ISSUE_CHARS = 1500
+LONG_ISSUE_CHARS = 6000
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    supervisor_model: str
+    worker_model: str
+    # None keeps the model's default context window
+    supervisor_context_window: int | None
+    worker_context_window: int | None
+    mode: str = ANALYSIS_MODE
+    section_workers: int = ANALYSIS_SECTION_WORKERS
+
+
+ROUTES = {
+    # Small repo, short or trivially labelled issue: no strong model needed
+    "light": Route("light", GEMINI_FLASH, GEMINI_FLASH, 16000, 16000, "supervisor"),
+    "standard": Route("standard", SONNET, GEMINI_FLASH, 32000, None),
+    # Large repo, long issue or labels that call for a careful look
+    "heavy": Route("heavy", SONNET, GEMINI_FLASH, 64000, None),
+}
+DEFAULT_ROUTE = "standard"
+
+
+def load_routes(path=MODEL_ROUTES_FILE):
+    if not path:
+        return ROUTES
+    with open(path) as f:
+        overrides = json.load(f)
+    known = {field.name for field in fields(Route)} - {"name"}
+    routes = dict(ROUTES)
+    for name, values in overrides.items():
+        unknown = set(values) - known
+        if unknown:
+            raise ValueError(f"Unknown fields for route {name}: {sorted(unknown)}")
+        if name in routes:
+            routes[name] = replace(routes[name], **values)
+        else:
+            routes[name] = Route(name=name, **values)
+    return routes
+
+
+@dataclass(frozen=True)
+class AnalysisProfile:
+    """What's known about an analysis before any model runs."""
+
+    issue_chars: int = 0
+    labels: frozenset = frozenset()
+    # Files in the local index of the repository, when it has been indexed
+    repo_files: int | None = None
+    # GitHub's size of the repository in KB, when the prefetch got it
+    repo_kb: int | None = None
+
+    @classmethod
+    def from_context(cls, context=None, index=None):
+        profile = cls()
+        if context is not None:
+            issue = context.issue
+            labels = [
+                label["name"] if isinstance(label, dict) else label
+                for label in issue.get("labels", [])
+            ]
+            profile = cls(
+                issue_chars=len(issue.get("title") or "")
+                + len(issue.get("body") or ""),
+                labels=frozenset(label.lower() for label in labels),
+                repo_kb=context.repo_size_kb,
+            )
+        if index is not None:
+            profile = replace(profile, repo_files=index.stats()["files"])
+        return profile
+
+
+def classify(profile: AnalysisProfile):
+    """Name of the route for an analysis; unknown sizes get the default route."""
+    if profile.repo_files is not None:
+        large_repo = profile.repo_files > LARGE_REPO_FILES
+        small_repo = profile.repo_files <= SMALL_REPO_FILES
+    else:
+        large_repo = (profile.repo_kb or 0) > LARGE_REPO_KB
+        small_repo = (profile.repo_kb or LARGE_REPO_KB) <= SMALL_REPO_KB
+    if (
+        profile.labels & HEAVY_LABELS
+        or profile.issue_chars > LONG_ISSUE_CHARS
+        or large_repo
+    ):
+        return "heavy"
+    short_issue = 0 < profile.issue_chars <= SHORT_ISSUE_CHARS
+    if short_issue and (small_repo or profile.labels & LIGHT_LABELS):
+        return "light"
+    return DEFAULT_ROUTE
+
+
+def _stage_model(route: Route, stage: str):
+    if stage == "supervisor":
+        return route.supervisor_model
+    if stage == "worker" or stage.startswith("section:"):
+        return route.worker_model
+    # Other stages estimate context already counted in the agents' prompts
+    return None
+
+
+def usage_cost(route: Route, usage: dict):
+    """Estimated USD cost of an analysis' token usage on `route`."""
+    cost = 0.0
+    for stage, counts in usage.items():
+        model = _stage_model(route, stage)
+        if model is None:
+            continue
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        cost += (counts.get("prompt_tokens") or 0) * prompt_price / 1e6
+        cost += (counts.get("completion_tokens") or 0) * completion_price / 1e6
+    return cost
+
+
+ANALYSIS_LATENCY = Histogram(
+    "analysis_duration_seconds",
+    "End-to-end agent analysis latency",
+    ("route", "outcome"),
+    buckets=(10.0, 30.0, 60.0, 120.0, 180.0, 300.0, 600.0, 900.0),
+)
+
+
+class RouteStats:
+    """Latency, token cost and validation outcomes per route, for tuning the
+    route table from data.
+
+    Outcomes: `ok`, `repaired` (valid after re-asking for some sections),
+    `invalid`, `cancelled` and `error`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = defaultdict(
+            lambda: {
+                "outcomes": defaultdict(int),
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+            }
+        )
+
+    def record(self, route: Route, seconds: float, outcome: str, usage=None):
+        ANALYSIS_LATENCY.observe(seconds, route=route.name, outcome=outcome)
+        usage = usage or {}
+        with self._lock:
+            totals = self._routes[route.name]
+            totals["outcomes"][outcome] += 1
+            for stage, counts in usage.items():
+                if _stage_model(route, stage) is not None:
+                    totals["prompt_tokens"] += counts.get("prompt_tokens") or 0
+                    totals["completion_tokens"] += counts.get("completion_tokens") or 0
+            totals["cost_usd"] += usage_cost(route, usage)
+
+    def stats(self):
+        latency = ANALYSIS_LATENCY.summary()
+        with self._lock:
+            routes = {}
+            for name, totals in self._routes.items():
+                outcomes = dict(totals["outcomes"])
+                analyses = sum(outcomes.values())
+                valid = outcomes.get("ok", 0) + outcomes.get("repaired", 0)
+                routes[name] = {
+                    "analyses": analyses,
+                    "outcomes": outcomes,
+                    "validation_success_rate": round(
+                        valid / (valid + outcomes.get("invalid", 0)), 3
+                    )
+                    if valid + outcomes.get("invalid", 0)
+                    else 0.0,
+                    "prompt_tokens": totals["prompt_tokens"],
+                    "completion_tokens": totals["completion_tokens"],
+                    "avg_cost_usd": round(totals["cost_usd"] / analyses, 4),
+                }
+        return {"routes": routes, "latency": latency}
+
+
+route_stats = RouteStats()
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from collections import deque
+
+TERMINAL_STATUSES = {"completed", "failed", "cancelled", "expired"}
+
+
+class RunTimeoutError(TimeoutError):
+    """Raised when a Letta run doesn't finish before the waiter's deadline."""
+
+
+class RunWaiter:
+    """Waits for Letta runs to reach a terminal status.
+
+    Polls `runs.retrieve` with exponential backoff and jitter, starting at
+    `initial_interval` so short runs are noticed quickly and long runs aren't
+    polled needlessly often. When Letta is configured to call back on
+    completion, `notify()` wakes the waiting thread immediately. Any status
+    outside `TERMINAL_STATUSES` counts as in progress, and every wait is bounded
+    by `deadline` seconds.
+
+    Example usage:
+    ```run = run_waiter.wait(letta_client, run.id, on_poll=print)```
+    """
+
+    def __init__(
+        self,
+        initial_interval=0.5,
+        max_interval=8.0,
+        multiplier=1.5,
+        jitter=0.2,
+        deadline=900.0,
+        history=100,
+    ):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+        self._lock = threading.Lock()
+        self._wakeups: dict[str, threading.Event] = {}
+        self._history = deque(maxlen=history)
+        self._runs = 0
+        self._timeouts = 0
+        self._callbacks = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def notify(self, run_id: str):
+        """Wake the thread waiting on `run_id`, e.g. from a Letta completion callback."""
+        with self._lock:
+            event = self._wakeups.get(run_id)
+            if event is not None:
+                self._callbacks += 1
+        if event is not None:
+            event.set()
+        return event is not None
+
+    def wait(self, letta_client, run_id: str, on_poll=None, deadline=None):
+        """Block until the run is terminal and return it.
+
+        `on_poll(run)` runs after every non-terminal poll and may raise to stop
+        waiting, e.g. when the caller cancelled the analysis.
+        """
+        deadline = self.deadline if deadline is None else deadline
+        wakeup = threading.Event()
+        with self._lock:
+            self._wakeups[run_id] = wakeup
+
+        start = time.monotonic()
+        interval = self.initial_interval
+        polls = 0
+        try:
+            while True:
+                run = letta_client.runs.retrieve(run_id)
+                polls += 1
+                if run.status in TERMINAL_STATUSES:
+                    return run
+                if on_poll is not None:
+                    on_poll(run)
+
+                remaining = start + deadline - time.monotonic()
+                if remaining <= 0:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise RunTimeoutError(
+                        f"Run {run_id} still {run.status} after {deadline:g}s"
+                    )
+                sleep = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+                if wakeup.wait(min(sleep, remaining)):
+                    wakeup.clear()
+                    continue  # Completion callback arrived; check right away
+                interval = min(interval * self.multiplier, self.max_interval)
+        finally:
+            waited = time.monotonic() - start
+            with self._lock:
+                self._wakeups.pop(run_id, None)
+                self._runs += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                self._history.append(
+                    {"run_id": run_id, "wait_seconds": round(waited, 3), "polls": polls}
+                )
+
+    def stats(self):
+        with self._lock:
+            return {
+                "runs": self._runs,
+                "waiting": len(self._wakeups),
+                "timeouts": self._timeouts,
+                "callbacks": self._callbacks,
+                "avg_wait_seconds": round(self._wait_total / self._runs, 3)
+                if self._runs
+                else 0.0,
+                "max_wait_seconds": round(self._wait_max, 3),
+                "recent": list(self._history)[-10:],
+            }
@@ -1,13 +1,29 @@
 from typing import List, Dict, Optional
 
 from pydantic import BaseModel, Field
+from pydantic.json_schema import SkipJsonSchema
+
+
+class CodeRef(BaseModel):
+    """Where a key section's code lives, so clients can fetch it on demand."""
+
+    repo: str = Field(description="Repository as owner/name")
+    sha: str = Field(description="Commit the lines were read at")
+    path: str = Field(description="File path relative to the repository root")
+    line_start: int = Field(description="First line of the slice")
+    line_end: int = Field(description="Last line of the slice")
+    hash: str = Field(description="SHA-256 of the slice's text")
 
 
 class KeySection(BaseModel):
     line_start: int = Field(description="Starting line number")
     line_end: int = Field(description="Ending line number")
-    code: str = Field(description="Code content from specified lines")
+    code: str = Field(default="", description="Code content from specified lines")
     explanation: str = Field(description="Why these lines are relevant to the issue")
+    # Set by the server from the repository, never by the model
+    ref: SkipJsonSchema[Optional[CodeRef]] = Field(
+        default=None, description="Source of `code` at the analysed commit"
+    )
 
 
 class FileInfo(BaseModel):
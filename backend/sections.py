@@ -0,0 +1,107 @@
+from context_budget import compact_schema
+from schema import GitHubIssueAnalysis
+
+# Sections that depend only on the repository, not the issue, so one analysis
+# can supply them to later analyses of the same repository
+REPO_SECTIONS = ("project_context", "build_and_test")
+
+# What a worker is asked to investigate for each GitHubIssueAnalysis section
+SECTION_TASKS = {
+    "issue_summary": (
+        "Summarize the issue: its title, a brief description of the problem, "
+        "its labels and whether it is open or closed."
+    ),
+    "project_context": (
+        "Explain what the project does, how its architecture fits together and "
+        "what its main directories are for, for someone new to the codebase."
+    ),
+    "relevant_files": (
+        "Find the files and code sections relevant to the issue. Nest files "
+        "under their directories, say why each one matters and quote its key "
+        "sections with exact line numbers."
+    ),
+    "build_and_test": (
+        "Find how to set up, build, test and lint the project, how to start a "
+        "development server and which environment variables it needs."
+    ),
+    "analysis": (
+        "Classify the problem and its complexity, then list the affected "
+        "components, implementation steps, related files, tests needed, risks "
+        "and relevant documentation."
+    ),
+}
+
+
+def section_prompt(name: str, issue_url: str, prefetched=False, candidates=False):
+    """Prompt asking a worker for one section of the analysis as JSON."""
+    annotation = GitHubIssueAnalysis.model_fields[name].annotation
+    prompt = f"""Investigate this GitHub issue: {issue_url}
+
+You are responsible for one section of a larger analysis: `{name}`.
+{SECTION_TASKS[name]}
+Other sections are covered by other workers; don't spend turns on them."""
+    if prefetched:
+        prompt += (
+            "\n\nThe issue details, top-level file tree and build manifests are "
+            "already in your `analysis_session` memory block; use them directly."
+        )
+    if candidates:
+        prompt += (
+            " It also lists candidate code sections ranked by similarity to the "
+            "issue; confirm or rule those out before searching further."
+        )
+    prompt += f"""
+
+Reply with only a JSON object of the form {{"{name}": <value>}}, where <value> matches:
+{compact_schema(annotation)}"""
+    return prompt
+
+
+def _file_paths(files: dict, prefix=""):
+    for name, info in files.items():
+        path = f"{prefix}{name.strip('/')}"
+        if info.files:
+            yield from _file_paths(info.files, f"{path}/")
+        elif info.type == "file":
+            yield path
+
+
+def merge_sections(sections: dict, cross_reference=True):
+    """Combine separately produced sections into one GitHubIssueAnalysis.
+
+    The merge is deterministic: sections are taken as-is, and with
+    `cross_reference` files found relevant that the analysis didn't mention
+    are added to its dependencies, as a synthesis pass would otherwise do.
+    """
+    analysis = GitHubIssueAnalysis.model_validate(sections)
+    if not cross_reference:
+        return analysis
+    mentioned = "\n".join(analysis.analysis.dependencies)
+    for path in _file_paths(analysis.relevant_files):
+        if path not in mentioned:
+            analysis.analysis.dependencies.append(path)
+    return analysis
+
+
+def repair_prompt(errors: dict):
+    """Prompt asking for corrected values of just the sections that failed."""
+    problems = "\n".join(f"- `{name}`: {error}" for name, error in errors.items())
+    fields = GitHubIssueAnalysis.model_fields
+    outlines = "\n\n".join(
+        f"{name}: {compact_schema(fields[name].annotation)}" for name in errors
+    )
+    return f"""These sections of your last reply were missing or invalid:
+{problems}
+
+Reply with only a JSON object holding corrected values for them. Sections not
+listed may be left out; they are kept from your last reply.
+
+{outlines}"""
+
+
+def known_sections_note(known: dict):
+    """Session block section listing sections that are given, not investigated."""
+    lines = ["## Known repository context (from an earlier analysis; take as given)"]
+    for name, value in known.items():
+        lines.append(f"{name}: {value.model_dump_json(exclude_defaults=True)}")
+    return "\n".join(lines)
@@ -0,0 +1,364 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from analysis_cache import CACHE_DIR
+from rate_limits import (
+    RateLimitedError,
+    SharedPriority,
+    current_priority,
+    upstreams,
+)
+from tracing import bind
+
+SINGLEFLIGHT_LEASE_TTL = float(os.getenv("SINGLEFLIGHT_LEASE_TTL", "1800"))
+
+
+class FlightError(RuntimeError):
+    """Re-raised in callers that joined a run which failed in another process."""
+
+
+class FlightCancelled(RuntimeError):
+    """Raised in a caller that stopped waiting for a shared run; the run goes
+    on for the callers still waiting on it."""
+
+
+class _Call:
+    def __init__(self, priority):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        # Waiters' `on_event` callbacks, and what the run reported so far
+        self.listeners = {}
+        self.history = []
+        self._events_lock = threading.Lock()
+        # Every waiter has cancelled, and whether the run saw it and stopped
+        self.abandoned = False
+        self.stopped = False
+        self.priority = SharedPriority(priority)
+
+    def should_cancel(self):
+        if self.abandoned:
+            self.stopped = True
+        return self.abandoned
+
+    def publish(self, event, data=None):
+        with self._events_lock:
+            self.history.append((event, data))
+            for on_event in self.listeners.values():
+                _notify(on_event, event, data)
+
+    def listen(self, waiter, on_event):
+        """Replay what the run reported so far to `on_event`, then follow it."""
+        with self._events_lock:
+            for event, data in self.history:
+                _notify(on_event, event, data)
+            self.listeners[waiter] = on_event
+
+    def unlisten(self, waiter):
+        with self._events_lock:
+            self.listeners.pop(waiter, None)
+
+
+def _notify(on_event, event, data):
+    try:
+        on_event(event, data)
+    except Exception as e:
+        print(f"Error delivering {event} event: {e}")
+
+
+def _dump_error(error):
+    if isinstance(error, RateLimitedError):
+        # Callers answer these with 429 and Retry-After, so keep the details
+        return json.dumps(
+            {
+                "message": str(error),
+                "retry_after": error.retry_after,
+                "upstream": error.upstream,
+            }
+        )
+    return str(error)
+
+
+def _load_error(error_type, error):
+    """The error a run in another process failed with, as far as callers
+    tell errors apart."""
+    if error_type == "ValueError":
+        return ValueError(error)
+    if error_type == "RateLimitedError":
+        return RateLimitedError(**json.loads(error))
+    return FlightError(error)
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls for the same key into one execution.
+
+    Within a process, callers for a key that is already running wait on the
+    first caller's run, which executes on its own thread and reports its
+    events to every caller, replaying earlier ones to late joiners. A caller
+    whose `should_cancel` returns True stops waiting and gets FlightCancelled;
+    the run itself is only cancelled once every caller waiting on it has left.
+    The run's rate-limit priority is its first caller's, raised to interactive
+    when an interactive caller joins, so a batch run doesn't hold back a user
+    waiting on the same issue.
+
+    Across uvicorn workers, leadership is a lease row in a shared SQLite
+    database: the worker that inserts the row runs `fn`, writes the outcome to
+    `flight_results` and drops the lease, while the others poll for that
+    outcome. A lease whose owner process died or whose TTL passed is taken
+    over by the next caller, as is one whose run was cancelled. Callers that
+    join from another worker can't raise the priority of the run they poll.
+
+    Example usage:
+    ```result = flights.do(
+        issue_url,
+        lambda should_cancel, on_event: analyze_gh_issue(
+            issue_url, should_cancel=should_cancel, on_event=on_event
+        ),
+        should_cancel=job_cancelled,
+        on_event=job_events.publish,
+    )
+    ```
+    """
+
+    def __init__(
+        self,
+        path=os.path.join(CACHE_DIR, "singleflight.sqlite3"),
+        lease_ttl=SINGLEFLIGHT_LEASE_TTL,
+        poll_interval=0.5,
+        result_ttl=300.0,
+    ):
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, timeout=30, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS flights (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                host TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS flight_results (
+                key TEXT NOT NULL,
+                finished_at REAL NOT NULL,
+                result TEXT,
+                error_type TEXT,
+                error TEXT
+            )"""
+        )
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(
+        self,
+        key,
+        fn,
+        dumps=lambda value: value,
+        loads=lambda value: value,
+        should_cancel=None,
+        on_event=None,
+    ):
+        """Run `fn(should_cancel, on_event)` once per key across concurrent
+        callers and share its outcome.
+
+        The `should_cancel` passed to `fn` returns True once every caller has
+        cancelled through its own `should_cancel`, and its `on_event` reaches
+        the `on_event` of every caller still waiting. `dumps`/`loads` convert
+        non-None results to and from text so callers in other worker processes
+        can receive them.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                # Joining keeps a run whose callers all left from stopping
+                call.abandoned = False
+                call.priority.join(current_priority())
+                leader = False
+            else:
+                call = self._calls[key] = _Call(current_priority())
+                leader = True
+            call.waiters += 1
+        waiter = object()
+        if on_event is not None:
+            call.listen(waiter, on_event)
+
+        if leader:
+            threading.Thread(
+                target=bind(self._lead),
+                args=(key, call, fn, dumps, loads),
+                name="singleflight",
+                daemon=True,
+            ).start()
+
+        try:
+            self._wait(key, call, should_cancel)
+        finally:
+            call.unlisten(waiter)
+        if call.error is not None:
+            if call.stopped and not (should_cancel and should_cancel()):
+                # The run stopped after everyone left, just before we joined
+                return self.do(key, fn, dumps, loads, should_cancel, on_event)
+            raise call.error
+        return call.result
+
+    def _wait(self, key, call, should_cancel):
+        while not call.done.wait(None if should_cancel is None else 0.5):
+            if should_cancel():
+                with self._lock:
+                    call.waiters -= 1
+                    if not call.waiters and not call.done.is_set():
+                        call.abandoned = True
+                raise FlightCancelled(f"Stopped waiting for {key}")
+
+    def _lead(self, key, call, fn, dumps, loads):
+        try:
+            with upstreams.priority(call.priority):
+                call.result = self._do_shared(key, call, fn, dumps, loads)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            }
+
+    def _do_shared(self, key, call, fn, dumps, loads):
+        joined_at = time.time()
+        while True:
+            if self._try_acquire(key):
+                break
+            # Another worker is running this key; wait for it to finish
+            self.coalesced += 1
+            while self._lease_alive(key):
+                if call.should_cancel():
+                    raise FlightCancelled(f"Stopped waiting for {key}")
+                time.sleep(self.poll_interval)
+            outcome = self._read_result(key, joined_at)
+            if outcome is not None:
+                result, error_type, error = outcome
+                if error is not None:
+                    raise _load_error(error_type, error)
+                return None if result is None else loads(result)
+            # The leader died without recording an outcome; take over
+
+        self.executions += 1
+        try:
+            result = fn(call.should_cancel, call.publish)
+        except Exception as e:
+            if call.stopped:
+                # Cancelled for our callers only; other workers' callers that
+                # joined take the run over
+                self._release(key)
+            else:
+                self._finish(key, None, type(e).__name__, _dump_error(e))
+            raise
+        except BaseException:
+            self._release(key)
+            raise
+        self._finish(key, None if result is None else dumps(result), None, None)
+        return result
+
+    def _try_acquire(self, key):
+        now = time.time()
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT pid, host, expires_at FROM flights WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._is_dead(*row, now=now):
+                    self._db.execute("COMMIT")
+                    return False
+                self._db.execute(
+                    "INSERT OR REPLACE INTO flights VALUES (?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        self.owner,
+                        os.getpid(),
+                        socket.gethostname(),
+                        now + self.lease_ttl,
+                    ),
+                )
+                self._db.execute(
+                    "DELETE FROM flight_results WHERE finished_at < ?",
+                    (now - self.result_ttl,),
+                )
+                self._db.execute("COMMIT")
+                return True
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _lease_alive(self, key):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT pid, host, expires_at FROM flights WHERE key = ?", (key,)
+            ).fetchone()
+        return row is not None and not self._is_dead(*row, now=time.time())
+
+    @staticmethod
+    def _is_dead(pid, host, expires_at, now):
+        if expires_at < now:
+            return True
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def _read_result(self, key, joined_at):
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT result, error_type, error FROM flight_results "
+                "WHERE key = ? AND finished_at >= ? ORDER BY finished_at DESC LIMIT 1",
+                (key, joined_at),
+            ).fetchone()
+
+    def _finish(self, key, result, error_type, error):
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "INSERT INTO flight_results VALUES (?, ?, ?, ?, ?)",
+                (key, time.time(), result, error_type, error),
+            )
+            self._db.execute(
+                "DELETE FROM flights WHERE key = ? AND owner = ?", (key, self.owner)
+            )
+            self._db.execute("COMMIT")
+
+    def _release(self, key):
+        with self._db_lock:
+            self._db.execute(
+                "DELETE FROM flights WHERE key = ? AND owner = ?", (key, self.owner)
+            )
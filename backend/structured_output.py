@@ -0,0 +1,167 @@
+import json
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from schema import FileInfo, GitHubIssueAnalysis, KeySection
+
+SECTION_ADAPTERS = {
+    name: TypeAdapter(field.annotation)
+    for name, field in GitHubIssueAnalysis.model_fields.items()
+}
+
+FENCE_RE = re.compile(r"```(?:json)?\s*\n(.*?)(?:```|$)", re.DOTALL)
+
+
+def extract_json(text: str):
+    """The JSON object in a reply, from its opening brace on, without any
+    code fence or leading prose."""
+    fenced = FENCE_RE.search(text)
+    if fenced is not None and "{" in fenced.group(1):
+        text = fenced.group(1)
+    start = text.find("{")
+    if start < 0:
+        return None
+    # Anything after the object is dropped by repair_json()
+    return text[start:]
+
+
+def repair_json(text: str):
+    """Fix the defects models commonly leave in JSON: trailing commas, and
+    output cut off mid-string or mid-object. The result may still not parse.
+    """
+    out = []
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+        out.append(char)
+        if not stack and char in "}]":
+            break
+
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    if stack:
+        # Truncated: finish or drop the last incomplete member, then close up
+        tail = "".join(out).rstrip()
+        if tail.endswith(":"):
+            tail += " null"
+        elif stack[-1] == "}" and _ends_with_bare_key(tail):
+            tail = tail[: tail.rfind('"', 0, len(tail) - 1)]
+        out = list(tail)
+        _drop_trailing_comma(out)
+        out.extend(reversed(stack))
+    return "".join(out)
+
+
+def _drop_trailing_comma(out):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+
+def _ends_with_bare_key(text: str):
+    """Whether an object's text ends in a key with no `:` after it yet."""
+    if not text.endswith('"'):
+        return False
+    start = text.rfind('"', 0, len(text) - 1)
+    before = text[:start].rstrip()
+    return before.endswith(("{", ","))
+
+
+def _prune_files(value):
+    """Drop `relevant_files` entries that don't validate, such as a FileInfo
+    cut off deep in its nesting, keeping the rest of the tree."""
+    if not isinstance(value, dict):
+        return {}
+    pruned = {}
+    for name, info in value.items():
+        if not isinstance(info, dict):
+            continue
+        info = dict(info)
+        if isinstance(info.get("files"), dict):
+            info["files"] = _prune_files(info["files"])
+        sections = info.get("key_sections")
+        if isinstance(sections, list):
+            info["key_sections"] = [
+                section for section in sections if _valid(KeySection, section)
+            ]
+        if _valid(FileInfo, info):
+            pruned[name] = info
+    return pruned
+
+
+def _valid(model, value):
+    try:
+        model.model_validate(value)
+        return True
+    except ValidationError:
+        return False
+
+
+def parse_sections(text: str, names=None):
+    """Validate each section of a reply on its own.
+
+    Returns `(sections, errors)`: the sections that validate, and a short
+    validation error for each of `names` (default: all) that doesn't.
+    """
+    names = list(names or SECTION_ADAPTERS)
+    raw = extract_json(text)
+    data = None
+    if raw is not None:
+        for candidate in (raw, repair_json(raw)):
+            try:
+                data = json.loads(candidate)
+                break
+            except json.JSONDecodeError:
+                continue
+    if not isinstance(data, dict):
+        return {}, {name: "reply did not contain a JSON object" for name in names}
+    # A reply for a single section may leave out the wrapping key
+    if len(names) == 1 and names[0] not in data:
+        data = {names[0]: data}
+
+    sections, errors = {}, {}
+    for name in names:
+        if name not in data:
+            errors[name] = "missing"
+            continue
+        value = data[name]
+        if name == "relevant_files":
+            value = _prune_files(value)
+        try:
+            sections[name] = SECTION_ADAPTERS[name].validate_python(value)
+        except ValidationError as e:
+            errors[name] = _short_error(e)
+    return sections, errors
+
+
+def _short_error(error: ValidationError, limit=5):
+    lines = [
+        f"{'.'.join(str(part) for part in item['loc']) or '(root)'}: {item['msg']}"
+        for item in error.errors()[:limit]
+    ]
+    if error.error_count() > limit:
+        lines.append(f"... and {error.error_count() - limit} more")
+    return "; ".join(lines)
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+# The app's modules read their configuration and open their stores at import,
+# so point them at a scratch directory before any test imports them
+os.environ["CACHE_DIR"] = tempfile.mkdtemp(prefix="tests-")
+os.environ["TRACE_FILE"] = ""
+os.environ["OTEL_EXPORTER_OTLP_TRACES_ENDPOINT"] = ""
+os.environ["LETTA_CALLBACK_URL"] = ""
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from code_slices import CodeSliceCache, attach_code_refs, slice_hash, strip_code
+from schema import GitHubIssueAnalysis
+
+SOURCE = "\n".join(f"line {n}" for n in range(1, 21))
+
+
+class FakeCache:
+    """Files served from memory, recording the refs added."""
+
+    def __init__(self, files):
+        self._files = files
+        self.refs = []
+
+    def files(self, repo, sha, paths):
+        return {path: self._files[path] for path in paths if path in self._files}
+
+    def add_refs(self, repo, sha, paths):
+        self.refs.append((repo, sha, sorted(paths)))
+
+
+def _analysis():
+    section = {"explanation": "why", "code": "quoted by the model"}
+    return GitHubIssueAnalysis.model_validate(
+        {
+            "issue_summary": {"title": "T", "description": "D", "status": "open"},
+            "project_context": {
+                "overview": "O",
+                "architecture_overview": "A",
+                "main_directories": {},
+            },
+            "relevant_files": {
+                "src": {
+                    "type": "directory",
+                    "files": {
+                        "app.py": {
+                            "type": "file",
+                            "reason": "r",
+                            "key_sections": [
+                                {**section, "line_start": 3, "line_end": 5},
+                                {**section, "line_start": 90, "line_end": 95},
+                            ],
+                        }
+                    },
+                },
+                "gone.py": {
+                    "type": "file",
+                    "key_sections": [{**section, "line_start": 1, "line_end": 2}],
+                },
+            },
+            "build_and_test": {},
+            "analysis": {"problem_type": "bug", "complexity": "low"},
+        }
+    )
+
+
+def test_attach_code_refs_quotes_the_lines_at_the_commit():
+    analysis = _analysis()
+    cache = FakeCache({"src/app.py": SOURCE})
+
+    assert attach_code_refs(analysis, "o/r", "abc", cache=cache) == 1
+
+    inside, past_end = analysis.relevant_files["src"].files["app.py"].key_sections
+    assert inside.code == "line 3\nline 4\nline 5"
+    assert inside.ref.path == "src/app.py"
+    assert inside.ref.sha == "abc"
+    assert inside.ref.hash == slice_hash(inside.code)
+    # Lines past the end of the file and unreadable files keep the quote
+    assert past_end.ref is None
+    assert past_end.code == "quoted by the model"
+    assert analysis.relevant_files["gone.py"].key_sections[0].ref is None
+    assert cache.refs == [("o/r", "abc", ["src/app.py"])]
+
+
+def test_strip_code_drops_only_referenced_code():
+    analysis = _analysis()
+    attach_code_refs(analysis, "o/r", "abc", cache=FakeCache({"src/app.py": SOURCE}))
+
+    data = strip_code(analysis.model_dump(mode="json"))
+
+    inside, past_end = data["relevant_files"]["src"]["files"]["app.py"]["key_sections"]
+    assert "code" not in inside
+    assert inside["ref"]["line_start"] == 3
+    assert past_end["code"] == "quoted by the model"
+
+
+def test_refs_expire(tmp_path):
+    cache = CodeSliceCache(str(tmp_path / "code_slices.sqlite3"), ref_ttl=0.2)
+    cache.add_refs("o/r", "abc", ["src/app.py"])
+    assert cache.is_referenced("o/r", "abc", "src/app.py")
+    assert not cache.is_referenced("o/r", "abc", "src/other.py")
+    assert not cache.is_referenced("o/r", "def", "src/app.py")
+    time.sleep(0.3)
+    assert not cache.is_referenced("o/r", "abc", "src/app.py")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = CodeSliceCache(str(tmp_path / "code_slices.sqlite3"))
+    reads = []
+
+    def read(repo, sha, paths):
+        reads.append(list(paths))
+        return {path: SOURCE for path in paths if path.endswith(".py")}
+
+    monkeypatch.setattr(cache, "_read", read)
+    cache.reads = reads
+    return cache
+
+
+def test_files_are_read_once_per_commit(cache):
+    assert cache.slice("o/r", "abc", "src/app.py", 2, 3) == "line 2\nline 3"
+    assert cache.slice("o/r", "abc", "src/app.py", 4, 4) == "line 4"
+    assert cache.reads == [["src/app.py"]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_unreadable_files_give_no_slice(cache):
+    assert cache.slice("o/r", "abc", "README.md", 1, 2) is None
@@ -0,0 +1,20 @@
+import pytest
+
+from compression import etag_matches
+
+
+@pytest.mark.parametrize(
+    "if_none_match",
+    ['"abc"', 'W/"abc"', '"old", "abc"', ' "x" ,W/"abc" ', "*"],
+)
+def test_matching_etags(if_none_match):
+    assert etag_matches('"abc"', if_none_match)
+
+
+@pytest.mark.parametrize("if_none_match", [None, "", '"abd"', '"old", "other"'])
+def test_other_etags(if_none_match):
+    assert not etag_matches('"abc"', if_none_match)
+
+
+def test_weak_etag_matches_strong_header():
+    assert etag_matches('W/"abc"', '"abc"')
@@ -0,0 +1,72 @@
+from context_budget import (
+    FINDINGS_HEADING,
+    LEDGER_COMPACT_TO,
+    SessionLedger,
+    TokenUsage,
+)
+
+
+def _findings(value):
+    return [line for line in value.splitlines() if line.startswith("- ")]
+
+
+def test_render_keeps_sections_within_their_share():
+    ledger = SessionLedger(limit=2000)
+    value = ledger.render(
+        "https://github.com/o/r/issues/1",
+        {"issue": "issue line\n" * 500, "repository": "tree line\n" * 500},
+    )
+    assert len(value) <= 2000
+    assert value.count("… (truncated)") == 2
+    assert FINDINGS_HEADING in value
+
+
+def test_compact_leaves_a_block_within_budget_alone():
+    ledger = SessionLedger(limit=2000)
+    value = ledger.render("url", {"issue": "short"}, findings=["- a.py:1-2: x"])
+    assert ledger.compact(value) is None
+
+
+def test_compact_drops_duplicates_then_the_oldest_findings():
+    ledger = SessionLedger(limit=2000)
+    value = ledger.render("url", {"issue": "short"})
+    findings = [f"- src/f{i}.py:1-9: finding number {i}" for i in range(80)]
+    value += "\n" + "\n".join(findings + findings[-5:])
+
+    compacted = ledger.compact(value)
+
+    assert len(compacted) <= 2000 * LEDGER_COMPACT_TO
+    kept = _findings(compacted)
+    assert len(kept) == len(set(kept))
+    assert kept == findings[-len(kept) :]
+    assert compacted.startswith(value.partition(f"\n\n{FINDINGS_HEADING}")[0])
+
+
+def test_compact_never_cuts_a_line_when_the_head_is_oversized():
+    ledger = SessionLedger(limit=1000)
+    head = "GitHub Issue Analysis Session\n" + "context line\n" * 200
+    value = f"{head}\n\n{FINDINGS_HEADING}\n- a.py:1-2: first"
+
+    compacted = ledger.compact(value)
+
+    assert len(compacted) <= 1000
+    assert compacted.endswith(")") or compacted.endswith("first")
+    assert "… (truncated)" in compacted
+
+
+def test_token_usage_averages_over_analyses_that_ran_each_stage():
+    usage = TokenUsage()
+    usage.record({"supervisor": {"prompt_tokens": 100, "completion_tokens": 10}})
+    usage.record(
+        {
+            "supervisor": {"prompt_tokens": 300, "completion_tokens": 30},
+            "worker": {"prompt_tokens": 50, "completion_tokens": 5, "steps": 2},
+        }
+    )
+
+    stats = usage.stats()
+
+    assert stats["analyses"] == 2
+    assert stats["stages"]["supervisor"]["avg_prompt_tokens"] == 200
+    assert stats["stages"]["worker"]["analyses"] == 1
+    assert stats["stages"]["worker"]["avg_prompt_tokens"] == 50
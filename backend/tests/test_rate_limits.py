@@ -0,0 +1,89 @@
+import threading
+import time
+
+import pytest
+
+from rate_limits import (
+    BATCH,
+    INTERACTIVE,
+    RateLimitedError,
+    UpstreamLimiter,
+    is_rate_limit_message,
+)
+
+
+def test_burst_is_granted_without_waiting():
+    limiter = UpstreamLimiter("test", per_minute=60, burst=4)
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire(priority=INTERACTIVE)
+    assert time.monotonic() - started < 0.1
+    assert limiter.granted[INTERACTIVE] == 4
+
+
+def test_batch_leaves_the_reserve_to_interactive_callers():
+    limiter = UpstreamLimiter("test", per_minute=60, burst=4)
+    for _ in range(3):
+        limiter.acquire(priority=BATCH, timeout=0)
+    # The last token is held back for interactive work
+    with pytest.raises(RateLimitedError):
+        limiter.acquire(priority=BATCH, timeout=0)
+    limiter.acquire(priority=INTERACTIVE, timeout=0)
+
+
+def test_interactive_waiter_is_served_before_batch():
+    limiter = UpstreamLimiter("test", per_minute=600, burst=1)
+    limiter.acquire(priority=INTERACTIVE)
+    order = []
+
+    def take(priority):
+        limiter.acquire(priority=priority)
+        order.append(priority)
+
+    batch = threading.Thread(target=take, args=(BATCH,))
+    batch.start()
+    time.sleep(0.02)
+    interactive = threading.Thread(target=take, args=(INTERACTIVE,))
+    interactive.start()
+    batch.join(5)
+    interactive.join(5)
+    assert order == [INTERACTIVE, BATCH]
+
+
+def test_penalize_blocks_until_retry_after():
+    limiter = UpstreamLimiter("test", per_minute=6000, burst=10)
+    assert limiter.penalize(retry_after=30) == 30
+    with pytest.raises(RateLimitedError) as raised:
+        limiter.acquire(priority=INTERACTIVE, timeout=1)
+    assert raised.value.retry_after > 25
+    assert limiter.admission_delay(INTERACTIVE) > 25
+
+
+def test_charge_delays_later_callers():
+    limiter = UpstreamLimiter("test", per_minute=60, burst=2)
+    limiter.charge(4)
+    assert limiter.admission_delay(INTERACTIVE) > 1
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Error code: 429 - {'error': 'too many'}",
+        "HTTP/1.1 429",
+        {"error": {"status_code": 429}},
+        "Rate limit exceeded",
+        "rate_limit_error",
+        "RESOURCE_EXHAUSTED",
+        "429 Too Many Requests",
+    ],
+)
+def test_rate_limit_messages(text):
+    assert is_rate_limit_message(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["src/app.py:429: def foo():", "commit 4297abc", "line 429 of 1000", "#429"],
+)
+def test_numbers_that_merely_contain_429(text):
+    assert not is_rate_limit_message(text)
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_synthetic_session_replays_through_the_api(tmp_path):
+    """Drive the app against the built-in recorded session, as bench.py does,
+    in its own process since the bench configures the app at import."""
+    out = tmp_path / "report.json"
+    env = {**os.environ, "ANALYSIS_MODE": ""}
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "bench.py",
+            "run",
+            "--requests",
+            "2",
+            "--concurrency",
+            "2",
+            "--scale",
+            "0.02",
+            "--out",
+            str(out),
+        ],
+        cwd=BACKEND,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+
+    report = json.loads(out.read_text())
+    assert report["statuses"] == {"200": 2}
+    assert report["letta_calls"]["agents.messages.create_async"] >= 1
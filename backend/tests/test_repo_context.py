@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+import pytest
+
+from repo_context import RepoContextStore
+from schema import BuildAndTest, ProjectContext
+
+
+def _context(manifest="[project]\nname = 'app'\n"):
+    return SimpleNamespace(
+        tree=[{"name": "src", "type": "dir"}, {"name": "pyproject.toml"}],
+        manifests={"pyproject.toml": manifest},
+    )
+
+
+SECTIONS = {
+    "project_context": ProjectContext(
+        overview="An app", architecture_overview="One package", main_directories={}
+    ),
+    "build_and_test": BuildAndTest(test_commands=["pytest"]),
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RepoContextStore(str(tmp_path / "repo_context.sqlite3"))
+
+
+def test_sections_are_served_at_the_same_commit(store):
+    store.put("o/r", "sha1", _context(), SECTIONS)
+    known = store.get("o/r", "sha1", _context())
+    assert known == SECTIONS
+    assert store.stats()["hits"] == 1
+
+
+def test_sections_carry_over_to_a_commit_with_the_same_structure(store):
+    store.put("o/r", "sha1", _context(), SECTIONS)
+
+    known = store.get("o/r", "sha2", _context())
+
+    assert known["build_and_test"].test_commands == ["pytest"]
+    assert store.stats()["carried_over"] == 1
+    # The new commit is stored, so its next lookup is a plain hit
+    assert store.latest("o/r")["head_sha"] == "sha2"
+    store.get("o/r", "sha2", _context())
+    assert store.stats()["hits"] == 1
+
+
+def test_changed_manifests_invalidate_the_sections(store):
+    store.put("o/r", "sha1", _context(), SECTIONS)
+    changed = _context("[project]\nname = 'app'\ndependencies = ['x']\n")
+    assert store.get("o/r", "sha2", changed) == {}
+    assert store.stats()["misses"] == 1
+
+
+def test_other_repositories_are_not_served(store):
+    store.put("o/r", "sha1", _context(), SECTIONS)
+    assert store.get("o/other", "sha1", _context()) == {}
@@ -0,0 +1,137 @@
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from rate_limits import (
+    BATCH,
+    INTERACTIVE,
+    RateLimitedError,
+    current_priority,
+    upstreams,
+)
+from singleflight import FlightCancelled, SingleFlight
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "singleflight.sqlite3")
+
+
+def _in_thread(fn):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = fn()
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def _slow(result, seconds=0.5, calls=None):
+    def fn(should_cancel, on_event):
+        if calls is not None:
+            calls.append(1)
+        time.sleep(seconds)
+        return result
+
+    return fn
+
+
+def test_concurrent_callers_share_one_run(path):
+    flights = SingleFlight(path)
+    calls = []
+    thread, first = _in_thread(lambda: flights.do("k", _slow("done", calls=calls)))
+    time.sleep(0.1)
+    assert flights.do("k", _slow("other", calls=calls)) == "done"
+    thread.join()
+    assert first["result"] == "done"
+    assert len(calls) == 1
+    assert flights.stats()["coalesced"] == 1
+
+
+def test_other_worker_waits_on_the_lease(path):
+    # Two instances on one database stand in for two uvicorn workers
+    leader, follower = SingleFlight(path), SingleFlight(path, poll_interval=0.05)
+    calls = []
+    thread, _ = _in_thread(lambda: leader.do("k", _slow("done", calls=calls)))
+    time.sleep(0.1)
+    assert follower.do("k", _slow("other", calls=calls)) == "done"
+    thread.join()
+    assert len(calls) == 1
+    assert follower.executions == 0
+
+
+def test_rate_limits_reach_other_workers_intact(path):
+    leader, follower = SingleFlight(path), SingleFlight(path, poll_interval=0.05)
+
+    def limited(should_cancel, on_event):
+        time.sleep(0.3)
+        raise RateLimitedError("slow down", retry_after=12.5, upstream="github")
+
+    thread, _ = _in_thread(lambda: leader.do("k", limited))
+    time.sleep(0.1)
+    with pytest.raises(RateLimitedError) as raised:
+        follower.do("k", _slow("other"))
+    thread.join()
+    assert raised.value.retry_after == 12.5
+    assert raised.value.upstream == "github"
+
+
+def test_lease_of_a_dead_process_is_taken_over(path):
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    flights = SingleFlight(path)
+    flights._db.execute(
+        "INSERT INTO flights VALUES (?, ?, ?, ?, ?)",
+        ("k", "gone", dead.pid, socket.gethostname(), time.time() + 60),
+    )
+    assert flights.do("k", _slow("mine", seconds=0)) == "mine"
+    assert flights.executions == 1
+
+
+def test_expired_lease_is_taken_over(path):
+    flights = SingleFlight(path)
+    flights._db.execute(
+        "INSERT INTO flights VALUES (?, ?, ?, ?, ?)",
+        ("k", "stuck", 1, "elsewhere", time.time() - 1),
+    )
+    assert flights.do("k", _slow("mine", seconds=0)) == "mine"
+
+
+def test_cancelled_caller_leaves_the_run_to_others(path):
+    flights = SingleFlight(path)
+    thread, first = _in_thread(lambda: flights.do("k", _slow("done", seconds=1.0)))
+    time.sleep(0.1)
+    with pytest.raises(FlightCancelled):
+        flights.do("k", _slow("other"), should_cancel=lambda: True)
+    thread.join()
+    assert first["result"] == "done"
+
+
+def test_interactive_caller_promotes_a_batch_run(path):
+    flights = SingleFlight(path)
+    seen = []
+
+    def fn(should_cancel, on_event):
+        for _ in range(6):
+            seen.append(current_priority())
+            time.sleep(0.1)
+
+    def batch():
+        with upstreams.priority(BATCH):
+            flights.do("k", fn)
+
+    thread, _ = _in_thread(batch)
+    time.sleep(0.25)
+    flights.do("k", fn)
+    thread.join()
+    assert seen[0] == BATCH
+    assert seen[-1] == INTERACTIVE
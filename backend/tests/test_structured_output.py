@@ -0,0 +1,46 @@
+import json
+
+from structured_output import extract_json, parse_sections, repair_json
+
+
+def test_repair_json_leaves_valid_json_alone():
+    text = '{"a": [1, 2], "b": {"c": "d"}}'
+    assert repair_json(text) == text
+
+
+def test_repair_json_drops_trailing_commas():
+    assert json.loads(repair_json('{"a": [1, 2,], "b": 3,}')) == {"a": [1, 2], "b": 3}
+
+
+def test_repair_json_closes_truncated_string_and_containers():
+    assert json.loads(repair_json('{"a": {"b": ["x", "unfinish')) == {
+        "a": {"b": ["x", "unfinish"]}
+    }
+
+
+def test_repair_json_completes_a_key_without_value():
+    assert json.loads(repair_json('{"a": 1, "b":')) == {"a": 1, "b": None}
+
+
+def test_repair_json_drops_a_bare_key():
+    assert json.loads(repair_json('{"a": 1, "b"')) == {"a": 1}
+
+
+def test_repair_json_keeps_escaped_quotes():
+    assert json.loads(repair_json('{"a": "say \\"hi\\"')) == {"a": 'say "hi"'}
+
+
+def test_repair_json_drops_text_after_the_object():
+    assert json.loads(repair_json('{"a": 1} and that is all')) == {"a": 1}
+
+
+def test_extract_json_takes_fenced_block():
+    reply = 'Here you go:\n```json\n{"a": 1}\n```\nDone.'
+    assert json.loads(repair_json(extract_json(reply))) == {"a": 1}
+
+
+def test_parse_sections_repairs_a_truncated_reply():
+    reply = '{"issue_summary": {"title": "T", "description": "D", "status": "open"'
+    sections, errors = parse_sections(reply, ["issue_summary", "analysis"])
+    assert sections["issue_summary"].title == "T"
+    assert errors == {"analysis": "missing"}
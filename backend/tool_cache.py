@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from mcp.types import CallToolResult
+
+from analysis_cache import CACHE_DIR
+
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+TOOL_CACHE_MUTABLE_TTL = float(os.getenv("TOOL_CACHE_MUTABLE_TTL", "60"))
+TOOL_CACHE_SEARCH_TTL = float(os.getenv("TOOL_CACHE_SEARCH_TTL", "300"))
+
+SHA_RE = re.compile(r"^[0-9a-f]{40}$")
+
+# Read-only GitHub tools (see GH_TOOL_PREFIXES in agent.py) and how long their
+# results stay valid. Anything not listed is never cached.
+TOOL_TTLS = {
+    "get_commit": TOOL_CACHE_MUTABLE_TTL,
+    "get_file_contents": TOOL_CACHE_MUTABLE_TTL,
+    "get_issue": TOOL_CACHE_MUTABLE_TTL,
+    "get_pull_request": TOOL_CACHE_MUTABLE_TTL,
+    "list_commits": TOOL_CACHE_SEARCH_TTL,
+    "list_issues": TOOL_CACHE_SEARCH_TTL,
+    "list_pull_requests": TOOL_CACHE_SEARCH_TTL,
+    "search_code": TOOL_CACHE_SEARCH_TTL,
+    "search_issues": TOOL_CACHE_SEARCH_TTL,
+    "search_repositories": TOOL_CACHE_SEARCH_TTL,
+}
+
+# Tools whose result can't change once pinned to a commit SHA
+PINNABLE_TOOLS = {"get_commit", "get_file_contents"}
+
+
+def cache_policy(tool: str, args: dict | None):
+    """`(cacheable, ttl)` for a call; a ttl of None means the result never expires."""
+    if tool not in TOOL_TTLS:
+        return False, None
+    args = args or {}
+    if tool in PINNABLE_TOOLS and any(
+        SHA_RE.match(str(args.get(name, ""))) for name in ("sha", "ref")
+    ):
+        return True, None
+    return True, TOOL_TTLS[tool]
+
+
+def cache_key(tool: str, args: dict | None):
+    """Address of a call's result: the tool and its canonicalized arguments.
+
+    Owner and repo names are case-insensitive on GitHub, so `github.com/Foo/Bar`
+    and `github.com/foo/bar` share entries.
+    """
+    args = dict(args or {})
+    for name in ("owner", "repo"):
+        if isinstance(args.get(name), str):
+            args[name] = args[name].lower()
+    canonical = json.dumps({"tool": tool, "args": args}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ToolResultCache:
+    """Read-through cache of MCP `CallToolResult`s on local disk.
+
+    File contents and commits fetched at a specific SHA are immutable and are
+    kept until evicted; other read calls expire after a short per-tool TTL.
+    Entries are evicted least-recently-used first once their total size
+    exceeds `max_bytes`. Failed tool results are never stored.
+
+    Example usage:
+    ```cached = tool_cache.get("get_file_contents", args)
+    if cached is None:
+        cached = await session.call_tool("get_file_contents", args)
+        tool_cache.put("get_file_contents", args, cached)
+    ```
+    """
+
+    def __init__(
+        self,
+        path=os.path.join(CACHE_DIR, "tool_cache.sqlite3"),
+        max_bytes=TOOL_CACHE_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS tool_results (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload TEXT NOT NULL
+            )"""
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS tool_results_last_access "
+            "ON tool_results (last_access)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+
+        # tool -> [hits, misses]
+        self._lookups = defaultdict(lambda: [0, 0])
+        self.stale = 0
+        self.evicted = 0
+
+    def get(self, tool: str, args: dict | None):
+        cacheable, _ = cache_policy(tool, args)
+        if not cacheable:
+            return None
+        key = cache_key(tool, args)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT expires_at, payload FROM tool_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[0] is not None and row[0] <= now:
+                self._db.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+                self._db.commit()
+                self.stale += 1
+                row = None
+            if row is None:
+                self._lookups[tool][1] += 1
+                return None
+            self._db.execute(
+                "UPDATE tool_results SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._db.commit()
+            self._lookups[tool][0] += 1
+        return CallToolResult.model_validate_json(row[1])
+
+    def put(self, tool: str, args: dict | None, result: CallToolResult):
+        cacheable, ttl = cache_policy(tool, args)
+        if not cacheable or result.isError:
+            return
+        payload = result.model_dump_json()
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    cache_key(tool, args),
+                    tool,
+                    now,
+                    None if ttl is None else now + ttl,
+                    now,
+                    size,
+                    payload,
+                ),
+            )
+            # Drop the least recently used entries beyond the byte budget
+            evicted = self._db.execute(
+                "DELETE FROM tool_results WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER "
+                "(ORDER BY last_access DESC, key) AS running FROM tool_results) "
+                "WHERE running > ?) RETURNING key",
+                (self.max_bytes,),
+            ).fetchall()
+            self._db.commit()
+            self.evicted += len(evicted)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_results"
+            ).fetchone()
+            lookups = {tool: list(counts) for tool, counts in self._lookups.items()}
+        hits = sum(h for h, _ in lookups.values())
+        misses = sum(m for _, m in lookups.values())
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": misses,
+            "stale": self.stale,
+            "evicted": self.evicted,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "by_tool": {
+                tool: {
+                    "hits": h,
+                    "misses": m,
+                    "hit_rate": round(h / (h + m), 3) if h + m else 0.0,
+                }
+                for tool, (h, m) in lookups.items()
+            },
+        }
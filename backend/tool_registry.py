@@ -0,0 +1,196 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+
+class ToolRegistry:
+    """Resolves the Letta tool IDs for an MCP server once and caches them.
+
+    `refresh()` lists the server's tools, keeps the ones matching `prefixes`
+    and adds them to Letta concurrently. The IDs are served from cache until
+    `ttl` expires, and a background thread re-checks the server's tool list
+    every `poll_interval` seconds so a changed list is picked up without a
+    request paying for it. Only one refresh runs at a time, and callers that
+    find one running keep the cached IDs. After a failed refresh the cached
+    IDs are served for another `retry_interval` seconds before the next
+    attempt. `on_change` callbacks run when the ID set differs from the one
+    served before, including after refreshes that failed. `return_char_limit(name)`, if
+    given, caps how much of each tool's return is put into an agent's context.
+
+    Example usage:
+    ```registry = ToolRegistry(get_letta_client, "github", GH_TOOL_PREFIXES)
+    registry.start()
+    tool_ids = registry.get_tool_ids()
+    ```
+    """
+
+    def __init__(
+        self,
+        get_client,
+        server_name,
+        prefixes=None,
+        ttl=3600.0,
+        poll_interval=300.0,
+        max_workers=8,
+        return_char_limit=None,
+        retry_interval=30.0,
+    ):
+        self._get_client = get_client
+        self.server_name = server_name
+        self.prefixes = prefixes
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.max_workers = max_workers
+        self.return_char_limit = return_char_limit
+        self.retry_interval = retry_interval
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._tool_ids: list[str] = []
+        self._tool_names: tuple[str, ...] = ()
+        self._expires_at = 0.0
+        self._callbacks = []
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def on_change(self, callback):
+        self._callbacks.append(callback)
+
+    def start(self):
+        """Resolve tools now and keep them fresh from a background thread."""
+        self.refresh()
+        if self._thread is None and self.poll_interval > 0:
+            self._thread = threading.Thread(
+                target=self._poll, name=f"tool-registry-{self.server_name}", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def get_tool_ids(self):
+        with self._lock:
+            if time.monotonic() < self._expires_at:
+                return list(self._tool_ids)
+            resolved = self.refreshes > 0
+        # Callers with IDs to fall back on don't wait for another's refresh
+        if self._refresh_lock.acquire(blocking=not resolved):
+            try:
+                with self._lock:
+                    expired = time.monotonic() >= self._expires_at
+                if expired:
+                    self._refresh(None)
+            finally:
+                self._refresh_lock.release()
+        with self._lock:
+            return list(self._tool_ids)
+
+    @property
+    def tool_names(self):
+        """Names of the tools currently registered."""
+        with self._lock:
+            return self._tool_names
+
+    def refresh(self, mcp_tools=None):
+        """Add the server's filtered tools to Letta and cache their IDs."""
+        with self._refresh_lock:
+            return self._refresh(mcp_tools)
+
+    def _refresh(self, mcp_tools):
+        with tracer.span("tools.register", server=self.server_name) as span:
+            tool_ids = self._register(mcp_tools)
+            span.set(tools=len(tool_ids))
+        return tool_ids
+
+    def _register(self, mcp_tools):
+        try:
+            letta_client = self._get_client()
+            if mcp_tools is None:
+                mcp_tools = self._list_filtered(letta_client)
+            names = tuple(sorted(tool.name for tool in mcp_tools))
+
+            # add_mcp_tool is idempotent, so the round-trips can overlap
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                tools = list(
+                    executor.map(lambda name: self._add(letta_client, name), names)
+                )
+        except Exception as e:
+            print(f"Error adding MCP tools from {self.server_name}: {e}")
+            with self._lock:
+                # Back off instead of retrying on every call while MCP or
+                # Letta is down
+                self._expires_at = time.monotonic() + self.retry_interval
+                self.failures += 1
+                return list(self._tool_ids)
+
+        tool_ids = [tool.id for tool in tools]
+        with self._lock:
+            # Agents may have been built with the IDs served so far, even if
+            # they came from no successful refresh at all
+            changed = names != self._tool_names and (self.refreshes or self.failures)
+            self._tool_ids = tool_ids
+            self._tool_names = names
+            self._expires_at = time.monotonic() + self.ttl
+            self.refreshes += 1
+        print(f"Added {len(tool_ids)} tools from {self.server_name}")
+
+        if changed:
+            for callback in self._callbacks:
+                try:
+                    callback(tool_ids)
+                except Exception as e:
+                    print(f"Error in tool registry callback: {e}")
+        return tool_ids
+
+    def _add(self, letta_client, name):
+        tool = letta_client.tools.add_mcp_tool(self.server_name, name)
+        if self.return_char_limit is not None:
+            limit = self.return_char_limit(name)
+            if tool.return_char_limit != limit:
+                tool = letta_client.tools.modify(tool.id, return_char_limit=limit)
+        return tool
+
+    def stats(self):
+        with self._lock:
+            return {
+                "server": self.server_name,
+                "tools": len(self._tool_ids),
+                "refreshes": self.refreshes,
+                "failures": self.failures,
+                "expires_in_seconds": max(
+                    0, round(self._expires_at - time.monotonic())
+                ),
+            }
+
+    def _list_filtered(self, letta_client):
+        mcp_tools = letta_client.tools.list_mcp_tools_by_server(self.server_name)
+        if self.prefixes:
+            mcp_tools = [
+                tool
+                for tool in mcp_tools
+                if any(tool.name.startswith(prefix) for prefix in self.prefixes)
+            ]
+        return mcp_tools
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mcp_tools = self._list_filtered(self._get_client())
+            except Exception as e:
+                print(f"Error listing MCP tools from {self.server_name}: {e}")
+                continue
+            names = tuple(sorted(tool.name for tool in mcp_tools))
+            with self._lock:
+                stale = (
+                    names != self._tool_names
+                    or time.monotonic() >= self._expires_at
+                )
+            if stale:
+                self.refresh(mcp_tools)
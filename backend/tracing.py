@@ -0,0 +1,322 @@
+import contextvars
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import httpx
+
+from metrics import Histogram
+
+# Spans are appended to this file as OTLP/JSON lines when set, e.g.
+# .cache/traces.jsonl; past TRACE_FILE_MAX_BYTES it is rotated to `<file>.1`
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(100 * 1024**2)))
+# Optional OTLP/HTTP collector, e.g. http://localhost:4318/v1/traces
+OTLP_TRACES_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "github-issue-analyzer")
+TRACE_FLUSH_INTERVAL = 5.0
+TRACE_MAX_QUEUE = 10000
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds",
+    "Latency of each traced pipeline stage",
+    ("stage",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    """A parent span known only by its IDs, e.g. from a `traceparent` header."""
+
+    trace_id: str
+    span_id: str
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in self.attributes.items()
+                if value is not None
+            ],
+            "status": {"code": 2, "message": self.error}
+            if self.error
+            else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def parse_traceparent(header: str | None):
+    """The remote parent in a W3C `traceparent` header, or None."""
+    match = TRACEPARENT_RE.match((header or "").strip().lower())
+    if match is None or set(match.group(1)) == {"0"}:
+        return None
+    return SpanContext(*match.groups())
+
+
+class SpanExporter:
+    """Batches finished spans and writes them as OTLP/JSON.
+
+    Each flush appends one `{"resourceSpans": [...]}` line to `path` (the
+    layout of the OpenTelemetry Collector's file exporter), replacing the
+    previous `<path>.1` with it once it grows past `max_bytes`, and, when
+    `endpoint` is set, POSTs the same payload to an OTLP/HTTP collector.
+    Spans beyond `max_queue` are dropped rather than blocking the pipeline.
+    """
+
+    def __init__(
+        self,
+        path=TRACE_FILE,
+        endpoint=OTLP_TRACES_ENDPOINT,
+        interval=TRACE_FLUSH_INTERVAL,
+        max_queue=TRACE_MAX_QUEUE,
+        max_bytes=TRACE_FILE_MAX_BYTES,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.endpoint = endpoint
+        self.interval = interval
+        self._queue = deque()
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def enabled(self):
+        return bool(self.path or self.endpoint)
+
+    def export(self, span: Span):
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(span)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="span-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def flush(self):
+        with self._lock:
+            spans, self._queue = list(self._queue), deque()
+        if not spans:
+            return
+        payload = json.dumps(
+            {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": [
+                                {
+                                    "key": "service.name",
+                                    "value": {"stringValue": SERVICE_NAME},
+                                }
+                            ]
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": "berkeley-ai-25"},
+                                "spans": [span.to_otlp() for span in spans],
+                            }
+                        ],
+                    }
+                ]
+            }
+        )
+        try:
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(payload + "\n")
+                    size = f.tell()
+                if size > self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+            if self.endpoint:
+                httpx.post(
+                    self.endpoint,
+                    content=payload,
+                    headers={"Content-Type": "application/json"},
+                    timeout=5.0,
+                ).raise_for_status()
+            self.exported += len(spans)
+        except (OSError, httpx.HTTPError) as e:
+            self.failed += len(spans)
+            print(f"Error exporting {len(spans)} spans: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            "file": self.path or None,
+            "endpoint": self.endpoint,
+            "queued": queued,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Spans for each stage of the analysis pipeline.
+
+    The current span lives in a context variable, so nested `span()` blocks
+    form a trace. Context variables don't cross into worker threads or the
+    MCP pool's event loop by themselves; `bind()` and `propagate()` carry the
+    current span along. Every finished span is also timed in STAGE_LATENCY
+    under its name, so span names should be low-cardinality stage names.
+
+    Example usage:
+    ```with tracer.span("prefetch", issue_url=issue_url) as span:
+        context = prefetch(issue_url)
+        span.set(candidates=len(context.candidates))
+    ```
+    """
+
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, parent=None, **attributes):
+        """Time a stage as a child of `parent` (default: the current span)."""
+        span = self._start(name, parent or _current_span.get(), time.time_ns())
+        span.set(**attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(span, time.time_ns())
+
+    def record(self, name: str, start_ns: int, end_ns: int, error=None, **attributes):
+        """Add a finished child span for a stage timed elsewhere, e.g. by Letta."""
+        span = self._start(name, _current_span.get(), start_ns)
+        span.set(**attributes)
+        span.error = error
+        self._finish(span, end_ns)
+
+    def _start(self, name, parent, start_ns):
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start_ns=start_ns,
+        )
+
+    def _finish(self, span, end_ns):
+        span.end_ns = max(end_ns, span.start_ns)
+        STAGE_LATENCY.observe((span.end_ns - span.start_ns) / 1e9, stage=span.name)
+        self.exporter.export(span)
+
+    def close(self):
+        self.exporter.close()
+
+
+def current_span():
+    return _current_span.get()
+
+
+@contextmanager
+def attach(span):
+    """Make `span` the current span, e.g. in a thread working on its behalf."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def bind(fn):
+    """Wrap `fn` to run under the span, and the other context variables such
+    as the rate-limit priority, that are current now, wherever it's called."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+async def _attached(context, coro):
+    # Tasks run in their own copy of the context, so there's nothing to reset
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def propagate(coro):
+    """Wrap a coroutine to run under the span and context variables that are
+    current now, e.g. before handing it to another thread's event loop."""
+    return _attached(contextvars.copy_context(), coro)
+
+
+tracer = Tracer(SpanExporter())
@@ -6,16 +6,67 @@ import { useRouter } from "next/navigation";
 import Editor from "@monaco-editor/react";
 
 import "./issues.css";
-import { GitHubIssueAnalysis, FlattenedFile } from "../../lib/api";
+import {
+  GitHubIssueAnalysis,
+  FlattenedFile,
+  KeySection,
+  fetchCodeSlice,
+  flattenRelevantFiles,
+  streamAnalysis,
+} from "../../lib/api";
 
 export default function IssuesPage() {
   const router = useRouter();
   const [showSummary, setShowSummary] = useState(true);
-  const [analysis, setAnalysis] = useState<GitHubIssueAnalysis | null>(null);
+  const [analysis, setAnalysis] =
+    useState<Partial<GitHubIssueAnalysis> | null>(null);
   const [flattenedFiles, setFlattenedFiles] = useState<FlattenedFile[]>([]);
   const [selectedFile, setSelectedFile] = useState<FlattenedFile | null>(null);
+  const [progress, setProgress] = useState<string | null>(null);
+  const [streamError, setStreamError] = useState<string | null>(null);
+  // Code of key sections by ref hash, fetched when their file is shown
+  const [slices, setSlices] = useState<Record<string, string>>({});
 
   useEffect(() => {
+    // Stream a running analysis job, rendering each section as it arrives
+    const jobId = localStorage.getItem("analysisJob");
+    if (jobId) {
+      const showFiles = (files: FlattenedFile[]) => {
+        setFlattenedFiles(files);
+        setSelectedFile((current) => current ?? files[0] ?? null);
+      };
+
+      return streamAnalysis(jobId, {
+        onProgress: setProgress,
+        onSection: (name, value) => {
+          setAnalysis((current) => ({ ...current, [name]: value }));
+          if (name === "relevant_files") {
+            showFiles(
+              flattenRelevantFiles(
+                value as GitHubIssueAnalysis["relevant_files"]
+              )
+            );
+          }
+        },
+        onResult: (result) => {
+          const files = flattenRelevantFiles(result.relevant_files);
+          setAnalysis(result);
+          showFiles(files);
+          setProgress(null);
+          localStorage.removeItem("analysisJob");
+          localStorage.setItem(
+            "analysisData",
+            JSON.stringify({ analysis: result, flattenedFiles: files })
+          );
+        },
+        onError: (message) => {
+          setStreamError(message);
+          setProgress(null);
+          localStorage.removeItem("analysisJob");
+        },
+      });
+    }
+
     // Load analysis data from localStorage
     const analysisDataStr = localStorage.getItem("analysisData");
 
@@ -38,8 +89,31 @@ export default function IssuesPage() {
     }
   }, [router]);
 
-  // Show loading if no analysis data yet
-  if (!analysis) {
+  useEffect(() => {
+    // Compact results reference key section code instead of including it
+    for (const section of selectedFile?.keySections ?? []) {
+      const ref = section.ref;
+      if (section.code || !ref || slices[ref.hash] !== undefined) continue;
+      fetchCodeSlice(ref)
+        .then((code) =>
+          setSlices((current) => ({ ...current, [ref.hash]: code }))
+        )
+        .catch((error) => {
+          console.error("Error fetching code slice:", error);
+          setSlices((current) => ({
+            ...current,
+            [ref.hash]: "// Could not load these lines",
+          }));
+        });
+    }
+  }, [selectedFile, slices]);
+
+  const sectionCode = (section: KeySection) =>
+    section.code ||
+    (section.ref ? slices[section.ref.hash] ?? "// Loading lines…" : "");
+
+  // Show loading until the first section arrives
+  if (!analysis || Object.keys(analysis).length === 0) {
     return (
       <div className="min-h-screen relative flex items-center justify-center">
         <div className="absolute inset-0 bg-black z-0" />
@@ -54,8 +128,22 @@ export default function IssuesPage() {
           }}
         />
         <div className="relative z-10 text-center">
-          <div className="w-12 h-12 border-4 border-white/20 border-t-white rounded-full animate-spin mx-auto mb-4"></div>
-          <p className="text-white text-xl">Loading analysis...</p>
+          {streamError ? (
+            <>
+              <p className="text-red-300 text-xl">{streamError}</p>
+              <Link href="/" className="text-white/80 underline mt-4 block">
+                Try another issue
+              </Link>
+            </>
+          ) : (
+            <>
+              <div className="w-12 h-12 border-4 border-white/20 border-t-white rounded-full animate-spin mx-auto mb-4"></div>
+              <p className="text-white text-xl">Loading analysis...</p>
+              {progress && (
+                <p className="text-white/60 text-sm mt-2">{progress}</p>
+              )}
+            </>
+          )}
         </div>
       </div>
     );
@@ -88,10 +176,19 @@ export default function IssuesPage() {
               lineHeight: "100%",
               letterSpacing: "0%",
             }}
-            title={analysis?.issue_summary.title || "Loading..."}
+            title={analysis?.issue_summary?.title || "Loading..."}
           >
-            {analysis?.issue_summary.title || "Loading..."}
+            {analysis?.issue_summary?.title || "Loading..."}
           </h1>
+          {(progress || streamError) && (
+            <p
+              className={`absolute left-4 top-6 text-sm truncate max-w-xs ${
+                streamError ? "text-red-300" : "text-white/60"
+              }`}
+            >
+              {streamError || progress}
+            </p>
+          )}
 
           {/* Home Button (top-right) */}
           <Link
@@ -157,234 +254,242 @@ export default function IssuesPage() {
                     {analysis ? (
                       <>
                         {/* Issue Summary */}
-                        <div>
-                          <h3 className="text-lg font-semibold mb-3 text-purple-300">
-                            Issue Summary
-                          </h3>
-                          <div className="space-y-3">
-                            <div>
-                              <strong>Description:</strong>
-                              <p className="mt-1 text-gray-300">
-                                {analysis.issue_summary.description}
-                              </p>
-                            </div>
-                            <div className="flex flex-wrap gap-4">
-                              <div>
-                                <strong>Status:</strong>{" "}
-                                <span className="text-green-400">
-                                  {analysis.issue_summary.status}
-                                </span>
-                              </div>
-                              <div>
-                                <strong>Type:</strong>{" "}
-                                <span className="text-blue-400">
-                                  {analysis.analysis.problem_type}
-                                </span>
-                              </div>
+                        {analysis.issue_summary && (
+                          <div>
+                            <h3 className="text-lg font-semibold mb-3 text-purple-300">
+                              Issue Summary
+                            </h3>
+                            <div className="space-y-3">
                               <div>
-                                <strong>Complexity:</strong>{" "}
-                                <span className="text-yellow-400">
-                                  {analysis.analysis.complexity}
-                                </span>
+                                <strong>Description:</strong>
+                                <p className="mt-1 text-gray-300">
+                                  {analysis.issue_summary.description}
+                                </p>
                               </div>
-                            </div>
-                            {analysis.issue_summary.labels.length > 0 && (
-                              <div>
-                                <strong>Labels:</strong>
-                                <div className="flex flex-wrap gap-1 mt-1">
-                                  {analysis.issue_summary.labels.map(
-                                    (label, index) => (
-                                      <span
-                                        key={index}
-                                        className="px-2 py-1 bg-purple-600/30 rounded text-xs"
-                                      >
-                                        {label}
-                                      </span>
-                                    )
-                                  )}
+                              <div className="flex flex-wrap gap-4">
+                                <div>
+                                  <strong>Status:</strong>{" "}
+                                  <span className="text-green-400">
+                                    {analysis.issue_summary.status}
+                                  </span>
+                                </div>
+                                <div>
+                                  <strong>Type:</strong>{" "}
+                                  <span className="text-blue-400">
+                                    {analysis.analysis?.problem_type}
+                                  </span>
+                                </div>
+                                <div>
+                                  <strong>Complexity:</strong>{" "}
+                                  <span className="text-yellow-400">
+                                    {analysis.analysis?.complexity}
+                                  </span>
                                 </div>
                               </div>
-                            )}
+                              {analysis.issue_summary.labels.length > 0 && (
+                                <div>
+                                  <strong>Labels:</strong>
+                                  <div className="flex flex-wrap gap-1 mt-1">
+                                    {analysis.issue_summary.labels.map(
+                                      (label, index) => (
+                                        <span
+                                          key={index}
+                                          className="px-2 py-1 bg-purple-600/30 rounded text-xs"
+                                        >
+                                          {label}
+                                        </span>
+                                      )
+                                    )}
+                                  </div>
+                                </div>
+                              )}
+                            </div>
                           </div>
-                        </div>
+                        )}
 
                         {/* Project Context */}
-                        <div>
-                          <h3 className="text-lg font-semibold mb-3 text-purple-300">
-                            Project Context
-                          </h3>
-                          <div className="space-y-3">
-                            <div>
-                              <strong>Overview:</strong>
-                              <p className="mt-1 text-gray-300 text-sm leading-relaxed">
-                                {analysis.project_context.overview}
-                              </p>
-                            </div>
-                            <div>
-                              <strong>Architecture:</strong>
-                              <p className="mt-1 text-gray-300 text-sm leading-relaxed">
-                                {analysis.project_context.architecture_overview}
-                              </p>
-                            </div>
-                            {Object.keys(
-                              analysis.project_context.main_directories
-                            ).length > 0 && (
+                        {analysis.project_context && (
+                          <div>
+                            <h3 className="text-lg font-semibold mb-3 text-purple-300">
+                              Project Context
+                            </h3>
+                            <div className="space-y-3">
                               <div>
-                                <strong>Key Directories:</strong>
-                                <div className="mt-1 space-y-1">
-                                  {Object.entries(
-                                    analysis.project_context.main_directories
-                                  ).map(([dir, desc], index) => (
-                                    <div key={index} className="text-sm">
-                                      <code className="text-purple-300">
-                                        {dir}
-                                      </code>{" "}
-                                      -{" "}
-                                      <span className="text-gray-300">
-                                        {desc}
-                                      </span>
-                                    </div>
-                                  ))}
-                                </div>
+                                <strong>Overview:</strong>
+                                <p className="mt-1 text-gray-300 text-sm leading-relaxed">
+                                  {analysis.project_context.overview}
+                                </p>
                               </div>
-                            )}
+                              <div>
+                                <strong>Architecture:</strong>
+                                <p className="mt-1 text-gray-300 text-sm leading-relaxed">
+                                  {analysis.project_context.architecture_overview}
+                                </p>
+                              </div>
+                              {Object.keys(
+                                analysis.project_context.main_directories
+                              ).length > 0 && (
+                                <div>
+                                  <strong>Key Directories:</strong>
+                                  <div className="mt-1 space-y-1">
+                                    {Object.entries(
+                                      analysis.project_context.main_directories
+                                    ).map(([dir, desc], index) => (
+                                      <div key={index} className="text-sm">
+                                        <code className="text-purple-300">
+                                          {dir}
+                                        </code>{" "}
+                                        -{" "}
+                                        <span className="text-gray-300">
+                                          {desc}
+                                        </span>
+                                      </div>
+                                    ))}
+                                  </div>
+                                </div>
+                              )}
+                            </div>
                           </div>
-                        </div>
+                        )}
 
                         {/* Build & Development */}
-                        <div>
-                          <h3 className="text-lg font-semibold mb-3 text-purple-300">
-                            Build & Development
-                          </h3>
-                          <div className="space-y-3">
-                            {analysis.build_and_test.setup_commands.length >
-                              0 && (
-                              <div>
-                                <strong>Setup Commands:</strong>
-                                <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs max-h-32 overflow-y-auto">
-                                  {analysis.build_and_test.setup_commands.map(
-                                    (cmd, index) => (
-                                      <div
-                                        key={index}
-                                        className="text-green-300 py-0.5"
-                                      >
-                                        {cmd}
-                                      </div>
-                                    )
-                                  )}
+                        {analysis.build_and_test && (
+                          <div>
+                            <h3 className="text-lg font-semibold mb-3 text-purple-300">
+                              Build & Development
+                            </h3>
+                            <div className="space-y-3">
+                              {analysis.build_and_test.setup_commands.length >
+                                0 && (
+                                <div>
+                                  <strong>Setup Commands:</strong>
+                                  <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs max-h-32 overflow-y-auto">
+                                    {analysis.build_and_test.setup_commands.map(
+                                      (cmd, index) => (
+                                        <div
+                                          key={index}
+                                          className="text-green-300 py-0.5"
+                                        >
+                                          {cmd}
+                                        </div>
+                                      )
+                                    )}
+                                  </div>
                                 </div>
-                              </div>
-                            )}
-                            {analysis.build_and_test.test_commands.length >
-                              0 && (
-                              <div>
-                                <strong>Test Commands:</strong>
-                                <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs max-h-32 overflow-y-auto">
-                                  {analysis.build_and_test.test_commands.map(
-                                    (cmd, index) => (
-                                      <div
-                                        key={index}
-                                        className="text-blue-300 py-0.5"
-                                      >
-                                        {cmd}
-                                      </div>
-                                    )
-                                  )}
+                              )}
+                              {analysis.build_and_test.test_commands.length >
+                                0 && (
+                                <div>
+                                  <strong>Test Commands:</strong>
+                                  <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs max-h-32 overflow-y-auto">
+                                    {analysis.build_and_test.test_commands.map(
+                                      (cmd, index) => (
+                                        <div
+                                          key={index}
+                                          className="text-blue-300 py-0.5"
+                                        >
+                                          {cmd}
+                                        </div>
+                                      )
+                                    )}
+                                  </div>
                                 </div>
-                              </div>
-                            )}
-                            {analysis.build_and_test.development_server && (
-                              <div>
-                                <strong>Dev Server:</strong>
-                                <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs">
-                                  <div className="text-yellow-300">
-                                    {analysis.build_and_test.development_server}
+                              )}
+                              {analysis.build_and_test.development_server && (
+                                <div>
+                                  <strong>Dev Server:</strong>
+                                  <div className="mt-1 bg-black/30 rounded p-2 font-mono text-xs">
+                                    <div className="text-yellow-300">
+                                      {analysis.build_and_test.development_server}
+                                    </div>
                                   </div>
                                 </div>
-                              </div>
-                            )}
+                              )}
+                            </div>
                           </div>
-                        </div>
+                        )}
 
                         {/* Analysis & Implementation */}
-                        <div>
-                          <h3 className="text-lg font-semibold mb-3 text-purple-300">
-                            Implementation Guide
-                          </h3>
-                          <div className="space-y-3">
-                            {analysis.analysis.implementation_steps.length >
-                              0 && (
-                              <div>
-                                <strong>Implementation Steps:</strong>
-                                <ol className="mt-1 space-y-2 text-gray-300">
-                                  {analysis.analysis.implementation_steps.map(
-                                    (step, index) => (
-                                      <li
-                                        key={index}
-                                        className="text-sm leading-relaxed"
-                                      >
-                                        {step}
-                                      </li>
-                                    )
-                                  )}
-                                </ol>
-                              </div>
-                            )}
-                            {analysis.analysis.affected_components.length >
-                              0 && (
-                              <div>
-                                <strong>Affected Components:</strong>
-                                <div className="flex flex-wrap gap-1 mt-1">
-                                  {analysis.analysis.affected_components.map(
-                                    (component, index) => (
-                                      <span
-                                        key={index}
-                                        className="px-2 py-1 bg-orange-600/30 rounded text-xs"
-                                      >
-                                        {component}
-                                      </span>
-                                    )
-                                  )}
+                        {analysis.analysis && (
+                          <div>
+                            <h3 className="text-lg font-semibold mb-3 text-purple-300">
+                              Implementation Guide
+                            </h3>
+                            <div className="space-y-3">
+                              {analysis.analysis.implementation_steps.length >
+                                0 && (
+                                <div>
+                                  <strong>Implementation Steps:</strong>
+                                  <ol className="mt-1 space-y-2 text-gray-300">
+                                    {analysis.analysis.implementation_steps.map(
+                                      (step, index) => (
+                                        <li
+                                          key={index}
+                                          className="text-sm leading-relaxed"
+                                        >
+                                          {step}
+                                        </li>
+                                      )
+                                    )}
+                                  </ol>
                                 </div>
-                              </div>
-                            )}
-                            {analysis.analysis.tests_needed.length > 0 && (
-                              <div>
-                                <strong>Tests Needed:</strong>
-                                <ul className="mt-1 space-y-1 text-gray-300">
-                                  {analysis.analysis.tests_needed.map(
-                                    (test, index) => (
-                                      <li
-                                        key={index}
-                                        className="text-sm leading-relaxed"
-                                      >
-                                        • {test}
-                                      </li>
-                                    )
-                                  )}
-                                </ul>
-                              </div>
-                            )}
-                            {analysis.analysis.potential_risks &&
-                              analysis.analysis.potential_risks.length > 0 && (
+                              )}
+                              {analysis.analysis.affected_components.length >
+                                0 && (
                                 <div>
-                                  <strong>Potential Risks:</strong>
-                                  <ul className="mt-1 space-y-1 text-red-300">
-                                    {analysis.analysis.potential_risks.map(
-                                      (risk, index) => (
+                                  <strong>Affected Components:</strong>
+                                  <div className="flex flex-wrap gap-1 mt-1">
+                                    {analysis.analysis.affected_components.map(
+                                      (component, index) => (
+                                        <span
+                                          key={index}
+                                          className="px-2 py-1 bg-orange-600/30 rounded text-xs"
+                                        >
+                                          {component}
+                                        </span>
+                                      )
+                                    )}
+                                  </div>
+                                </div>
+                              )}
+                              {analysis.analysis.tests_needed.length > 0 && (
+                                <div>
+                                  <strong>Tests Needed:</strong>
+                                  <ul className="mt-1 space-y-1 text-gray-300">
+                                    {analysis.analysis.tests_needed.map(
+                                      (test, index) => (
                                         <li
                                           key={index}
                                           className="text-sm leading-relaxed"
                                         >
-                                          ⚠️ {risk}
+                                          • {test}
                                         </li>
                                       )
                                     )}
                                   </ul>
                                 </div>
                               )}
+                              {analysis.analysis.potential_risks &&
+                                analysis.analysis.potential_risks.length > 0 && (
+                                  <div>
+                                    <strong>Potential Risks:</strong>
+                                    <ul className="mt-1 space-y-1 text-red-300">
+                                      {analysis.analysis.potential_risks.map(
+                                        (risk, index) => (
+                                          <li
+                                            key={index}
+                                            className="text-sm leading-relaxed"
+                                          >
+                                            ⚠️ {risk}
+                                          </li>
+                                        )
+                                      )}
+                                    </ul>
+                                  </div>
+                                )}
+                            </div>
                           </div>
-                        </div>
+                        )}
                       </>
                     ) : (
                       <div className="text-center text-gray-300">
@@ -458,7 +563,7 @@ export default function IssuesPage() {
                     ? selectedFile.keySections
                         .map(
                           (section) =>
-                            `// Lines ${section.line_start}-${section.line_end}: ${section.explanation}\n${section.code}`
+                            `// Lines ${section.line_start}-${section.line_end}: ${section.explanation}\n${sectionCode(section)}`
                         )
                         .join("\n\n")
                     : `// Code content not available for this file`
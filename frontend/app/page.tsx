@@ -2,7 +2,7 @@
 
 import { useState } from 'react';
 import { useRouter } from 'next/navigation';
-import { analyzeGitHubIssue } from "../lib/api";
+import { startAnalysis } from "../lib/api";
 
 export default function Home() {
   const router = useRouter();
@@ -22,13 +22,11 @@ export default function Home() {
     setLoading(true);
 
     try {
-      const result = await analyzeGitHubIssue(githubUrl);
+      const job = await startAnalysis(githubUrl);
 
-      // Store the analysis data in localStorage for the issues page
-      localStorage.setItem('analysisData', JSON.stringify({
-        analysis: result.analysis,
-        flattenedFiles: result.flattenedFiles
-      }));
+      // The issues page streams the job's results as they arrive
+      localStorage.removeItem('analysisData');
+      localStorage.setItem('analysisJob', job.id);
 
       // Navigate to issues page
       router.push('/issues');
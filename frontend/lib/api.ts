@@ -11,11 +11,22 @@ const api = axios.create({
 });
 
 // Types for the API response
+// Where a key section's code lives; compact responses leave the code out
+export interface CodeRef {
+  repo: string;
+  sha: string;
+  path: string;
+  line_start: number;
+  line_end: number;
+  hash: string;
+}
+
 export interface KeySection {
   line_start: number;
   line_end: number;
-  code: string;
+  code?: string;
   explanation: string;
+  ref?: CodeRef;
 }
 
 export interface FileInfo {
@@ -99,23 +110,37 @@ export function flattenRelevantFiles(relevantFiles: { [key: string]: FileInfo },
   return flattened;
 }
 
-// API function to analyze GitHub issue
-export async function analyzeGitHubIssue(githubUrl: string): Promise<{
-  analysis: GitHubIssueAnalysis;
-  flattenedFiles: FlattenedFile[];
-}> {
+// Background analysis job returned by /analyses
+export type AnalysisJobStatus = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+
+export interface AnalysisJob {
+  id: string;
+  issue_url: string;
+  status: AnalysisJobStatus;
+  created_at: number;
+  started_at?: number;
+  finished_at?: number;
+  result?: GitHubIssueAnalysis;
+  error?: string;
+}
+
+// Section of GitHubIssueAnalysis streamed as soon as it validates
+export type AnalysisSection = keyof GitHubIssueAnalysis;
+
+export interface AnalysisStreamHandlers {
+  onSection?: <K extends AnalysisSection>(name: K, value: GitHubIssueAnalysis[K]) => void;
+  onProgress?: (message: string) => void;
+  onResult: (analysis: GitHubIssueAnalysis) => void;
+  onError: (message: string) => void;
+}
+
+// Submit an analysis as a background job
+export async function startAnalysis(githubUrl: string): Promise<AnalysisJob> {
   try {
-    const response = await api.post('/analyze', {
+    const response = await api.post<AnalysisJob>('/analyses', {
       github_url: githubUrl
     });
-
-    const analysis: GitHubIssueAnalysis = response.data;
-    const flattenedFiles = flattenRelevantFiles(analysis.relevant_files);
-
-    return {
-      analysis,
-      flattenedFiles
-    };
+    return response.data;
   } catch (error) {
     if (axios.isAxiosError(error)) {
       throw new Error(`API Error: ${error.response?.data?.detail || error.message}`);
@@ -123,3 +148,87 @@ export async function analyzeGitHubIssue(githubUrl: string): Promise<{
     throw new Error(`Unexpected error: ${error}`);
   }
 }
+
+// Follow a job's Server-Sent Events; returns a function that closes the stream
+export function streamAnalysis(jobId: string, handlers: AnalysisStreamHandlers): () => void {
+  const source = new EventSource(`${API_BASE_URL}/analyses/${jobId}/events?compact=true`);
+  const parse = (event: Event) => JSON.parse((event as MessageEvent).data);
+
+  source.addEventListener('status', (event) => {
+    const { status } = parse(event);
+    if (status === 'cancelled') {
+      source.close();
+      handlers.onError('Analysis cancelled');
+      return;
+    }
+    handlers.onProgress?.(`Analysis ${status}`);
+  });
+  source.addEventListener('progress', (event) => {
+    handlers.onProgress?.(parse(event).message);
+  });
+  source.addEventListener('tool_call', (event) => {
+    handlers.onProgress?.(`Calling ${parse(event).name}`);
+  });
+  source.addEventListener('tool_return', (event) => {
+    handlers.onProgress?.(`${parse(event).name} returned`);
+  });
+  source.addEventListener('section', (event) => {
+    const { name, value } = parse(event);
+    handlers.onSection?.(name, value);
+  });
+  source.addEventListener('result', (event) => {
+    source.close();
+    const analysis = parse(event);
+    if (analysis) {
+      handlers.onResult(analysis);
+    } else {
+      handlers.onError('Analysis finished without a valid result');
+    }
+  });
+  source.addEventListener('error', (event) => {
+    source.close();
+    // Server-sent `error` events carry a detail; connection errors don't
+    const data = (event as MessageEvent).data;
+    handlers.onError(data ? JSON.parse(data).detail : 'Lost connection to the analysis stream');
+  });
+
+  return () => source.close();
+}
+
+// Slices never change, so each one is fetched once per page load
+const codeSlices = new Map<string, Promise<string>>();
+
+// Fetch the code a key section's ref points at
+export function fetchCodeSlice(ref: CodeRef): Promise<string> {
+  let slice = codeSlices.get(ref.hash);
+  if (!slice) {
+    slice = api
+      .get<string>(`/repos/${ref.repo}/slices`, {
+        params: { sha: ref.sha, path: ref.path, start: ref.line_start, end: ref.line_end },
+        responseType: 'text',
+      })
+      .then((response) => response.data);
+    slice.catch(() => codeSlices.delete(ref.hash));
+    codeSlices.set(ref.hash, slice);
+  }
+  return slice;
+}
+
+// API function to analyze GitHub issue
+export async function analyzeGitHubIssue(githubUrl: string): Promise<{
+  analysis: GitHubIssueAnalysis;
+  flattenedFiles: FlattenedFile[];
+}> {
+  const job = await startAnalysis(githubUrl);
+
+  return new Promise((resolve, reject) => {
+    streamAnalysis(job.id, {
+      onResult: (analysis) =>
+        resolve({
+          analysis,
+          flattenedFiles: flattenRelevantFiles(analysis.relevant_files)
+        }),
+      onError: (message) => reject(new Error(`Analysis failed: ${message}`))
+    });
+  });
+}